@@ -12,6 +12,8 @@ LLM_PROVIDER_ENV_VARS = {
     "anthropic": "ANTHROPIC_API_KEY",
     "cohere": "COHERE_API_KEY",
     "azure_openai": "AZURE_OPENAI_API_KEY",
+    # A local OpenAI-compatible server is available once its URL is set
+    "local": "LOCAL_LLM_BASE_URL",
     # Add more providers as needed
 }
 
@@ -20,6 +22,7 @@ DEFAULT_LLM_MODELS = {
     "gemini": "gemini-2.0-flash-exp",
     "openai": "gpt-4",
     "anthropic": "claude-3-opus-20240229",
+    "local": "local-model",
     # "cohere": "command-r-plus",
     # "azure_openai": "gpt-4",
     # Add more defaults as needed
@@ -90,12 +93,65 @@ def get_supported_browser_tools() -> List[str]:
 # Application-wide configuration
 class AppConfig:
     """Application configuration"""
-    # Default timeouts
-    DEFAULT_OPERATION_TIMEOUT = 60  # seconds
+    # Default timeouts: operation_timeout is a hard deadline, so it must leave room for a full agent run
+    DEFAULT_OPERATION_TIMEOUT = int(os.getenv("DEFAULT_OPERATION_TIMEOUT_SECONDS", "300"))  # seconds
+    # Sub-budgets within a task's operation_timeout (each is capped by the time left); keep them below it
+    STEP_TIMEOUT_SECONDS = float(os.getenv("STEP_TIMEOUT_SECONDS", "120"))
+    LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "60"))
+    NAVIGATION_TIMEOUT_SECONDS = float(os.getenv("NAVIGATION_TIMEOUT_SECONDS", "30"))
+    # Loop and stall detection: nudge the agent, then fail the task if it keeps repeating itself
+    LOOP_MAX_REPEATS = int(os.getenv("LOOP_MAX_REPEATS", "3"))
+    STALL_MAX_STEPS = int(os.getenv("STALL_MAX_STEPS", "5"))
+    PROGRESS_MAX_NUDGES = int(os.getenv("PROGRESS_MAX_NUDGES", "2"))
+    # How long pause/cancel wait for a run to unwind before force-closing its browser
+    TASK_CANCEL_TIMEOUT_SECONDS = float(os.getenv("TASK_CANCEL_TIMEOUT_SECONDS", "10"))
     
     # Session settings
     SESSION_TIMEOUT_MINUTES = int(os.getenv("SESSION_TIMEOUT_MINUTES", "30"))
     
+    # Task result cache settings (opt-in per request with "cache": true)
+    TASK_CACHE_TTL_SECONDS = int(os.getenv("TASK_CACHE_TTL_SECONDS", "600"))
+    TASK_CACHE_MAX_ENTRIES = int(os.getenv("TASK_CACHE_MAX_ENTRIES", "256"))
+    
+    # Build shared LLM clients and open their connections at startup
+    LLM_PREWARM = os.getenv("LLM_PREWARM", "true").lower() == "true"
+    # How often the local model server is probed; /health serves the last result
+    LOCAL_LLM_HEALTH_INTERVAL_SECONDS = float(os.getenv("LOCAL_LLM_HEALTH_INTERVAL_SECONDS", "15"))
+    
+    # Idempotency-Key settings (how long responses are remembered for retries)
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    
+    # Logging: level, "json" lines or "text", and the fraction of records below WARNING
+    # kept per logger, e.g. "browser_use=0.2,main.periodic_task=0.1"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+    
+    # Event loop lag sampling; stalls longer than the threshold log the loop's stack
+    EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+    EVENT_LOOP_STALL_SECONDS = float(os.getenv("EVENT_LOOP_STALL_SECONDS", "0.5"))
+    
+    # Debug endpoints (/debug/*) require this token in X-Admin-Token and are disabled without it
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    # Allocation tracing for /debug/memory and periodic tracemalloc snapshots to disk
+    MEMORY_TRACE_AT_STARTUP = os.getenv("MEMORY_TRACE_AT_STARTUP", "false").lower() == "true"
+    MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+    MEMORY_SNAPSHOT_DIR = os.getenv("MEMORY_SNAPSHOT_DIR", "")
+    MEMORY_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL_SECONDS", "0"))
+    MEMORY_SNAPSHOT_KEEP = int(os.getenv("MEMORY_SNAPSHOT_KEEP", "24"))
+    # Objects /debug/memory visits at most when estimating what tasks retain
+    MEMORY_ESTIMATE_MAX_OBJECTS = int(os.getenv("MEMORY_ESTIMATE_MAX_OBJECTS", "1000000"))
+    
+    # Span tracing: recent traces are kept for GET /execute/{task_id}/trace and exported
+    # to a JSONL file and/or an OTLP/HTTP collector when configured
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_MAX_TASKS = int(os.getenv("TRACE_MAX_TASKS", "256"))
+    TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+    OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+    TRACE_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "browser-service")
+    
     # Recording settings
     DEFAULT_RECORDING_FORMAT = "mp4"
     DEFAULT_RECORDING_QUALITY = "medium"
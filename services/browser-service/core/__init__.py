@@ -1,9 +1,10 @@
 from .context import BrowserUseContext
-from .models import BrowserAction, ActionResult, TaskResult, RecordingConfig, ActionType
+from .models import BrowserAction, ActionPlan, ActionResult, TaskResult, RecordingConfig, ActionType
 
 __all__ = [
     'BrowserUseContext',
     'BrowserAction',
+    'ActionPlan',
     'ActionResult',
     'TaskResult',
     'RecordingConfig',
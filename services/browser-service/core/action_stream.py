@@ -0,0 +1,90 @@
+"""
+Incremental parsing of streamed action plans.
+
+The LLM answers a browser task with a JSON array of actions. IncrementalActionParser is
+fed the response as it streams in and returns each action as soon as its object is
+complete, so the first actions can run while the model is still writing the rest.
+Anything before the array (prose, a ```json fence) and after it is ignored. Brackets in
+the prose (e.g. "Plan [JSON]:") open an array too; an array that closes without yielding
+an action was not the plan, and parsing carries on with the text after it.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalActionParser:
+    """Extracts the objects of a top-level JSON array from text arriving in chunks."""
+
+    def __init__(self):
+        self.text = ""
+        self.actions_parsed = 0
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        self._array_actions = 0
+        self._done = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Add streamed text.
+
+        Args:
+            chunk: The next piece of the response
+
+        Returns:
+            List[Dict[str, Any]]: Actions completed by this chunk, in order
+        """
+        self.text += chunk
+        actions = []
+        text = self.text
+        while self._position < len(text) and not self._done:
+            char = text[self._position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                # Strings only matter inside the array; quotes in surrounding prose are ignored
+                self._in_string = self._depth > 0
+            elif char == "[" or (char == "{" and self._depth > 0):
+                # Objects outside of the array are not part of the plan
+                self._depth += 1
+                if self._depth == 2 and char == "{":
+                    self._object_start = self._position
+            elif char in "]}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 1 and char == "}" and self._object_start is not None:
+                    action = self._parse_object(text[self._object_start:self._position + 1])
+                    if action is not None:
+                        actions.append(action)
+                        self._array_actions += 1
+                    self._object_start = None
+                elif self._depth == 0:
+                    # End of the action array, unless it held no action and was part of the prose
+                    self._done = self._array_actions > 0
+            self._position += 1
+        self.actions_parsed += len(actions)
+        return actions
+
+    def _parse_object(self, raw: str) -> Any:
+        """Decode one completed action object, skipping anything that is not valid JSON."""
+        try:
+            action = json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping unparseable streamed action: {str(e)}")
+            return None
+        return action if isinstance(action, dict) else None
+
+    @property
+    def done(self) -> bool:
+        """Whether the closing bracket of the action array has been seen."""
+        return self._done
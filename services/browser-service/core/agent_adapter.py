@@ -5,22 +5,57 @@ This module provides an adapter between our service API and the browser-use libr
 It handles the conversion between our request/response formats and the browser-use library's API.
 """
 
+import json
 import logging
 import os
 import uuid
 import traceback
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 import asyncio
 
+from browser_use import ActionResult
 from browser_use import Agent
+from browser_use import Browser
 from browser_use import BrowserConfig
 from browser_use import BrowserContextConfig
+from browser_use import Controller
+from langchain_core.messages import HumanMessage
 
+from strategies.base import LLMProviderStrategy
+from strategies.base import request_fingerprint
 from strategies.llm.factory import LLMProviderFactory
+from strategies.llm.cascade import FAST_TIER
+from strategies.llm.cascade import STRONG_TIER
+from strategies.llm.cascade import CascadeLLMStrategy
+from strategies.llm.router import RoutingLLMStrategy
+from core.budgets import BudgetExhaustedError
+from core.budgets import TaskBudget
+from core.cache import SingleFlight
+from core.deadlines import Deadline
+from core.deadlines import DeadlineExceededError
+from core.deadlines import StageTimeoutError
+from core.progress_monitor import FAIL
+from core.progress_monitor import NUDGE
+from core.progress_monitor import NoProgressError
+from core.progress_monitor import ProgressMonitor
+from core.progress_monitor import hash_dom
+from core.result_refs import PreviousOutputResolver
 from core.state_utils import restore_state
+from core.tracing import tracer
+from core.metrics import LATENCY_BUCKETS
+from core.metrics import Histogram
+from core.usage import AGENT_STEP_DURATION
+from core.usage import BROWSER_ACTION_DURATION
+from core.usage import TokenUsageHandler
+from core.usage import UsageRecorder
+from core.usage import current_usage_handler
+from core.usage import track_token_usage
 
 logger = logging.getLogger(__name__)
 
+BROWSER_LAUNCH_DURATION = Histogram("browser_launch_seconds", "Time to launch a browser", LATENCY_BUCKETS)
+
 class AgentAdapter:
     """
     Adapter for the browser-use Agent class.
@@ -32,11 +67,527 @@ class AgentAdapter:
     def __init__(self):
         """Initialize the adapter."""
         self.active_agents = {}  # Store active agents by task_id
+        # Identical agent LLM requests in flight at the same time share one call
+        self.llm_flights = SingleFlight()
+        self.coalesced_llm_calls = 0
     
     def get_agent_for_task(self, task_id: str) -> Optional[Agent]:
         """Get the agent for a specific task."""
         return self.active_agents.get(task_id)
     
+    def _build_context_config(self) -> BrowserContextConfig:
+        """Build the browser context configuration shared by all agents."""
+        return BrowserContextConfig(
+            highlight_elements=True,  # Highlight elements for better visibility
+            wait_for_network_idle_page_load_time=3.0,  # Increase wait time for better reliability
+            browser_window_size={'width': 1920, 'height': 1080},  # Set window size
+        )
+    
+    def _previous_output_controller(self, previous_output: PreviousOutputResolver) -> Controller:
+        """
+        Build a controller with the default browser actions plus get_previous_agent_output.
+        
+        References are only resolved (and results only copied) when the agent first calls
+        the action.
+        
+        Args:
+            previous_output: Resolver of the outputs of the task's predecessors
+            
+        Returns:
+            Controller: A controller of the task's own, with the action registered
+        """
+        controller = Controller()
+        
+        @controller.action("Get the output of the previous agents in the workflow, keyed by predecessor")
+        async def get_previous_agent_output():
+            output = json.dumps(previous_output.resolve(), default=str)
+            return ActionResult(extracted_content=output, include_in_memory=True)
+        
+        return controller
+    
+    def _structured_output_call(self, agent: Agent, input_messages: List[Any]) -> Callable[[LLMProviderStrategy], Awaitable[Any]]:
+        """
+        Build the agent's next-action call for an arbitrary provider strategy.
+        
+        Mirrors browser-use's structured-output call so that it can be made on any
+        provider's model, not only the one the agent was constructed with.
+        
+        Args:
+            agent: The agent whose call to make
+            input_messages: The messages of the call
+        
+        Returns:
+            Callable: Coroutine function making the call with a given strategy and returning the parsed output
+        """
+        async def call(strategy):
+            llm = strategy.get_llm()
+            # The strategy's own tool-calling method, else the choice browser-use makes for these model classes
+            method = strategy.tool_calling_method or (
+                "function_calling" if llm.__class__.__name__ in ("ChatOpenAI", "AzureChatOpenAI") else None
+            )
+            kwargs = {"method": method} if method else {}
+            structured_llm = llm.with_structured_output(agent.AgentOutput, include_raw=True, **kwargs)
+            response = await structured_llm.ainvoke(strategy.mark_prompt_cache(input_messages))
+            if response["parsed"] is None:
+                raise ValueError("Could not parse response.")
+            parsed = response["parsed"]
+            # cut the number of actions to max_actions_per_step if needed
+            if len(parsed.action) > agent.settings.max_actions_per_step:
+                parsed.action = parsed.action[: agent.settings.max_actions_per_step]
+            return parsed
+        return call
+    
+    def _apply_routing(self, agent: Agent, router: RoutingLLMStrategy) -> None:
+        """
+        Route each of the agent's LLM calls across providers, with hedging and failover.
+        
+        Args:
+            agent: The agent whose LLM calls to route
+            router: The routing strategy
+        """
+        async def get_next_action(input_messages):
+            return await router.route(self._structured_output_call(agent, input_messages))
+        
+        agent.get_next_action = get_next_action
+    
+    def _apply_cascade(self, agent: Agent, cascade: CascadeLLMStrategy, budget: Optional[TaskBudget] = None) -> None:
+        """
+        Decide each of the agent's steps with the cascade's fast model, escalating to the
+        strong model for failed steps, complex pages and low-confidence answers.
+        
+        Args:
+            agent: The agent whose LLM calls to cascade
+            cascade: The cascade strategy
+            budget: Optional task budget, used to record the steps decided by each tier
+        """
+        # The strong tier keeps the next few steps after a failure-driven escalation
+        window = cascade.escalation_window()
+        
+        async def get_next_action(input_messages):
+            call = self._structured_output_call(agent, input_messages)
+            step = agent.state.n_steps
+            
+            if window.holds(step):
+                reason = "escalated"
+            else:
+                last_result = agent.state.last_result or []
+                previous_step_failed = agent.state.consecutive_failures > 0 or any(r.error for r in last_result)
+                session = agent.browser_context.session if agent.browser_context else None
+                cached_state = session.cached_state if session else None
+                page_elements = len(cached_state.selector_map) if cached_state else 0
+                reason = cascade.choose_tier(previous_step_failed, page_elements)
+                
+                if reason is None:
+                    try:
+                        model_output = await cascade.call_tier(FAST_TIER, call)
+                        reason = cascade.low_confidence_reason(model_output)
+                    except Exception as e:
+                        reason = type(e).__name__
+                    if reason is None:
+                        if budget:
+                            budget.record_tier(FAST_TIER)
+                        return model_output
+                
+                window.escalate(step, reason)
+            
+            model_output = await cascade.call_tier(STRONG_TIER, call)
+            if budget:
+                budget.record_tier(STRONG_TIER)
+            return model_output
+        
+        agent.get_next_action = get_next_action
+    
+    def _apply_prompt_caching(self, agent: Agent, llm_strategy: LLMProviderStrategy) -> None:
+        """
+        Mark the stable prefix of the agent's messages (system prompt and history) for
+        provider-side prompt caching.
+        
+        Args:
+            agent: The agent whose LLM calls to mark
+            llm_strategy: The strategy of the agent's model, which knows how its provider caches
+        """
+        original_get_next_action = agent.get_next_action
+        
+        async def get_next_action(input_messages):
+            # Marked copies are sent; the message manager's history is left as it is
+            return await original_get_next_action(llm_strategy.mark_prompt_cache(input_messages))
+        
+        agent.get_next_action = get_next_action
+    
+    def _apply_coalescing(self, agent: Agent, llm_strategy: LLMProviderStrategy) -> None:
+        """
+        Share one LLM call between agents that send an identical request at the same time,
+        e.g. when a batch of tasks reaches the same page together.
+        
+        Args:
+            agent: The agent whose LLM calls to coalesce
+            llm_strategy: The agent's strategy, part of the request identity
+        """
+        original_get_next_action = agent.get_next_action
+        # The output schema is part of the request; it changes for the last step
+        schema_keys: Dict[type, str] = {}
+        
+        async def get_next_action(input_messages):
+            output_type = agent.AgentOutput
+            if output_type not in schema_keys:
+                schema_keys[output_type] = json.dumps(output_type.model_json_schema(), sort_keys=True)
+            key = request_fingerprint(
+                agent.llm,
+                input_messages,
+                extra=[llm_strategy.get_provider_name(), schema_keys[output_type], agent.settings.max_actions_per_step],
+            )
+            async def call():
+                # Record the call's usage, so that every agent sharing it can be charged for it
+                recorder = UsageRecorder(current_usage_handler())
+                with track_token_usage(recorder):
+                    return await original_get_next_action(input_messages), recorder
+            
+            (model_output, recorder), shared = await self.llm_flights.do(key, call)
+            if shared:
+                self.coalesced_llm_calls += 1
+                logger.debug(f"Coalesced identical agent LLM request {key[:12]}")
+                # Tokens, latency and queue wait count towards this task's usage and budgets too
+                usage_handler = current_usage_handler()
+                if usage_handler:
+                    recorder.replay(usage_handler)
+                # Each agent gets its own copy, as an instance of its own output model
+                model_output = output_type.model_validate(model_output.model_dump(exclude_unset=True))
+            return model_output
+        
+        agent.get_next_action = get_next_action
+    
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """Statistics of the coalescing of identical concurrent agent LLM requests."""
+        return {"in_flight": len(self.llm_flights), "coalesced": self.coalesced_llm_calls}
+    
+    def _apply_rate_limit(self, agent: Agent, rate_limiter: Any, budget: Optional[TaskBudget] = None) -> None:
+        """
+        Queue the agent's LLM calls through the provider's process-wide rate limiter.
+        
+        Args:
+            agent: The agent whose LLM calls to pace
+            rate_limiter: The provider's ProviderRateLimiter
+            budget: Optional task budget, used to report the calls' actual token usage
+        """
+        original_get_next_action = agent.get_next_action
+        
+        async def get_next_action(input_messages):
+            message_manager = getattr(agent, "_message_manager", None)
+            estimated_tokens = message_manager.state.history.current_tokens if message_manager else 0
+            tokens_before = budget.input_tokens + budget.output_tokens if budget else 0
+            async with rate_limiter.acquire(estimated_tokens) as permit:
+                model_output = await original_get_next_action(input_messages)
+                if budget:
+                    permit.record_tokens(budget.input_tokens + budget.output_tokens - tokens_before)
+            return model_output
+        
+        agent.get_next_action = get_next_action
+    
+    def _apply_deadline(
+        self,
+        agent: Agent,
+        deadline: Deadline,
+        step_timeout: Optional[float],
+        llm_timeout: Optional[float],
+        navigation_timeout: Optional[float],
+    ) -> None:
+        """
+        Run the agent's steps, LLM calls and page navigations under sub-budgets of the task deadline.
+        
+        Args:
+            agent: The agent to constrain
+            deadline: The overall task deadline
+            step_timeout: Budget for a single step in seconds
+            llm_timeout: Budget for a single LLM call in seconds
+            navigation_timeout: Budget for a single page navigation in seconds
+        """
+        original_step = agent.step
+        original_get_next_action = agent.get_next_action
+        
+        def set_navigation_timeout():
+            session = getattr(agent.browser_context, "session", None) if agent.browser_context else None
+            if session is not None:
+                # Playwright takes milliseconds and treats 0 as "no timeout"
+                budget = max(1.0, deadline.budget(navigation_timeout))
+                session.context.set_default_navigation_timeout(budget * 1000)
+        
+        async def step(step_info=None):
+            set_navigation_timeout()
+            try:
+                await deadline.run("step", lambda: original_step(step_info), step_timeout)
+            except StageTimeoutError as e:
+                # A step that overruns its own budget counts as a failed step; the agent's
+                # max_failures policy decides whether to carry on
+                agent.state.consecutive_failures += 1
+                agent.state.last_result = [ActionResult(error=str(e), include_in_memory=True)]
+        
+        async def get_next_action(input_messages):
+            model_output = await deadline.run(
+                "llm_call", lambda: original_get_next_action(input_messages), llm_timeout
+            )
+            # Refresh the navigation budget before the chosen actions run
+            set_navigation_timeout()
+            return model_output
+        
+        agent.step = step
+        agent.get_next_action = get_next_action
+    
+    def _time_browser_launch(self, browser: Optional[Browser]) -> None:
+        """
+        Time the launch of a browser into the browser launch histogram.
+        
+        browser-use launches the browser lazily, on the first use of its Playwright browser.
+        
+        Args:
+            browser: The browser to time; None and already launched browsers are left alone
+        """
+        if browser is None or browser.playwright_browser is not None:
+            return
+        original_init = browser._init
+        
+        async def init():
+            started_at = time.monotonic()
+            with tracer.span("browser.launch"):
+                playwright_browser = await original_init()
+            BROWSER_LAUNCH_DURATION.observe(time.monotonic() - started_at)
+            return playwright_browser
+        
+        browser._init = init
+    
+    def _apply_timing(self, agent: Agent, budget: Optional[TaskBudget] = None) -> None:
+        """
+        Time the agent's steps and browser actions into the usage histograms and, if there
+        is a budget, its per-step breakdown.
+        
+        Args:
+            agent: The agent to time
+            budget: Optional task budget that collects the per-step breakdown
+        """
+        original_step = agent.step
+        original_multi_act = agent.multi_act
+        
+        async def step(step_info=None):
+            if budget:
+                budget.start_step(agent.state.n_steps)
+            started_at = time.monotonic()
+            try:
+                await original_step(step_info)
+            finally:
+                AGENT_STEP_DURATION.observe(time.monotonic() - started_at)
+                if budget:
+                    budget.end_step()
+        
+        async def multi_act(actions, *args, **kwargs):
+            started_at = time.monotonic()
+            try:
+                return await original_multi_act(actions, *args, **kwargs)
+            finally:
+                elapsed = time.monotonic() - started_at
+                BROWSER_ACTION_DURATION.observe(elapsed)
+                if budget:
+                    budget.record_action_time(elapsed)
+        
+        agent.step = step
+        agent.multi_act = multi_act
+    
+    def _apply_tracing(self, agent: Agent) -> None:
+        """
+        Record the agent's steps, browser actions and page loads as spans of the current trace.
+        
+        The controller is shared by every agent created without one, and injected browser
+        contexts by the nodes of a workflow, so each is only wrapped once.
+        
+        Args:
+            agent: The agent to trace
+        """
+        original_step = agent.step
+        
+        async def step(step_info=None):
+            with tracer.span("agent.step", step=agent.state.n_steps):
+                await original_step(step_info)
+        
+        agent.step = step
+        
+        controller = agent.controller
+        if not getattr(controller, "_traced", False):
+            original_act = controller.act
+            
+            async def act(action, *args, **kwargs):
+                name = next(iter(action.model_dump(exclude_unset=True)), "unknown")
+                with tracer.span("browser.action", action=name):
+                    return await original_act(action, *args, **kwargs)
+            
+            controller.act = act
+            controller._traced = True
+        
+        browser_context = agent.browser_context
+        if browser_context is not None and not getattr(browser_context, "_traced", False):
+            original_get_state = browser_context.get_state
+            original_wait_for_load = browser_context._wait_for_page_and_frames_load
+            
+            async def get_state(*args, **kwargs):
+                with tracer.span("browser.get_state"):
+                    return await original_get_state(*args, **kwargs)
+            
+            async def wait_for_page_and_frames_load(*args, **kwargs):
+                with tracer.span("browser.page_load"):
+                    return await original_wait_for_load(*args, **kwargs)
+            
+            browser_context.get_state = get_state
+            browser_context._wait_for_page_and_frames_load = wait_for_page_and_frames_load
+            browser_context._traced = True
+    
+    def _apply_budget(self, agent: Agent, budget: TaskBudget) -> None:
+        """
+        Record the agent's step and token usage against a task budget and stop the run
+        before a step once any budget is used up.
+        
+        Args:
+            agent: The agent to constrain
+            budget: The task budget
+        """
+        original_step = agent.step
+        original_get_next_action = agent.get_next_action
+        
+        async def step(step_info=None):
+            # Raised outside browser-use's own step error handling, so it ends the run
+            budget.check()
+            await original_step(step_info)
+            budget.record_step(agent.state.n_steps)
+        
+        async def get_next_action(input_messages):
+            input_tokens_before = budget.input_tokens
+            model_output = await original_get_next_action(input_messages)
+            if budget.input_tokens == input_tokens_before:
+                # The provider reported no usage; fall back to the message manager's estimate
+                message_manager = getattr(agent, "_message_manager", None)
+                estimate = message_manager.state.history.current_tokens if message_manager else 0
+                budget.record_tokens(estimate, 0)
+            return model_output
+        
+        agent.step = step
+        agent.get_next_action = get_next_action
+    
+    def _apply_progress_monitor(self, agent: Agent, monitor: ProgressMonitor) -> None:
+        """
+        Feed each completed step to a progress monitor, nudging the agent when it loops or
+        stalls and failing the run when nudging does not help.
+        
+        Args:
+            agent: The agent to watch
+            monitor: The progress monitor for this run
+        """
+        original_step = agent.step
+        
+        async def step(step_info=None):
+            await original_step(step_info)
+            
+            history = agent.state.history.history
+            last = history[-1] if history else None
+            if not last or not last.model_output:
+                # Failed steps are handled by the agent's own max_failures policy
+                return
+            
+            url = last.state.url if last.state else ""
+            session = agent.browser_context.session if agent.browser_context else None
+            cached_state = session.cached_state if session else None
+            elements = [
+                f"{element.xpath} {json.dumps(element.attributes, sort_keys=True)} "
+                f"{element.get_all_text_till_next_clickable_element()}"
+                for element in cached_state.selector_map.values()
+            ] if cached_state else []
+            actions = [action.model_dump(exclude_unset=True) for action in last.model_output.action]
+            failed = any(result.error for result in last.result)
+            
+            dom_hash = hash_dom(url, elements, await self._form_field_values(agent))
+            verdict = monitor.record(url, actions, dom_hash, failed=failed)
+            if verdict == NUDGE:
+                await self._nudge_agent(agent, monitor.reason)
+            elif verdict == FAIL:
+                # Raised outside browser-use's own step error handling, so it ends the run
+                raise NoProgressError(monitor.reason)
+        
+        agent.step = step
+    
+    async def _form_field_values(self, agent: Agent) -> List[str]:
+        """
+        Read the current values of the page's form fields, which the DOM snapshot does not include.
+        
+        Args:
+            agent: The agent whose current page to read
+            
+        Returns:
+            List[str]: The field values in document order (empty if the page cannot be read)
+        """
+        try:
+            page = await agent.browser_context.get_current_page()
+            return await page.evaluate(
+                "() => Array.from(document.querySelectorAll('input, textarea, select'), "
+                "field => field.type === 'checkbox' || field.type === 'radio' ? String(field.checked) : field.value)"
+            )
+        except Exception as e:
+            logger.debug(f"Could not read form field values: {str(e)}")
+            return []
+    
+    async def _nudge_agent(self, agent: Agent, reason: str) -> None:
+        """
+        Tell the model it is not making progress and try to dismiss whatever is blocking the page.
+        
+        Args:
+            agent: The agent to nudge
+            reason: Why the agent is considered stuck
+        """
+        agent._message_manager._add_message_with_tokens(HumanMessage(content=(
+            f"You are not making progress: {reason}. Do not repeat the same actions. "
+            "Close any open dialog or popup, wait for the page to finish loading, or try a different approach. "
+            "If the task cannot be completed, use the done action and explain why."
+        )))
+        
+        try:
+            # Escape closes most modal dialogs, cookie banners and popups
+            page = await agent.browser_context.get_current_page()
+            await page.keyboard.press("Escape")
+        except Exception as e:
+            logger.debug(f"Could not dismiss dialogs: {str(e)}")
+    
+    async def create_browser_session(self, headless: bool = True) -> tuple[Browser, Any]:
+        """
+        Create a browser and browser context owned by the caller rather than by an Agent.
+        
+        Agents given an injected browser/context do not close them when they finish, so the
+        same context (cookies, logged-in state, open page) can be handed to the next agent.
+        The caller is responsible for releasing it with close_browser_session().
+        
+        Args:
+            headless: Whether to run in headless mode
+            
+        Returns:
+            tuple: (browser, browser_context)
+        """
+        browser = Browser(config=BrowserConfig(headless=headless))
+        self._time_browser_launch(browser)
+        browser_context = await browser.new_context(config=self._build_context_config())
+        return browser, browser_context
+    
+    async def close_browser_session(self, browser: Optional[Browser], browser_context: Any = None) -> None:
+        """
+        Close a browser session created with create_browser_session().
+        
+        Args:
+            browser: The browser to close
+            browser_context: The browser context to close
+        """
+        if browser_context:
+            try:
+                await browser_context.close()
+            except Exception as e:
+                logger.warning(f"Error closing browser context: {str(e)}")
+        if browser:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"Error closing browser: {str(e)}")
+    
     async def create_agent(
         self,
         task: str,
@@ -73,11 +624,7 @@ class AgentAdapter:
         )
         
         # Configure browser context settings
-        context_config = BrowserContextConfig(
-            highlight_elements=True,  # Highlight elements for better visibility
-            wait_for_network_idle_page_load_time=3.0,  # Increase wait time for better reliability
-            browser_window_size={'width': 1920, 'height': 1080},  # Set window size
-        )
+        context_config = self._build_context_config()
         
         # Create agent
         agent = Agent(
@@ -107,7 +654,14 @@ class AgentAdapter:
         llm_provider = None,
         operation_timeout: int = 300,
         options: Optional[Dict[str, Any]] = None,
-        previous_output: Optional[Dict[str, Any]] = None
+        previous_output: Union[PreviousOutputResolver, Dict[str, Any], None] = None,
+        browser: Optional[Browser] = None,
+        browser_context: Any = None,
+        step_timeout: Optional[float] = None,
+        llm_timeout: Optional[float] = None,
+        navigation_timeout: Optional[float] = None,
+        budget: Optional[TaskBudget] = None,
+        progress_monitor: Optional[ProgressMonitor] = None
     ) -> Dict[str, Any]:
         """
         Execute a task using the browser-use library.
@@ -117,13 +671,25 @@ class AgentAdapter:
             task_id: The task ID
             headless: Whether to run in headless mode
             llm_provider: The LLM provider configuration
-            operation_timeout: Timeout for the operation in seconds
+            operation_timeout: Deadline for the whole task in seconds
             options: Additional options for the task
-            previous_output: Output from a previous agent task
+            previous_output: Output from previous agent tasks, either inline or as a lazy resolver
+            browser: Optional caller-owned browser (see create_browser_session)
+            browser_context: Optional caller-owned browser context to continue in
+            step_timeout: Budget for a single agent step, capped by the task deadline
+            llm_timeout: Budget for a single LLM call, capped by the task deadline
+            navigation_timeout: Budget for a single page navigation, capped by the task deadline
+            budget: Optional step, token and wall-time budget; usage is recorded on it as the agent runs
+            progress_monitor: Optional loop and stall detector for the run
             
         Returns:
             Dict: The result of the task execution
         """
+        # The deadline starts now so that browser start-up and state restoration count against it
+        deadline = Deadline(operation_timeout)
+        agent = None
+        span, span_token = tracer.start_span("agent.execute_task", task_id=task_id)
+        
         try:
             # Check if we're resuming from a saved state
             resuming = False
@@ -137,6 +703,8 @@ class AgentAdapter:
             # Get LLM provider strategy
             provider_type = llm_provider.type if llm_provider and hasattr(llm_provider, 'type') else "gemini"
             llm_strategy = LLMProviderFactory.get_provider(provider_type)
+            if span:
+                span.set_attribute("provider", provider_type)
             
             # Configure browser settings
             browser_config = BrowserConfig(
@@ -144,41 +712,70 @@ class AgentAdapter:
             )
             
             # Configure browser context settings
-            context_config = BrowserContextConfig(
-                highlight_elements=True,  # Highlight elements for better visibility
-                wait_for_network_idle_page_load_time=3.0,  # Increase wait time for better reliability
-                browser_window_size={'width': 1920, 'height': 1080},  # Set window size
-            )
+            context_config = self._build_context_config()
             
-            # Configure browser context with previous output
-            if previous_output:
-                context_config.storage_state = {
-                    "previous_output": previous_output if previous_output else {}
-                }
+            # Inline output is wrapped so that it is resolved the same way as references
+            if isinstance(previous_output, dict):
+                previous_output = PreviousOutputResolver(inline=previous_output)
             
             # Create agent
+            # A model cascade plans with its strong model every few steps and executes with
+            # the fast one; page content extraction also uses the fast model
+            planner_llm = llm_strategy.get_planner_llm() if isinstance(llm_strategy, CascadeLLMStrategy) else None
+            
+            # Expose the previous output as an action of the agent's own controller; agents
+            # without one share browser-use's default controller
+            agent_options = {}
+            if previous_output:
+                agent_options["controller"] = self._previous_output_controller(previous_output)
+                logger.info(f"Added get_previous_agent_output action for task {task_id}")
+            
             agent = Agent(
                 task=task,
                 llm=llm_strategy.get_llm(),
-                # Pass browser configuration
-                browser=None,  # Will be created by the Agent
-                browser_context=None,  # Will be created by the Agent
+                tool_calling_method=llm_strategy.tool_calling_method or "auto",
+                planner_llm=planner_llm,
+                planner_interval=llm_strategy.planner_interval if planner_llm else 1,
+                # Pass browser configuration; an injected browser/context is left open
+                # by the Agent so it can be handed to the next workflow node
+                browser=browser,  # Created by the Agent when None
+                browser_context=browser_context,  # Created by the Agent when None
                 # Additional settings
                 generate_gif=True,  # Generate GIF recordings
                 save_conversation_path=os.path.join(os.getcwd(), "recordings", f"{task_id}.json"),
+                **agent_options,
             )
             
-            # Add custom function to access previous output if available
-            if previous_output:
-                agent.add_function(
-                    "get_previous_agent_output",
-                    lambda: previous_output['data'] if 'data' in previous_output else {}
-                )
-                logger.info(f"Added get_previous_agent_output function for task {task_id}")
-            
             # Add is_paused attribute to the agent
             agent.is_paused = False
             
+            # Mark the stable prompt prefix for caching and pace LLM calls across all tasks using
+            # this provider (queue time counts towards the call's budget); routed and cascaded
+            # calls are marked and paced per provider
+            if isinstance(llm_strategy, RoutingLLMStrategy):
+                self._apply_routing(agent, llm_strategy)
+            elif isinstance(llm_strategy, CascadeLLMStrategy):
+                self._apply_cascade(agent, llm_strategy, budget)
+            else:
+                self._apply_prompt_caching(agent, llm_strategy)
+                if llm_strategy.rate_limiter is not None:
+                    self._apply_rate_limit(agent, llm_strategy.rate_limiter, budget)
+            # Agents sending the same request at the same moment share one call (and rate limiter slot)
+            self._apply_coalescing(agent, llm_strategy)
+            
+            # Bound every step, LLM call and navigation by the task deadline
+            self._apply_deadline(agent, deadline, step_timeout, llm_timeout, navigation_timeout)
+            # Account browser launch, step, LLM and browser action time; injected browsers
+            # are timed by create_browser_session()
+            if browser is None:
+                self._time_browser_launch(agent.browser)
+            self._apply_timing(agent, budget)
+            self._apply_tracing(agent)
+            if budget:
+                self._apply_budget(agent, budget)
+            if progress_monitor:
+                self._apply_progress_monitor(agent, progress_monitor)
+            
             # Store agent
             self.active_agents[task_id] = agent
             
@@ -203,7 +800,12 @@ class AgentAdapter:
                             logger.error(f"Browser or browser context not initialized for task {task_id}")
                             raise Exception("Browser not properly initialized")
                     
-                    restoration_success = await restore_state(agent.page, resume_data)
+                    with tracer.span("agent.restore_state"):
+                        restoration_success = await deadline.run(
+                            "navigation", lambda: restore_state(agent.page, resume_data), navigation_timeout
+                        )
+                except DeadlineExceededError:
+                    raise
                 except Exception as e:
                     logger.error(f"Error accessing or restoring page for task {task_id}: {str(e)}")
                     restoration_success = False
@@ -218,8 +820,16 @@ class AgentAdapter:
                 else:
                     logger.warning(f"State restoration had some issues for task {task_id}, but continuing execution")
             
-            # Run the agent
-            result = await agent.run()
+            # Run the agent; on expiry the run is cancelled and the agent closes its own browser
+            max_steps = budget.max_steps if budget and budget.max_steps else 100
+            usage_handler = TokenUsageHandler(
+                budget.record_tokens,
+                budget.record_cache_usage,
+                on_call=budget.record_llm_call,
+                on_idle_wait=budget.record_idle_wait,
+            ) if budget else None
+            with track_token_usage(usage_handler):
+                result = await deadline.run("task", lambda: agent.run(max_steps=max_steps))
             
             # Format the response
             response = {
@@ -227,12 +837,64 @@ class AgentAdapter:
                 "result": result,
             }
             
+            # Running out of steps without finishing is a budget outcome, not a success
+            if budget and budget.max_steps and not result.is_done() and agent.state.n_steps >= budget.max_steps:
+                response["status"] = "budget_exhausted"
+                response["error"] = str(BudgetExhaustedError("steps", budget.max_steps, agent.state.n_steps))
+            if budget:
+                response["usage"] = budget.usage()
+            
             # Clean up resources
             await self.cleanup_task(task_id)
             
             return response
+        except asyncio.CancelledError as e:
+            # Paused or cancelled: agent.run() has already closed the browser it owns
+            logger.info(f"Task {task_id} execution cancelled")
+            if span:
+                span.record_error(e)
+            await self.cleanup_task(task_id)
+            raise
+        except BudgetExhaustedError as e:
+            logger.warning(f"Task {task_id} stopped early: {str(e)}")
+            
+            # Clean up resources
+            await self.cleanup_task(task_id)
+            
+            return {
+                "status": "budget_exhausted",
+                "error": str(e),
+                "result": agent.state.history if agent else None,
+                "usage": budget.usage() if budget else None,
+            }
+        except NoProgressError as e:
+            logger.warning(f"Task {task_id} failed fast: {str(e)}")
+            
+            # Clean up resources
+            await self.cleanup_task(task_id)
+            
+            return {
+                "status": "failed",
+                "error": f"Agent stopped making progress: {str(e)}",
+                "failed_stage": "progress",
+                "result": agent.state.history if agent else None,
+            }
+        except DeadlineExceededError as e:
+            step = agent.state.n_steps if agent else 0
+            logger.warning(f"Task {task_id} cancelled at step {step}: {str(e)}")
+            
+            # Clean up resources
+            await self.cleanup_task(task_id)
+            
+            return {
+                "status": "failed",
+                "error": f"{str(e)} (step {step})",
+                "failed_stage": e.stage,
+            }
         except Exception as e:
             logger.exception(f"Error executing task {task_id}: {str(e)}")
+            if span:
+                span.record_error(e)
 
             # Clean up resources
             await self.cleanup_task(task_id)
@@ -241,6 +903,10 @@ class AgentAdapter:
                 "status": "failed", 
                 "error": str(e),   
             }
+        finally:
+            if span and agent:
+                span.set_attribute("steps", agent.state.n_steps)
+            tracer.end_span(span, span_token)
     
     async def pause_task(self, task_id: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,234 @@
+"""
+Per-task resource budgets.
+
+A TaskBudget caps the steps, LLM tokens and wall time a task may use. Usage is recorded
+as the agent runs and checked between steps, so a task that cannot make progress is
+stopped early with a "budget_exhausted" outcome instead of running to its deadline.
+It also accounts where the time went: LLM latency per model, browser action time and
+time spent queued for rate limiter slots, in total and per step.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _rounded(timing: Dict[str, Any]) -> Dict[str, Any]:
+    """A step breakdown with its durations rounded for reporting."""
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in timing.items()}
+
+
+class BudgetExhaustedError(Exception):
+    """Raised when a task has used up one of its budgets."""
+
+    def __init__(self, resource: str, limit: float, used: float):
+        self.resource = resource
+        self.limit = limit
+        self.used = used
+        super().__init__(f"{resource} budget exhausted: used {used:g} of {limit:g}")
+
+
+class TaskBudget:
+    """Step, token and wall-time limits of a task and its usage so far."""
+
+    def __init__(
+        self,
+        max_steps: Optional[int] = None,
+        max_input_tokens: Optional[int] = None,
+        max_output_tokens: Optional[int] = None,
+        max_wall_time: Optional[float] = None,
+        on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.max_steps = max_steps
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.max_wall_time = max_wall_time
+        self.on_update = on_update
+
+        self.started_at = time.monotonic()
+        self.steps = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        # Provider-side prompt caching; cached input tokens are billed at a discount
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cached_input_tokens = 0
+        self.cache_write_tokens = 0
+        # Agent steps per model tier when a model cascade is used
+        self.steps_by_tier: Dict[str, int] = {}
+        # LLM and browser time; idle wait is time spent queued for a rate limiter slot
+        self.llm_calls = 0
+        self.llm_latency = 0.0
+        self.time_to_first_token_total = 0.0
+        self.streamed_llm_calls = 0
+        self.action_time = 0.0
+        self.idle_wait = 0.0
+        self.usage_by_model: Dict[str, Dict[str, Any]] = {}
+        # Per-step breakdown; the open step collects the calls made while it runs
+        self.step_timings: List[Dict[str, Any]] = []
+        self._current_step: Optional[Dict[str, Any]] = None
+        self._step_started_at = 0.0
+
+    def _notify(self) -> None:
+        # Called on every LLM call, so the per-step breakdown is left for the final usage
+        if self.on_update:
+            self.on_update(self.usage(include_step_timings=False))
+
+    def record_step(self, steps: int) -> None:
+        """Record the number of steps taken so far."""
+        self.steps = steps
+        self._notify()
+
+    def record_tokens(self, input_tokens: int, output_tokens: int) -> None:
+        """Add the token usage of an LLM call."""
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        if self._current_step is not None:
+            self._current_step["input_tokens"] += input_tokens
+            self._current_step["output_tokens"] += output_tokens
+        self._notify()
+
+    def record_llm_call(
+        self, model: str, input_tokens: int, output_tokens: int, latency: float, time_to_first_token: Optional[float]
+    ) -> None:
+        """
+        Record the timing of an LLM call and its tokens per model.
+
+        Totals of the tokens are recorded separately with record_tokens().
+
+        Args:
+            model: "provider/model" of the call
+            input_tokens: Input tokens of the call
+            output_tokens: Output tokens of the call
+            latency: Duration of the call in seconds
+            time_to_first_token: Seconds to the first streamed token, or None if the call was not streamed
+        """
+        self.llm_calls += 1
+        self.llm_latency += latency
+        if time_to_first_token is not None:
+            self.streamed_llm_calls += 1
+            self.time_to_first_token_total += time_to_first_token
+        by_model = self.usage_by_model.setdefault(
+            model, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "latency": 0.0}
+        )
+        by_model["calls"] += 1
+        by_model["input_tokens"] += input_tokens
+        by_model["output_tokens"] += output_tokens
+        by_model["latency"] += latency
+        if self._current_step is not None:
+            self._current_step["llm_calls"] += 1
+            self._current_step["llm_latency"] += latency
+            if self._current_step["time_to_first_token"] is None and time_to_first_token is not None:
+                self._current_step["time_to_first_token"] = time_to_first_token
+        self._notify()
+
+    def record_action_time(self, seconds: float) -> None:
+        """Add time spent executing browser actions."""
+        self.action_time += seconds
+        if self._current_step is not None:
+            self._current_step["action_time"] += seconds
+
+    def record_idle_wait(self, seconds: float) -> None:
+        """Add time an LLM call spent queued for a rate limiter slot."""
+        self.idle_wait += seconds
+        if self._current_step is not None:
+            self._current_step["idle_wait"] += seconds
+
+    def start_step(self, step: int) -> None:
+        """Open the per-step breakdown of an agent step."""
+        self._step_started_at = time.monotonic()
+        self._current_step = {
+            "step": step,
+            "duration": 0.0,
+            "llm_calls": 0,
+            "llm_latency": 0.0,
+            "time_to_first_token": None,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "action_time": 0.0,
+            "idle_wait": 0.0,
+        }
+
+    def end_step(self) -> None:
+        """Close the open step's breakdown."""
+        if self._current_step is None:
+            return
+        self._current_step["duration"] = time.monotonic() - self._step_started_at
+        self.step_timings.append(self._current_step)
+        self._current_step = None
+        self._notify()
+
+    def record_cache_usage(self, cache_read_tokens: int, cache_write_tokens: int) -> None:
+        """Record the prompt cache reads and writes of an LLM call."""
+        if cache_read_tokens:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+        self.cached_input_tokens += cache_read_tokens
+        self.cache_write_tokens += cache_write_tokens
+        self._notify()
+
+    def record_tier(self, tier: str) -> None:
+        """Record which model tier decided a step."""
+        self.steps_by_tier[tier] = self.steps_by_tier.get(tier, 0) + 1
+        self._notify()
+
+    def wall_time(self) -> float:
+        """Seconds since the task started."""
+        return time.monotonic() - self.started_at
+
+    def usage(self, include_step_timings: bool = True) -> Dict[str, Any]:
+        """
+        Usage so far, as reported in the task status.
+
+        Args:
+            include_step_timings: Include the per-step breakdown, which grows with every step
+
+        Returns:
+            Dict[str, Any]: Totals of the task's usage, and its step timings if requested
+        """
+        usage = {
+            "steps": self.steps,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "wall_time": round(self.wall_time(), 3),
+            "prompt_cache": {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "cached_input_tokens": self.cached_input_tokens,
+                "cache_write_tokens": self.cache_write_tokens,
+            },
+            "steps_by_tier": dict(self.steps_by_tier),
+            "llm_calls": self.llm_calls,
+            "llm_latency": round(self.llm_latency, 3),
+            "time_to_first_token_avg": (
+                round(self.time_to_first_token_total / self.streamed_llm_calls, 3) if self.streamed_llm_calls else None
+            ),
+            "action_time": round(self.action_time, 3),
+            "idle_wait": round(self.idle_wait, 3),
+            "by_model": {
+                model: {**totals, "latency": round(totals["latency"], 3)}
+                for model, totals in self.usage_by_model.items()
+            },
+        }
+        if include_step_timings:
+            usage["step_timings"] = [_rounded(timing) for timing in self.step_timings]
+        return usage
+
+    def exhausted(self) -> Optional[BudgetExhaustedError]:
+        """Return the error for the first exhausted budget, or None."""
+        checks = [
+            ("steps", self.max_steps, self.steps),
+            ("input_tokens", self.max_input_tokens, self.input_tokens),
+            ("output_tokens", self.max_output_tokens, self.output_tokens),
+            ("wall_time", self.max_wall_time, self.wall_time()),
+        ]
+        for resource, limit, used in checks:
+            if limit is not None and used >= limit:
+                return BudgetExhaustedError(resource, limit, used)
+        return None
+
+    def check(self) -> None:
+        """Raise BudgetExhaustedError if any budget is used up."""
+        error = self.exhausted()
+        if error:
+            raise error
@@ -0,0 +1,8 @@
+"""
+Generic in-process caching primitives, re-exported from strategies.cache for the core modules.
+"""
+
+from strategies.cache import SingleFlight
+from strategies.cache import TTLCache
+
+__all__ = ["SingleFlight", "TTLCache"]
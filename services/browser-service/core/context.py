@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
 import asyncio
 import subprocess
 import json
@@ -7,9 +7,14 @@ import re
 import os
 from datetime import datetime
 import uuid
+from contextlib import aclosing
+
+from pydantic import ValidationError
 
 from strategies.base import LLMProviderStrategy
 from .visualization import BrowserVisualization
+from .action_stream import IncrementalActionParser
+from .models import ActionPlan, BrowserAction
 
 logger = logging.getLogger(__name__)
 
@@ -119,18 +124,45 @@ class BrowserUseContext:
                     "message": f"Execution is paused: {self.pause_reason}"
                 }
                 
-            # Generate browser actions from LLM
-            prompt = f"Generate browser actions to accomplish the following task: {task}. Return a list of actions in JSON format with each action having 'type' and 'params' fields. Supported action types are: navigate, click, type, screenshot, wait, scroll, press_key, select_option, hover, and get_text."
-            logger.debug(f"Sending prompt to LLM: {prompt}")
-            
             try:
-                actions_text = await self.llm_provider.generate_response(prompt, options)
-                logger.debug(f"Received response from LLM: {actions_text[:100]}...")
+                # Actions are executed as soon as they are complete in the streamed response,
+                # so page loads overlap with the model writing the rest of the plan
+                response_chunks: List[str] = []
+                actions_executed = []
+                async with aclosing(self._plan_actions(task, options, response_chunks)) as actions:
+                    async for action in actions:
+                        # Check if execution is paused before executing each action
+                        if self.is_paused:
+                            # Take a final screenshot before returning
+                            screenshot_path = await self._take_screenshot(f"paused_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+                            
+                            return {
+                                "task": task,
+                                "llm_response": "".join(response_chunks),
+                                "actions_executed": actions_executed,
+                                "success": False,
+                                "status": "paused",
+                                "message": f"Execution is paused: {self.pause_reason}",
+                                "screenshot": screenshot_path
+                            }
+                            
+                        try:
+                            result = await self._execute_action(action)
+                            actions_executed.append({
+                                "action": action,
+                                "result": result
+                            })
+                        except Exception as e:
+                            logger.error(f"Error executing action {action}: {str(e)}")
+                            actions_executed.append({
+                                "action": action,
+                                "error": str(e)
+                            })
                 
-                # Parse actions from LLM response
-                actions = self._parse_actions(actions_text)
+                actions_text = "".join(response_chunks)
+                logger.debug(f"Received response from LLM: {actions_text[:100]}...")
                 
-                if not actions:
+                if not actions_executed:
                     return {
                         "task": task,
                         "llm_response": actions_text,
@@ -139,37 +171,6 @@ class BrowserUseContext:
                         "error": "Failed to parse actions from LLM response"
                     }
                 
-                # Execute actions
-                actions_executed = []
-                for action in actions:
-                    # Check if execution is paused before executing each action
-                    if self.is_paused:
-                        # Take a final screenshot before returning
-                        screenshot_path = await self._take_screenshot(f"paused_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-                        
-                        return {
-                            "task": task,
-                            "llm_response": actions_text,
-                            "actions_executed": actions_executed,
-                            "success": False,
-                            "status": "paused",
-                            "message": f"Execution is paused: {self.pause_reason}",
-                            "screenshot": screenshot_path
-                        }
-                        
-                    try:
-                        result = await self._execute_action(action)
-                        actions_executed.append({
-                            "action": action,
-                            "result": result
-                        })
-                    except Exception as e:
-                        logger.error(f"Error executing action {action}: {str(e)}")
-                        actions_executed.append({
-                            "action": action,
-                            "error": str(e)
-                        })
-                
                 # Take a final screenshot
                 screenshot_path = await self._take_screenshot("final")
                 
@@ -196,6 +197,78 @@ class BrowserUseContext:
                 "error": str(e)
             }
     
+    async def _plan_actions(
+        self, task: str, options: Optional[Dict[str, Any]], response_chunks: List[str]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ask the LLM for the task's actions and yield each one as soon as it is complete.
+        
+        Providers with tool calling return the plan as structured output validated against
+        ActionPlan; others return text, and if no action could be parsed from it
+        incrementally the full response is parsed with _parse_actions instead. The
+        response is read by a background task, so the model keeps streaming while the
+        caller executes the actions yielded so far.
+        
+        Args:
+            task: The browser task
+            options: Options for the LLM provider
+            response_chunks: Receives the streamed response text
+        
+        Yields:
+            Dict[str, Any]: The planned actions, in order
+        """
+        task_prompt = f"Generate browser actions to accomplish the following task: {task}."
+        structured = self.llm_provider.supports_structured_output()
+        if structured:
+            prompt = task_prompt
+            stream = self.llm_provider.astream_structured(prompt, ActionPlan, options)
+        else:
+            # Static instructions go before the task so they extend the cacheable prompt prefix
+            prompt = "Return a list of actions in JSON format with each action having 'type' and 'params' fields. Supported action types are: navigate, click, type, screenshot, wait, scroll, press_key, select_option, hover, and get_text. " + task_prompt
+            stream = self.llm_provider.astream_response(prompt, options)
+        logger.debug(f"Sending prompt to LLM ({'structured' if structured else 'text'} output): {prompt}")
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        end_of_stream = object()
+        parser = IncrementalActionParser()
+        
+        async def read_stream():
+            try:
+                async for chunk in stream:
+                    response_chunks.append(chunk)
+                    for action in parser.feed(chunk):
+                        queue.put_nowait(action)
+            finally:
+                queue.put_nowait(end_of_stream)
+        
+        reader = asyncio.create_task(read_stream())
+        try:
+            while True:
+                action = await queue.get()
+                if action is end_of_stream:
+                    break
+                if structured:
+                    action = self._validate_action(action)
+                    if action is None:
+                        continue
+                yield action
+            # Surface errors from the stream
+            await reader
+        finally:
+            reader.cancel()
+        
+        if not parser.actions_parsed and not structured:
+            for action in self._parse_actions("".join(response_chunks)):
+                yield action
+    
+    def _validate_action(self, action: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Validate a structured output action against BrowserAction; invalid actions are skipped"""
+        try:
+            return BrowserAction.model_validate(action).model_dump(mode="json", exclude_none=True)
+        except ValidationError as e:
+            logger.warning(f"Skipping invalid action {action}: {str(e)}")
+            return None
+    
     async def _execute_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a single browser action"""
         # Check if execution is paused
@@ -437,7 +510,7 @@ class BrowserUseContext:
         try:
             # Send SIGTERM to ffmpeg
             process_to_stop.terminate()
-            process_to_stop.wait(timeout=5)
+            await asyncio.to_thread(process_to_stop.wait, 5)
             
             logger.info("Recording stopped")
             self.recording_process = None
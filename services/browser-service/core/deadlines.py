@@ -0,0 +1,124 @@
+"""
+Hierarchical deadlines for task execution.
+
+A task runs under one overall deadline. Each step, LLM call and page navigation gets a
+sub-budget that is capped by whatever is left of the task deadline, so no stage can
+outlive the task. When a budget expires the running coroutine is cancelled and the stage
+that overran is reported.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimeoutError(Exception):
+    """Raised when a stage (step, LLM call, navigation) exceeds its own budget."""
+
+    def __init__(self, stage: str, timeout_seconds: float):
+        self.stage = stage
+        self.timeout_seconds = timeout_seconds
+        super().__init__(f"{stage} timed out after {timeout_seconds:.1f}s")
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the overall task deadline expires."""
+
+    def __init__(self, stage: str, timeout_seconds: float):
+        self.stage = stage
+        self.timeout_seconds = timeout_seconds
+        super().__init__(f"Task deadline of {timeout_seconds:.0f}s exceeded during {stage}")
+
+
+class Deadline:
+    """
+    The overall deadline of a task and the sub-budgets derived from it.
+
+    Stages are run through run(), which tracks the innermost stage executing when the
+    deadline expired so that it can be reported even if an outer stage is the one that
+    notices.
+    """
+
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.expires_at = time.monotonic() + timeout_seconds
+        self.stage = "task"
+        self.expired_during: Optional[str] = None
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, limit: Optional[float] = None) -> float:
+        """The budget for a stage: its own limit, capped by the time left."""
+        remaining = self.remaining()
+        return remaining if not limit else min(limit, remaining)
+
+    def error(self, stage: Optional[str] = None) -> DeadlineExceededError:
+        """Build the error for an expired deadline, naming the innermost stage that was running."""
+        if self.expired_during is None:
+            self.expired_during = stage or self.stage
+        return DeadlineExceededError(self.expired_during, self.timeout_seconds)
+
+    async def run(self, stage: str, fn: Callable[[], Awaitable[Any]], limit: Optional[float] = None) -> Any:
+        """
+        Run a stage under its budget, cancelling it when the budget expires.
+
+        Args:
+            stage: Name of the stage, used in errors
+            fn: Zero-argument coroutine function performing the stage
+            limit: The stage's own budget in seconds; None for the rest of the task deadline
+
+        Returns:
+            Any: The stage's result
+
+        Raises:
+            DeadlineExceededError: If the task deadline expired during the stage
+            StageTimeoutError: If the stage exceeded its own budget
+        """
+        if self.expired:
+            raise self.error(stage)
+
+        timeout = self.budget(limit)
+        previous_stage, self.stage = self.stage, stage
+        task = asyncio.ensure_future(fn())
+        expired = False
+
+        def expire() -> None:
+            nonlocal expired
+            if not task.done():
+                expired = True
+                task.cancel()
+
+        timer = asyncio.get_running_loop().call_later(timeout, expire)
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if expired and not asyncio.current_task().cancelling():
+                # This stage's own budget ran out
+                result = None
+            else:
+                # An outer stage's budget ran out; the innermost stage unwinds first and is
+                # the one worth reporting
+                if self.expired and self.expired_during is None:
+                    self.expired_during = stage
+                raise
+        finally:
+            timer.cancel()
+            self.stage = previous_stage
+
+        # Some library code swallows the cancellation (e.g. a return inside a finally
+        # block) and returns nothing; a stage that still produced a result is kept
+        if expired and result is None:
+            if self.expired:
+                raise self.error(stage)
+            logger.warning(f"Stage {stage} exceeded its {timeout:.1f}s budget")
+            raise StageTimeoutError(stage, timeout)
+        return result
@@ -0,0 +1,115 @@
+"""
+Idempotency key support for API endpoints.
+
+Responses are remembered per (scope, Idempotency-Key) in a bounded TTL map, so that a
+client retrying after a timeout gets the original response instead of triggering the
+operation a second time. Retries that arrive while the original is still being handled
+wait for it and share its outcome.
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .cache import SingleFlight
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused with a different request."""
+
+
+class _StoredOutcome:
+    """The remembered outcome of an idempotent request."""
+
+    def __init__(self, fingerprint: str, result: Any = None, error: Optional[BaseException] = None):
+        self.fingerprint = fingerprint
+        self.result = result
+        self.error = error
+
+
+class IdempotencyStore:
+    """Bounded, expiring store of responses keyed by idempotency key."""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 3600,
+        should_store_error: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.outcomes = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.flights = SingleFlight()
+        self._in_flight_fingerprints: Dict[str, str] = {}
+        # Errors are not remembered unless the predicate says so (e.g. client errors)
+        self.should_store_error = should_store_error or (lambda error: False)
+        self.replays = 0
+
+    def _check_fingerprint(self, store_key: str, expected: str, fingerprint: str) -> None:
+        """Reject reuse of a key for a different request."""
+        if expected != fingerprint:
+            raise IdempotencyConflictError(
+                f"Idempotency key {store_key.split(':', 1)[-1]} was already used for a different request"
+            )
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        fingerprint: str,
+        handler: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """
+        Run the handler once per (scope, key) and replay its outcome for repeats.
+
+        Args:
+            scope: The operation the key applies to, e.g. "cancel:<task_id>"
+            key: The client-supplied idempotency key
+            fingerprint: Digest of the request; repeats must match it
+            handler: Zero-argument coroutine function performing the operation
+
+        Returns:
+            Tuple[Any, bool]: (result, replayed)
+
+        Raises:
+            IdempotencyConflictError: If the key was used for a different request
+        """
+        store_key = f"{scope}:{key}"
+
+        outcome = self.outcomes.get(store_key)
+        if outcome is not None:
+            self._check_fingerprint(store_key, outcome.fingerprint, fingerprint)
+            self.replays += 1
+            logger.info(f"Replaying stored response for idempotency key {key} ({scope})")
+            if outcome.error is not None:
+                raise outcome.error
+            return outcome.result, True
+
+        if store_key in self._in_flight_fingerprints:
+            self._check_fingerprint(store_key, self._in_flight_fingerprints[store_key], fingerprint)
+
+        async def _run_and_store():
+            self._in_flight_fingerprints[store_key] = fingerprint
+            try:
+                result = await handler()
+            except Exception as e:
+                if self.should_store_error(e):
+                    self.outcomes.set(store_key, _StoredOutcome(fingerprint, error=e))
+                raise
+            finally:
+                self._in_flight_fingerprints.pop(store_key, None)
+            self.outcomes.set(store_key, _StoredOutcome(fingerprint, result=result))
+            return result
+
+        result, shared = await self.flights.do(store_key, _run_and_store)
+        if shared:
+            self.replays += 1
+        return result, shared
+
+    def stats(self) -> Dict[str, Any]:
+        """Store statistics."""
+        return {
+            "entries": len(self.outcomes),
+            "in_flight": len(self.flights),
+            "replays": self.replays,
+        }
@@ -0,0 +1,162 @@
+"""
+Event loop lag monitoring and blocking-call detection.
+
+A coroutine measures how late the loop wakes it from a short sleep: the time the loop
+spent running other code without yielding. A watchdog thread notices when the loop has
+not woken the coroutine for longer than the stall threshold and, while the loop is still
+blocked, logs the stack of the loop thread and the task it is running, which points at
+the blocking call. Recent lag samples give the percentiles reported by /health and /metrics.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from .metrics import FAST_BUCKETS
+from .metrics import Counter
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer that was due", FAST_BUCKETS
+)
+EVENT_LOOP_STALLS = Counter(
+    "event_loop_stalls", "Times the event loop was blocked for longer than the stall threshold"
+)
+
+
+class EventLoopMonitor:
+    """Measures event loop lag and logs what the loop was running when it stalled."""
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        stall_threshold: float = 0.5,
+        window: int = 1200,
+        max_stalls: int = 20,
+        stack_depth: int = 30,
+    ):
+        """
+        Initialize the monitor.
+
+        Args:
+            interval: Seconds between lag samples
+            stall_threshold: Lag in seconds past which the loop's stack is logged
+            window: Number of recent samples the percentiles are computed from
+            max_stalls: Number of recent stalls kept for stats()
+            stack_depth: Innermost frames of the loop thread's stack to log
+        """
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.stack_depth = stack_depth
+        self.stall_count = 0
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._stalls: Deque[Dict[str, Any]] = deque(maxlen=max_stalls)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        # When the sampling coroutine last went to sleep, and the sleep already reported as a stall
+        self._last_tick: Optional[float] = None
+        self._reported_tick: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """Start sampling the running loop and watching it from a thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._thread = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stop sampling and the watchdog thread."""
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread:
+            await asyncio.to_thread(self._thread.join, 1.0)
+
+    async def _sample(self) -> None:
+        while True:
+            started_at = time.monotonic()
+            self._last_tick = started_at
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started_at - self.interval)
+            self._samples.append(lag)
+            EVENT_LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        poll = max(0.01, self.stall_threshold / 4)
+        while not self._stopping.wait(poll):
+            last_tick = self._last_tick
+            if last_tick is None or last_tick == self._reported_tick:
+                continue
+            blocked_for = time.monotonic() - last_tick - self.interval
+            if blocked_for > self.stall_threshold:
+                # Once per stall; the loop is still blocked, so its stack shows the culprit
+                self._reported_tick = last_tick
+                self._report_stall(blocked_for)
+
+    def _report_stall(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=self.stack_depth) if frame else []
+        try:
+            task = asyncio.current_task(self._loop)
+        except Exception:
+            task = None
+        coroutine = getattr(task.get_coro(), "__qualname__", None) if task else None
+
+        self.stall_count += 1
+        EVENT_LOOP_STALLS.inc()
+        self._stalls.append({
+            "at": datetime.now().isoformat(),
+            "blocked_for": round(blocked_for, 3),
+            "task": task.get_name() if task else None,
+            "coroutine": coroutine,
+            # The innermost frame, where the loop was when the stall was noticed
+            "location": stack[-1].strip().splitlines()[0] if stack else None,
+        })
+        logger.warning(
+            f"Event loop blocked for at least {blocked_for:.3f}s in task "
+            f"{task.get_name() if task else None} ({coroutine}):\n{''.join(stack)}"
+        )
+
+    def lag_percentiles(self) -> Dict[str, float]:
+        """The 50th, 90th and 99th percentile and maximum of the recent lag samples, in seconds."""
+        samples = sorted(self._samples)
+        if not samples:
+            return {}
+        return {
+            "p50": round(samples[int(0.5 * (len(samples) - 1))], 6),
+            "p90": round(samples[int(0.9 * (len(samples) - 1))], 6),
+            "p99": round(samples[int(0.99 * (len(samples) - 1))], 6),
+            "max": round(samples[-1], 6),
+        }
+
+    def recent_stalls(self) -> List[Dict[str, Any]]:
+        """The most recent stalls, oldest first."""
+        return list(self._stalls)
+
+    def stats(self) -> Dict[str, Any]:
+        """Monitor statistics."""
+        return {
+            "interval": self.interval,
+            "stall_threshold": self.stall_threshold,
+            "samples": len(self._samples),
+            "lag": self.lag_percentiles(),
+            "stalls": self.stall_count,
+            "recent_stalls": self.recent_stalls(),
+        }
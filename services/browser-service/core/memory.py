@@ -0,0 +1,241 @@
+"""
+Memory attribution for the live service.
+
+Allocation sites come from tracemalloc, which is off by default because it slows every
+allocation down: it is started at startup, on request, or by the periodic snapshot mode.
+Each report compares a new snapshot with the previous one, so growth between two calls
+points at the code that allocated it. The periodic mode dumps snapshots to disk, to be
+compared offline with tracemalloc.Snapshot.load().
+
+Retained bytes of the service's own structures (task results, metadata, agent history)
+are estimated by walking the objects, independently of tracemalloc.
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Frames of the tracing machinery itself are not allocation sites of interest
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _walk(obj: Any, max_objects: int) -> Tuple[int, int]:
+    """Bytes retained by an object and the number of objects visited to find out."""
+    seen = set()
+    pending = [obj]
+    total = 0
+    while pending and len(seen) < max_objects:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, (type, type(sys), type(estimate_size))):
+            continue
+        seen.add(id(current))
+        try:
+            total += sys.getsizeof(current)
+        except TypeError:
+            continue
+        if isinstance(current, (str, bytes, bytearray, int, float, bool)) or current is None:
+            continue
+        try:
+            if isinstance(current, dict):
+                pending.extend(current.keys())
+                pending.extend(current.values())
+            elif isinstance(current, (list, tuple, set, frozenset)):
+                pending.extend(current)
+            else:
+                attributes = getattr(current, "__dict__", None)
+                if attributes is not None:
+                    pending.append(attributes)
+                for slot in getattr(type(current), "__slots__", ()):
+                    if hasattr(current, slot):
+                        pending.append(getattr(current, slot))
+        except RuntimeError:
+            # Changed size while being walked from another thread; its contents are skipped
+            continue
+    return total, len(seen)
+
+
+def estimate_size(obj: Any, max_objects: int = 100000) -> int:
+    """
+    Estimate the bytes retained by an object and everything it references.
+
+    Walks containers, instance attributes and slots; objects reachable more than once
+    are counted once, and classes, modules and functions are not followed.
+
+    Args:
+        obj: The object to measure
+        max_objects: Objects to visit at most, so huge structures cannot stall the caller
+
+    Returns:
+        int: Approximate size in bytes (a lower bound if the walk was cut short)
+    """
+    return _walk(obj, max_objects)[0]
+
+
+def process_memory() -> Dict[str, Any]:
+    """Resident set size of the process now and at its peak, in bytes, and garbage collector counts."""
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "rss": rss,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss": peak if sys.platform == "darwin" else peak * 1024,
+        "gc_counts": gc.get_count(),
+    }
+
+
+class MemoryProfiler:
+    """Takes tracemalloc snapshots and reports allocation sites and their growth."""
+
+    def __init__(self, frames: int = 10):
+        """
+        Initialize the profiler.
+
+        Args:
+            frames: Stack frames recorded per allocation once tracing starts
+        """
+        self.frames = frames
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_at: Optional[str] = None
+        # One snapshot at a time; each replaces the previous one as the baseline
+        self._lock = asyncio.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self) -> None:
+        """Start recording allocations (slows allocations down until the process exits)."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"Started tracing memory allocations ({self.frames} frames)")
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    @staticmethod
+    def _site(traceback: tracemalloc.Traceback) -> str:
+        frame = traceback[0]
+        return f"{frame.filename}:{frame.lineno}"
+
+    async def allocation_report(self, top: int = 20) -> Dict[str, Any]:
+        """
+        Top allocation sites, and their growth since the previous report.
+
+        Returns:
+            Dict[str, Any]: Traced memory, the largest sites by size and by growth
+            since the previous snapshot, or only "tracing": False if tracing is off
+        """
+        if not self.tracing:
+            return {"tracing": False}
+        async with self._lock:
+            snapshot = await asyncio.to_thread(self._take_snapshot)
+            previous, previous_at = self._previous, self._previous_at
+            self._previous, self._previous_at = snapshot, datetime.now().isoformat()
+
+            def summarize() -> Dict[str, Any]:
+                current, peak = tracemalloc.get_traced_memory()
+                report: Dict[str, Any] = {
+                    "tracing": True,
+                    "traced_current": current,
+                    "traced_peak": peak,
+                    "top_sites": [
+                        {"site": self._site(stat.traceback), "size": stat.size, "count": stat.count}
+                        for stat in snapshot.statistics("lineno")[:top]
+                    ],
+                    "growth_since": previous_at,
+                    "top_growth": [],
+                }
+                if previous is not None:
+                    report["top_growth"] = [
+                        {
+                            "site": self._site(stat.traceback),
+                            "size_diff": stat.size_diff,
+                            "count_diff": stat.count_diff,
+                            "size": stat.size,
+                        }
+                        for stat in snapshot.compare_to(previous, "lineno")[:top]
+                        if stat.size_diff
+                    ]
+                return report
+
+            return await asyncio.to_thread(summarize)
+
+    def _dump(self, directory: str, keep: int) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"memory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.snapshot")
+        self._take_snapshot().dump(path)
+        snapshots = sorted(f for f in os.listdir(directory) if f.startswith("memory_") and f.endswith(".snapshot"))
+        for old in snapshots[:-keep]:
+            os.remove(os.path.join(directory, old))
+        return path
+
+    async def dump_periodically(self, directory: str, interval: float, keep: int = 24) -> None:
+        """
+        Dump a snapshot to disk every interval until cancelled, keeping the newest ones.
+
+        Args:
+            directory: Directory for the snapshot files
+            interval: Seconds between snapshots
+            keep: Snapshot files to keep
+        """
+        self.start_tracing()
+        while True:
+            await asyncio.sleep(interval)
+            started_at = time.monotonic()
+            try:
+                path = await asyncio.to_thread(self._dump, directory, keep)
+                logger.info(f"Dumped memory snapshot to {path} in {time.monotonic() - started_at:.2f}s")
+            except Exception as e:
+                logger.error(f"Error dumping memory snapshot: {str(e)}")
+
+
+def retained_sizes(items: Sequence[Dict[str, Any]], max_objects: int = 1000000) -> Tuple[List[Dict[str, int]], bool]:
+    """
+    Estimated retained bytes of the named parts of several items, and their totals.
+
+    At most max_objects objects are visited across all the items, so the cost does not
+    grow with the number of tasks; once the budget is spent the remaining parts are
+    reported as 0. Meant to run in a worker thread on a snapshot of references: parts
+    that change during the walk only make the estimate less exact.
+
+    Args:
+        items: Parts to measure per item, by name
+        max_objects: Objects to visit at most in total
+
+    Returns:
+        Tuple[List[Dict[str, int]], bool]: Bytes per part plus "total" for each item, and
+        whether the budget ran out before everything was measured
+    """
+    remaining = max_objects
+    results = []
+    for parts in items:
+        sizes = {}
+        for name, part in parts.items():
+            size = visited = 0
+            if part is not None and remaining > 0:
+                size, visited = _walk(part, remaining)
+            sizes[name] = size
+            remaining -= visited
+        sizes["total"] = sum(sizes.values())
+        results.append(sizes)
+    return results, remaining <= 0
@@ -0,0 +1,177 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are updated on the hot path with a dict lookup and a few
+additions. Gauges that mirror state the service already keeps (task counts, rate limiter
+queues, cache statistics) are not tracked separately: collectors read that state when
+/metrics is scraped. Every metric name gets the "browser_service_" prefix on export.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "browser_service"
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+TASK_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+TOKEN_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+# (labels, value) of one sample of a metric family
+Sample = Tuple[Dict[str, str], float]
+# (name, type, description, samples) of a metric family read by a collector
+Family = Tuple[str, str, str, Iterable[Sample]]
+
+
+class MetricsRegistry:
+    """The metrics and collectors rendered by /metrics."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric: Any) -> None:
+        """Add a counter or histogram."""
+        self._metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Add a function that reads gauges and counters kept elsewhere when metrics are scraped."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            metric.render(lines)
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {str(e)}")
+                continue
+            for name, metric_type, description, samples in families:
+                full_name = f"{NAMESPACE}_{name}"
+                lines.append(f"# HELP {full_name} {description}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count, optionally split into series by labels."""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), registry: Optional[MetricsRegistry] = REGISTRY):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        """Increase the count of the series with the given label values."""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self, lines: List[str]) -> None:
+        full_name = f"{NAMESPACE}_{self.name}_total"
+        lines.append(f"# HELP {full_name} {self.description}")
+        lines.append(f"# TYPE {full_name} counter")
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in values.items():
+            lines.append(f"{full_name}{_format_labels(dict(zip(self.labels, label_values)))} {_format_value(value)}")
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split into series by labels."""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: Sequence[float],
+        labels: Sequence[str] = (),
+        registry: Optional[MetricsRegistry] = REGISTRY,
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # Label values -> per-bucket counts (not cumulative), sum and count
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        # Callbacks of synchronous LLM calls can run in worker threads
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Record one observation in the series with the given label values."""
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def _cumulative(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        with self._lock:
+            series = {label_values: list(values) for label_values, values in self._series.items()}
+        result = {}
+        for label_values, values in series.items():
+            cumulative, counts = 0, []
+            for count in values[:len(self.buckets)]:
+                cumulative += count
+                counts.append(cumulative)
+            result[label_values] = (counts, values[-2], values[-1])
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative bucket counts, sum and count of every series, keyed by the joined label values."""
+        result = {}
+        for label_values, (counts, total, count) in self._cumulative().items():
+            buckets = {str(bound): cumulative for bound, cumulative in zip(self.buckets, counts)}
+            buckets["+Inf"] = count
+            result[",".join(label_values)] = {"buckets": buckets, "sum": round(total, 6), "count": count}
+        return {"description": self.description, "labels": list(self.labels), "series": result}
+
+    def render(self, lines: List[str]) -> None:
+        full_name = f"{NAMESPACE}_{self.name}"
+        lines.append(f"# HELP {full_name} {self.description}")
+        lines.append(f"# TYPE {full_name} histogram")
+        for label_values, (counts, total, count) in self._cumulative().items():
+            labels = dict(zip(self.labels, label_values))
+            for bound, cumulative in zip(self.buckets, counts):
+                lines.append(f"{full_name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{full_name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
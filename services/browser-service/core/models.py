@@ -12,7 +12,7 @@ class ActionType(str, Enum):
     WAIT = "wait"
     SCREENSHOT = "screenshot"
     SCROLL = "scroll"
-    SELECT = "select"
+    SELECT = "select_option"
     HOVER = "hover"
     PRESS_KEY = "press_key"
 
@@ -22,6 +22,10 @@ class BrowserAction(BaseModel):
     params: Dict[str, Any] = Field(default_factory=dict)
     description: Optional[str] = None
 
+class ActionPlan(BaseModel):
+    """The actions planned for a browser task, as requested from the LLM in structured output mode"""
+    actions: List[BrowserAction] = Field(description="Browser actions to execute, in order")
+
 class ActionResult(BaseModel):
     """Model representing the result of a browser action"""
     success: bool = False
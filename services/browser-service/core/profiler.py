@@ -0,0 +1,212 @@
+"""
+Sampling CPU profiler for the live service.
+
+A thread wakes up every few milliseconds and records the Python stack of every other
+thread: the event loop thread and the executor and worker threads. Samples taken on the
+event loop thread are attributed to the asyncio task running at the time (task runs are
+named "task-<task_id>"), so loop time can be split by task and coroutine. Idle threads,
+waiting on a lock, queue or selector, are skipped. The cost is one stack walk per busy
+thread per sample, paid only while a profile is running.
+
+Profiles are rendered as collapsed stacks (the input of flamegraph.pl and most flame
+graph tools), speedscope JSON, or a summary of samples per thread, task and function.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from typing import Any, Dict, List, Optional, Tuple
+
+# Innermost frames (file name, function) of threads waiting for work
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+# (file, first line, qualified name) of a function
+Frame = Tuple[str, int, str]
+# (thread name, task label or None, stack from the outermost frame)
+StackKey = Tuple[str, Optional[str], Tuple[Frame, ...]]
+
+
+def _frame_label(frame: Frame) -> str:
+    filename, line, name = frame
+    return f"{name} ({os.path.join(*filename.split(os.sep)[-2:])}:{line})"
+
+
+class Profile:
+    """Stack samples collected by a SamplingProfiler."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.duration = 0.0
+        self.ticks = 0
+        self.samples: "Tally[StackKey]" = Tally()
+
+    def collapsed(self) -> str:
+        """One "thread;task;frame;...;frame count" line per distinct stack."""
+        lines = []
+        for (thread, task, stack), count in self.samples.most_common():
+            parts = [thread] + ([task] if task else []) + [_frame_label(frame) for frame in stack]
+            lines.append(f"{';'.join(part.replace(';', ':') for part in parts)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        """The profile in speedscope's file format, one sampled profile per thread."""
+        frames: List[Dict[str, Any]] = []
+        frame_index: Dict[Any, int] = {}
+
+        def index(key: Any, entry: Dict[str, Any]) -> int:
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append(entry)
+            return frame_index[key]
+
+        profiles: Dict[str, Dict[str, Any]] = {}
+        for (thread, task, stack), count in self.samples.items():
+            profile = profiles.setdefault(thread, {
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(self.duration, 6),
+                "samples": [],
+                "weights": [],
+            })
+            indices = [index(("task", task), {"name": task})] if task else []
+            indices += [index(frame, {"name": frame[2], "file": frame[0], "line": frame[1]}) for frame in stack]
+            profile["samples"].append(indices)
+            profile["weights"].append(round(count * self.interval, 6))
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": "browser-service",
+            "exporter": "browser-service",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+
+    def summary(self, top: int = 30) -> Dict[str, Any]:
+        """Samples per thread and per task, and the functions with the most self and total samples."""
+        by_thread: "Tally[str]" = Tally()
+        by_task: "Tally[str]" = Tally()
+        self_samples: "Tally[Frame]" = Tally()
+        total_samples: "Tally[Frame]" = Tally()
+        for (thread, task, stack), count in self.samples.items():
+            by_thread[thread] += count
+            if task:
+                by_task[task] += count
+            if stack:
+                self_samples[stack[-1]] += count
+            for frame in set(stack):
+                total_samples[frame] += count
+
+        def share(count: int) -> float:
+            return round(count / self.ticks, 4) if self.ticks else 0.0
+
+        return {
+            "duration": round(self.duration, 3),
+            "interval": self.interval,
+            "ticks": self.ticks,
+            # A thread's share is the fraction of ticks it was busy, i.e. its CPU/GIL use
+            "threads": {thread: {"samples": count, "share": share(count)} for thread, count in by_thread.most_common()},
+            "tasks": {task: {"samples": count, "share": share(count)} for task, count in by_task.most_common(top)},
+            "self": [
+                {"function": _frame_label(frame), "samples": count, "share": share(count)}
+                for frame, count in self_samples.most_common(top)
+            ],
+            "total": [
+                {"function": _frame_label(frame), "samples": count, "share": share(count)}
+                for frame, count in total_samples.most_common(top)
+            ],
+        }
+
+
+class SamplingProfiler:
+    """Samples the stacks of the process's threads at a fixed interval."""
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False, max_depth: int = 128):
+        """
+        Initialize the profiler.
+
+        Args:
+            interval: Seconds between samples
+            include_idle: Whether to keep samples of threads waiting for work
+            max_depth: Innermost frames kept per stack
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+
+    def _stack(self, frame: Any) -> Tuple[Frame, ...]:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name)))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def _is_idle(self, stack: Tuple[Frame, ...]) -> bool:
+        if not stack:
+            return True
+        filename, _, name = stack[-1]
+        return (os.path.basename(filename), name.rsplit(".", 1)[-1]) in _IDLE_FRAMES
+
+    @staticmethod
+    def _task_label(loop: asyncio.AbstractEventLoop) -> Optional[str]:
+        try:
+            task = asyncio.current_task(loop)
+        except Exception:
+            return None
+        if task is None:
+            return "(no task)"
+        coroutine = getattr(task.get_coro(), "__qualname__", "?")
+        return f"{task.get_name()} [{coroutine}]"
+
+    def run(
+        self,
+        seconds: float,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        loop_thread_id: Optional[int] = None,
+    ) -> Profile:
+        """
+        Sample for the given time; blocks, so run it in a worker thread.
+
+        Args:
+            seconds: How long to sample
+            loop: The event loop whose current task the loop thread's samples are attributed to
+            loop_thread_id: Thread ID of the event loop thread
+
+        Returns:
+            Profile: The collected samples
+        """
+        profile = Profile(self.interval)
+        own_thread_id = threading.get_ident()
+        started_at = time.monotonic()
+        next_tick = started_at
+        while True:
+            now = time.monotonic()
+            if now - started_at >= seconds:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id:
+                    continue
+                stack = self._stack(frame)
+                if not self.include_idle and self._is_idle(stack):
+                    continue
+                task = self._task_label(loop) if loop is not None and thread_id == loop_thread_id else None
+                thread = "event-loop" if thread_id == loop_thread_id else names.get(thread_id, f"thread-{thread_id}")
+                profile.samples[(thread, task, stack)] += 1
+            profile.ticks += 1
+            # Keep a fixed rate; a slow sample delays the next one instead of piling up
+            next_tick = max(next_tick + self.interval, time.monotonic())
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+        profile.duration = time.monotonic() - started_at
+        return profile
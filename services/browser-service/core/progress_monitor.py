@@ -0,0 +1,140 @@
+"""
+Loop and stall detection for agent runs.
+
+The monitor fingerprints each step as (URL, actions, DOM hash) and looks for two kinds
+of lack of progress:
+
+- loops: the same sequence of steps repeating, e.g. clicking the same button or
+  navigating back and forth between two pages
+- stalls: the page staying the same (same URL, elements, text and form field values)
+  for several steps while the agent repeats itself or its actions fail or do nothing,
+  e.g. an open dialog or an endless spinner; filling in a form changes the field
+  values, so it is not a stall
+
+The first detections are answered with a nudge (the caller tells the model and tries to
+dismiss dialogs); once the nudges are used up the run is failed with the reason.
+"""
+
+import hashlib
+import json
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Verdicts returned by ProgressMonitor.record()
+PROGRESSING = "progressing"
+NUDGE = "nudge"
+FAIL = "fail"
+
+
+class NoProgressError(Exception):
+    """Raised when an agent keeps looping or stalling after being nudged."""
+
+
+def hash_dom(url: str, elements: Iterable[str], field_values: Iterable[str] = ()) -> str:
+    """
+    Hash the state of a page.
+
+    Args:
+        url: The page URL
+        elements: One description per interactive element (XPath, attributes, text)
+        field_values: Current values of the page's form fields, in document order
+    """
+    digest = hashlib.sha1(url.encode("utf-8"))
+    for element in sorted(elements):
+        digest.update(b"\n")
+        digest.update(element.encode("utf-8"))
+    digest.update(b"\0")
+    for value in field_values:
+        digest.update(b"\n")
+        digest.update(str(value).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def hash_actions(actions: List[Dict[str, Any]]) -> str:
+    """Hash the actions taken in a step."""
+    canonical = json.dumps(actions, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class ProgressMonitor:
+    """Detects repeating step cycles and pages that stop changing."""
+
+    def __init__(self, max_repeats: int = 3, max_cycle_length: int = 3, max_stalled_steps: int = 5, max_nudges: int = 2):
+        """
+        Initialize the monitor.
+
+        Args:
+            max_repeats: How many times a cycle of steps must repeat to count as a loop
+            max_cycle_length: Longest cycle (in steps) that is looked for
+            max_stalled_steps: Consecutive steps on an unchanged page that count as a stall
+            max_nudges: Detections answered with a nudge before the run is failed
+        """
+        self.max_repeats = max_repeats
+        self.max_cycle_length = max_cycle_length
+        self.max_stalled_steps = max_stalled_steps
+        self.max_nudges = max_nudges
+
+        self.fingerprints: Deque[Tuple[str, str, str]] = deque(maxlen=max_repeats * max_cycle_length)
+        self.stalled_steps = 0
+        self.nudges = 0
+        self.reason: Optional[str] = None
+
+    def _find_cycle(self) -> Optional[int]:
+        """Return the length of a cycle repeated max_repeats times at the end of the history."""
+        recent = list(self.fingerprints)
+        for length in range(1, self.max_cycle_length + 1):
+            span = length * self.max_repeats
+            if len(recent) < span:
+                break
+            tail = recent[-span:]
+            if all(tail[i] == tail[i % length] for i in range(span)):
+                return length
+        return None
+
+    def record(self, url: str, actions: List[Dict[str, Any]], dom_hash: str, failed: bool = False) -> str:
+        """
+        Record a step and decide whether the agent is still making progress.
+
+        Args:
+            url: The page URL the step acted on
+            actions: The actions the step took
+            dom_hash: Hash of the page the step acted on (see hash_dom)
+            failed: Whether one of the step's actions failed
+
+        Returns:
+            str: PROGRESSING, NUDGE or FAIL; for NUDGE and FAIL, reason describes the problem
+        """
+        previous = self.fingerprints[-1] if self.fingerprints else None
+        fingerprint = (url, hash_actions(actions), dom_hash)
+        self.fingerprints.append(fingerprint)
+
+        # An unchanged page is only a stall if the step did not try anything new
+        unchanged = previous is not None and previous[0] == url and previous[2] == dom_hash
+        if unchanged and (previous[1] == fingerprint[1] or failed or not actions):
+            self.stalled_steps += 1
+        else:
+            self.stalled_steps = 0
+
+        cycle_length = self._find_cycle()
+        if cycle_length:
+            self.reason = (
+                f"Repeated the same {'action' if cycle_length == 1 else f'{cycle_length} steps'} "
+                f"{self.max_repeats} times on {url}"
+            )
+        elif self.stalled_steps >= self.max_stalled_steps:
+            self.reason = f"Page {url} has not changed for {self.stalled_steps} steps"
+        else:
+            return PROGRESSING
+
+        if self.nudges >= self.max_nudges:
+            return FAIL
+
+        # Start over so the nudged agent gets a full window to recover
+        self.nudges += 1
+        self.fingerprints.clear()
+        self.stalled_steps = 0
+        logger.info(f"No progress detected ({self.reason}); nudge {self.nudges} of {self.max_nudges}")
+        return NUDGE
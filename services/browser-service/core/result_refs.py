@@ -0,0 +1,144 @@
+"""
+Reference-based passing of previous agent output.
+
+Instead of shipping every predecessor's full result inline, callers can reference the
+result of an earlier task by ID, optionally projected with a small JSONPath subset.
+References are resolved lazily against the service's own result store the first time
+the agent asks for its previous output.
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Supported JSONPath subset: $, .key, ['key'], ["key"], [n], [-n], [*], .*
+_PATH_TOKEN = re.compile(
+    r"\.(?P<key>[A-Za-z_][\w-]*)"
+    r"|\[(?P<index>-?\d+)\]"
+    r"|\['(?P<squoted>[^']*)'\]"
+    r'|\["(?P<dquoted>[^"]*)"\]'
+    r"|(?P<wildcard>\[\*\]|\.\*)"
+)
+
+_WILDCARD = ("wildcard", None)
+
+
+def parse_json_path(path: str) -> List[Tuple[str, Any]]:
+    """
+    Parse a JSONPath expression into a list of (kind, value) tokens.
+
+    Args:
+        path: The JSONPath expression, e.g. ``$.history[-1].result[*].extracted_content``
+
+    Returns:
+        List[Tuple[str, Any]]: Tokens of kind "key", "index" or "wildcard"
+
+    Raises:
+        ValueError: If the expression is not in the supported subset
+    """
+    if not path or not path.startswith("$"):
+        raise ValueError(f"JSONPath must start with '$': {path}")
+
+    tokens = []
+    pos = 1
+    while pos < len(path):
+        match = _PATH_TOKEN.match(path, pos)
+        if not match:
+            raise ValueError(f"Invalid JSONPath at position {pos}: {path}")
+        if match.group("key") is not None:
+            tokens.append(("key", match.group("key")))
+        elif match.group("index") is not None:
+            tokens.append(("index", int(match.group("index"))))
+        elif match.group("squoted") is not None:
+            tokens.append(("key", match.group("squoted")))
+        elif match.group("dquoted") is not None:
+            tokens.append(("key", match.group("dquoted")))
+        else:
+            tokens.append(_WILDCARD)
+        pos = match.end()
+    return tokens
+
+
+def project(value: Any, tokens: List[Tuple[str, Any]]) -> Any:
+    """
+    Apply parsed JSONPath tokens to a value.
+
+    Missing keys and out-of-range indices yield None. A wildcard yields a list with the
+    remaining path applied to each element.
+    """
+    for position, (kind, arg) in enumerate(tokens):
+        if value is None:
+            return None
+        if kind == "wildcard":
+            items = value.values() if isinstance(value, dict) else value if isinstance(value, list) else []
+            rest = tokens[position + 1:]
+            return [project(item, rest) for item in items]
+        if kind == "key":
+            value = value.get(arg) if isinstance(value, dict) else None
+        else:
+            value = value[arg] if isinstance(value, list) and -len(value) <= arg < len(value) else None
+    return value
+
+
+def to_plain_data(result: Any) -> Any:
+    """Convert a stored task result (possibly a pydantic model such as AgentHistoryList) to plain data."""
+    if hasattr(result, "model_dump"):
+        return result.model_dump(mode="json")
+    return result
+
+
+class PreviousOutputResolver:
+    """
+    Lazily resolves a task's previous agent output.
+
+    Combines inline previous output (AgentResult envelopes keyed by predecessor) with
+    references to earlier tasks. Nothing is looked up or copied until resolve() is first
+    called; the resolved value is then memoised for the rest of the run.
+
+    The agent always gets the payloads keyed by predecessor, however many there are.
+    """
+
+    def __init__(
+        self,
+        inline: Optional[Dict[str, Any]] = None,
+        refs: Optional[Dict[str, Any]] = None,
+        lookup: Optional[Callable[[str], Any]] = None,
+    ):
+        self.inline = inline or {}
+        self.refs = refs or {}
+        self.lookup = lookup
+        self._resolved: Optional[Dict[str, Any]] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.inline or self.refs)
+
+    def resolve(self) -> Dict[str, Any]:
+        """
+        Resolve the previous output.
+
+        Returns:
+            Dict[str, Any]: The ``data`` of each inline result and the projected result of
+            each reference (None if the referenced task has no result), keyed by predecessor
+        """
+        if self._resolved is not None:
+            return self._resolved
+
+        resolved = {}
+        for key, result in self.inline.items():
+            resolved[key] = result.get("data") if isinstance(result, dict) else None
+
+        for key, ref in self.refs.items():
+            task_id = ref.task_id if hasattr(ref, "task_id") else ref["task_id"]
+            path = ref.path if hasattr(ref, "path") else ref.get("path")
+            result = self.lookup(task_id) if self.lookup else None
+            if result is None:
+                logger.warning(f"Referenced task {task_id} for '{key}' has no result available")
+                resolved[key] = None
+                continue
+            data = to_plain_data(result)
+            resolved[key] = project(data, parse_json_path(path)) if path else data
+
+        self._resolved = resolved
+        return resolved
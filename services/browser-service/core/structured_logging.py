@@ -0,0 +1,264 @@
+"""
+Structured, non-blocking logging.
+
+Loggers hand records to a bounded queue; a listener thread formats them as JSON lines
+(or plain text) and writes them out, so the event loop never waits for a stream write
+and serialization is done off the loop. Records carry the task and browser session they
+were logged for, taken from context variables that task runs set once, so every line a
+task produces, including those of browser-use and LangChain, can be correlated.
+
+High-frequency loggers can be sampled: below WARNING, only a fraction of their records
+are kept. Warnings and errors are never sampled, and a full queue drops records instead
+of blocking the caller.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+task_id_var: ContextVar[Optional[str]] = ContextVar("log_task_id", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("log_session_id", default=None)
+
+# Loggers that configure handlers of their own (uvicorn's) are routed through the queue too
+_ROUTED_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Attributes every LogRecord has (and uvicorn's colored copy of the message); anything
+# else was passed in extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "task_id", "session_id", "color_message"
+}
+
+
+def set_log_context(task_id: Optional[str] = None, session_id: Optional[str] = None) -> List[Tuple[ContextVar, Token]]:
+    """
+    Tag the records logged from here on in the current context (and the tasks it starts)
+    with a task and/or session ID.
+
+    Returns:
+        List: Tokens to pass to reset_log_context() to restore the previous IDs
+    """
+    tokens = []
+    if task_id is not None:
+        tokens.append((task_id_var, task_id_var.set(task_id)))
+    if session_id is not None:
+        tokens.append((session_id_var, session_id_var.set(session_id)))
+    return tokens
+
+
+def reset_log_context(tokens: List[Tuple[ContextVar, Token]]) -> None:
+    """Restore the IDs replaced by set_log_context()."""
+    for var, token in reversed(tokens):
+        var.reset(token)
+
+
+@contextmanager
+def log_context(task_id: Optional[str] = None, session_id: Optional[str] = None) -> Iterator[None]:
+    """Tag the records logged in a block (and the tasks it starts) with a task and/or session ID."""
+    tokens = set_log_context(task_id, session_id)
+    try:
+        yield
+    finally:
+        reset_log_context(tokens)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the task and session ID of the logging context onto each record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.task_id = task_id_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING of selected loggers and their children."""
+
+    def __init__(self, rates: Dict[str, float]):
+        """
+        Initialize the filter.
+
+        Args:
+            rates: Fraction of records to keep (0 to 1) by logger name
+        """
+        super().__init__()
+        # Keep every n-th record rather than a random fraction, so sampling is even
+        self._every = {name: max(1, round(1 / rate)) if rate > 0 else 0 for name, rate in rates.items()}
+        self._counts: Dict[str, int] = {}
+        self._resolved: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def _sampled_logger(self, name: str) -> Optional[str]:
+        """The most specific configured logger that a logger falls under, if any."""
+        resolved = self._resolved.get(name, "")
+        if resolved != "":
+            return resolved
+        candidate: Optional[str] = name
+        while candidate and candidate not in self._every:
+            candidate = candidate.rpartition(".")[0] or None
+        self._resolved[name] = candidate
+        return candidate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._every:
+            return True
+        sampled = self._sampled_logger(record.name)
+        if sampled is None:
+            return True
+        every = self._every[sampled]
+        if every == 0:
+            return False
+        with self._lock:
+            count = self._counts.get(sampled, 0)
+            self._counts[sampled] = count + 1
+        return count % every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in ("task_id", "session_id"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text with the task and session ID, for reading logs in a terminal."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        context = "".join(
+            f" [{field}={getattr(record, field)}]" for field in ("task_id", "session_id") if getattr(record, field, None)
+        )
+        line = (
+            f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} - {record.name} - {record.levelname}{context} - "
+            f"{record.getMessage()}"
+        )
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for the listener thread, dropping them when the queue is full."""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only what cannot wait is done here: arguments and tracebacks refer to objects
+        # that may change or be freed once the caller moves on
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse "logger=rate,logger=rate" (e.g. "browser_use=0.1,httpx=0") into sampling rates."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            logging.getLogger(__name__).warning(f"Ignoring invalid log sampling rate: {item}")
+    return rates
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = True,
+    sampling: Optional[Dict[str, float]] = None,
+    max_queue: int = 10000,
+) -> None:
+    """
+    Route all logging through the queue and the listener thread.
+
+    Replaces the handlers of the root logger and of uvicorn's loggers; calling it again
+    reconfigures the pipeline.
+
+    Args:
+        level: Level of the root logger
+        json_format: JSON lines if True, otherwise plain text
+        sampling: Fraction of records below WARNING to keep, by logger name
+        max_queue: Records queued at most before new ones are dropped
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if json_format else TextFormatter())
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max_queue)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+    if sampling:
+        _queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+    for name in _ROUTED_LOGGERS:
+        routed = logging.getLogger(name)
+        for handler in list(routed.handlers):
+            routed.removeHandler(handler)
+        routed.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    atexit.unregister(shutdown_logging)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> Dict[str, int]:
+    """Records dropped because the queue was full, and records waiting to be written."""
+    if _queue_handler is None:
+        return {"dropped": 0, "queued": 0}
+    return {"dropped": _queue_handler.dropped, "queued": _queue_handler.queue.qsize()}
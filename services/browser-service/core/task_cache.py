@@ -0,0 +1,122 @@
+"""
+Task-level result cache.
+
+Identical task submissions (same instruction, provider, options and inputs) share one
+agent run: a completed result is served from cache until it expires, and concurrent
+identical submissions join the run that is already in flight.
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .cache import SingleFlight
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def _normalise(value: Any) -> Any:
+    """Normalise a value for hashing: drop None entries and trim strings."""
+    if isinstance(value, dict):
+        return {str(k): _normalise(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _is_complete(response: Dict[str, Any]) -> bool:
+    """Whether a response is a finished run: a success whose agent reported the task done."""
+    if response.get("status") != "success":
+        return False
+    is_done = getattr(response.get("result"), "is_done", None)
+    return is_done() if callable(is_done) else True
+
+
+class TaskResultCache:
+    """Caches successful agent responses and deduplicates identical in-flight tasks."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600, cancel_timeout: float = 10.0):
+        self.results = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        # Cancelling the last task waiting on a run waits (up to cancel_timeout) for the run to stop
+        self.flights = SingleFlight(cancel_timeout=cancel_timeout)
+        self.hits = 0
+        self.misses = 0
+        self.joins = 0
+
+    @staticmethod
+    def make_key(fields: Dict[str, Any]) -> str:
+        """
+        Build the cache key for a task.
+
+        Args:
+            fields: The task fields that determine its result
+
+        Returns:
+            str: Hex SHA-256 of the canonical JSON encoding of the normalised fields
+        """
+        canonical = json.dumps(_normalise(fields), sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a run for the key is in flight, i.e. a task submitted now would join it."""
+        return self.flights.in_flight(key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached response, counting the hit."""
+        response = self.results.get(key)
+        if response is not None:
+            self.hits += 1
+        return response
+
+    async def run(
+        self,
+        key: str,
+        execute: Callable[[], Awaitable[Dict[str, Any]]],
+        ttl_seconds: Optional[float] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return the cached response for the key, or run the task once for all concurrent callers.
+
+        Only completed runs are stored; failed, budget-exhausted and unfinished runs are
+        only shared with the callers that joined them while in flight.
+
+        Args:
+            key: The cache key from make_key()
+            execute: Coroutine function running the task and returning the adapter response
+            ttl_seconds: Optional TTL override for this entry
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: (response, cached) where cached is True if the
+            response came from the cache or from another caller's run
+        """
+        response = self.get(key)
+        if response is not None:
+            return response, True
+
+        async def _execute_and_store():
+            result = await execute()
+            if _is_complete(result):
+                self.results.set(key, result, ttl_seconds=ttl_seconds)
+            return result
+
+        if self.flights.in_flight(key):
+            self.joins += 1
+            logger.info(f"Joining in-flight execution for task cache key {key[:12]}")
+        else:
+            self.misses += 1
+
+        return await self.flights.do(key, _execute_and_store)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics."""
+        return {
+            "entries": len(self.results),
+            "in_flight": len(self.flights),
+            "hits": self.hits,
+            "misses": self.misses,
+            "joins": self.joins,
+        }
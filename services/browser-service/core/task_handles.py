@@ -0,0 +1,72 @@
+"""
+Registry of running task handles.
+
+Every background task run is started through the registry so that pausing or
+cancelling a task can cancel the coroutine that is actually running it, rather than
+only closing its browser and leaving the run to fail on its own.
+"""
+
+import asyncio
+import logging
+from typing import Coroutine, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskHandleRegistry:
+    """Tracks the asyncio task running each service task."""
+
+    def __init__(self):
+        self._handles: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def start(self, task_id: str, coro: Coroutine) -> asyncio.Task:
+        """
+        Start a task run in the background and register its handle.
+
+        Args:
+            task_id: The task ID
+            coro: The coroutine running the task
+
+        Returns:
+            asyncio.Task: The handle, removed from the registry once it finishes
+        """
+        handle = asyncio.create_task(coro, name=f"task-{task_id}")
+        self._handles[task_id] = handle
+
+        def _forget(_handle, task_id=task_id):
+            if self._handles.get(task_id) is handle:
+                del self._handles[task_id]
+
+        handle.add_done_callback(_forget)
+        return handle
+
+    def get(self, task_id: str) -> Optional[asyncio.Task]:
+        """Get the handle of a running task."""
+        return self._handles.get(task_id)
+
+    async def cancel(self, task_id: str, timeout: float = 10) -> bool:
+        """
+        Cancel a task run and wait for it to unwind.
+
+        Args:
+            task_id: The task ID
+            timeout: How long to wait for the run's cleanup to finish
+
+        Returns:
+            bool: True if the run has finished (or was not running), False if it is
+            still unwinding after the timeout
+        """
+        handle = self._handles.get(task_id)
+        if handle is None or handle.done():
+            return True
+        if handle is asyncio.current_task():
+            raise RuntimeError(f"Task {task_id} cannot cancel itself")
+
+        handle.cancel()
+        done, _ = await asyncio.wait({handle}, timeout=timeout)
+        if not done:
+            logger.warning(f"Task {task_id} did not finish within {timeout}s of being cancelled")
+        return bool(done)
@@ -0,0 +1,425 @@
+"""
+Lightweight span tracing of task execution.
+
+Spans time the stages of a task (the run, agent steps, LLM calls, browser actions and
+page loads) and nest through a context variable, so a span started in a coroutine is
+the parent of every span started below it, including in tasks it creates. Incoming W3C
+traceparent headers make the caller's span the parent of the service's spans.
+
+Finished spans are kept in memory per trace for GET /execute/{task_id}/trace, and are
+handed to a background thread that exports them in batches to a JSONL file and/or an
+OTLP/HTTP collector (JSON encoding), so the event loop never waits for the export.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# Spans kept per trace; a runaway task cannot grow its trace without bound
+_MAX_SPANS_PER_TRACE = 5000
+
+
+class SpanContext:
+    """Identity of a span; on its own, a parent received from another service."""
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span(SpanContext):
+    """A timed operation within a trace."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        super().__init__(trace_id, secrets.token_hex(8))
+        self.name = name
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        """Mark the span as failed, or as cancelled for a cancellation."""
+        if isinstance(error, asyncio.CancelledError):
+            self.status = "cancelled"
+        else:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {str(error)}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Optional[SpanContext]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """The parent span of a W3C traceparent header, or None if it is missing or invalid."""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match or match.group(1) == "ff" or set(match.group(2)) == {"0"} or set(match.group(3)) == {"0"}:
+        return None
+    return SpanContext(match.group(2), match.group(3))
+
+
+def format_traceparent(span: SpanContext) -> str:
+    """The W3C traceparent header that makes a span the parent of another service's spans."""
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def current_span() -> Optional[SpanContext]:
+    """The span the current code runs in, if any."""
+    return _current_span.get()
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+
+    def export(self, spans: Sequence[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+class OtlpHttpSpanExporter:
+    """Posts finished spans to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint: str, service_name: str = "browser-service", timeout: float = 5.0):
+        import httpx
+
+        endpoint = endpoint.rstrip("/")
+        self.endpoint = endpoint if endpoint.endswith("/v1/traces") else f"{endpoint}/v1/traces"
+        self.service_name = service_name
+        self.client = httpx.Client(timeout=timeout)
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        return {"key": key, "value": encoded}
+
+    def _encode(self, span: Span) -> Dict[str, Any]:
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [self._attribute(key, value) for key, value in span.attributes.items()],
+            # STATUS_CODE_ERROR is 2; cancelled spans are left unset
+            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 0},
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+    def export(self, spans: Sequence[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "browser-service"}, "spans": [self._encode(span) for span in spans]}],
+            }]
+        }
+        response = self.client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    def shutdown(self) -> None:
+        self.client.close()
+
+
+class _ExportWorker:
+    """Background thread exporting finished spans in batches."""
+
+    def __init__(self, exporters: Sequence[Any], batch_size: int = 512, interval: float = 1.0, max_queue: int = 10000):
+        self.exporters = list(exporters)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Exporting must never slow the service down; drop instead of waiting
+            self.dropped += 1
+
+    def _export(self, batch: List[Span]) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Could not export {len(batch)} spans with {type(exporter).__name__}: {str(e)}")
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                self._export(batch)
+        for exporter in self.exporters:
+            try:
+                exporter.shutdown()
+            except Exception as e:
+                logger.debug(f"Error shutting down {type(exporter).__name__}: {str(e)}")
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Export the spans still queued and stop the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+class Tracer:
+    """Creates spans, keeps recent traces in memory and hands finished spans to the exporters."""
+
+    def __init__(self, enabled: bool = True, max_traces: int = 256):
+        self.enabled = enabled
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        # Task ID -> (trace ID, ID of the task's root span)
+        self._task_spans: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._worker: Optional[_ExportWorker] = None
+
+    def configure(self, enabled: bool, max_traces: int, exporters: Sequence[Any] = ()) -> None:
+        """Apply the service configuration and start exporting to the given exporters."""
+        self.enabled = enabled
+        self.max_traces = max_traces
+        if enabled and exporters:
+            self._worker = _ExportWorker(exporters)
+
+    def shutdown(self) -> None:
+        """Flush and stop the exporters."""
+        if self._worker is not None:
+            self._worker.shutdown()
+            self._worker = None
+
+    def start_span(self, name: str, **attributes: Any) -> Tuple[Optional[Span], Optional[Token]]:
+        """
+        Start a span as the child of the current span and make it current.
+
+        Prefer span(); this is for code where a with block does not fit. Every call
+        must be paired with end_span() in the same context.
+
+        Returns:
+            Tuple: The span and the token to restore the previous span, or (None, None) if tracing is off
+        """
+        if not self.enabled:
+            return None, None
+        parent = _current_span.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        return span, _current_span.set(span)
+
+    def end_span(self, span: Optional[Span], token: Optional[Token]) -> None:
+        """End a span started with start_span() and restore the previous current span."""
+        if span is None:
+            return
+        _current_span.reset(token)
+        self._finish(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Run a block in a new span; an exception leaving the block marks the span as failed."""
+        span, token = self.start_span(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            if span is not None:
+                span.record_error(e)
+            raise
+        finally:
+            self.end_span(span, token)
+
+    @contextmanager
+    def remote_parent(self, parent: Optional[SpanContext]) -> Iterator[None]:
+        """Make a span from another service (a parsed traceparent) the parent of the spans in a block."""
+        if parent is None:
+            yield
+            return
+        token = _current_span.set(parent)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def record_span(
+        self, name: str, duration: float, attributes: Dict[str, Any], error: Optional[BaseException] = None
+    ) -> None:
+        """Record an operation that just finished, timed elsewhere, as a child of the current span."""
+        if not self.enabled:
+            return
+        parent = _current_span.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        span.start_ns = time.time_ns() - int(duration * 1e9)
+        if error is not None:
+            span.record_error(error)
+        self._finish(span)
+
+    def bind_task(self, task_id: str, span: Optional[Span]) -> None:
+        """Make a span the root of a task's waterfall."""
+        if span is None:
+            return
+        self._task_spans[task_id] = (span.trace_id, span.span_id)
+        self._task_spans.move_to_end(task_id)
+        while len(self._task_spans) > self.max_traces:
+            self._task_spans.popitem(last=False)
+
+    def _finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        spans = self._traces.get(span.trace_id)
+        if spans is not None:
+            # Evict the traces that have been idle longest, not the ones still being written
+            self._traces.move_to_end(span.trace_id)
+        elif span.parent_id is not None or self._is_task_root(span):
+            spans = self._traces[span.trace_id] = []
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        # A lone span outside any task (a health check, say) is exported but not kept
+        if spans is not None and len(spans) < _MAX_SPANS_PER_TRACE:
+            spans.append(span)
+        if self._worker is not None:
+            self._worker.submit(span)
+
+    def _is_task_root(self, span: Span) -> bool:
+        return any(root_id == span.span_id for _, root_id in self._task_spans.values())
+
+    def task_trace(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        The waterfall of a task: its root span and every span below it.
+
+        Returns:
+            Optional[Dict[str, Any]]: The spans in start order with their offset from the
+            root, duration and depth, or None if the task's trace is not known
+        """
+        trace_id, root_id = self._task_spans.get(task_id, (None, None))
+        spans = list(self._traces.get(trace_id, [])) if trace_id else []
+        # Spans are added when they end, so the root is missing while the run is in progress
+        root = next((span for span in spans if span.span_id == root_id), None)
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in spans:
+            children.setdefault(span.parent_id, []).append(span)
+
+        if root is None and not children.get(root_id):
+            return None
+        root_start = root.start_ns if root else min(span.start_ns for span in children[root_id])
+        waterfall: List[Dict[str, Any]] = []
+
+        def visit(parent_id: str, depth: int) -> None:
+            for span in children.get(parent_id, []):
+                waterfall.append({
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "depth": depth,
+                    "offset_ms": round((span.start_ns - root_start) / 1e6, 3),
+                    "duration_ms": round((span.end_ns - span.start_ns) / 1e6, 3),
+                    "status": span.status,
+                    "error": span.error,
+                    "attributes": span.attributes,
+                })
+                visit(span.span_id, depth + 1)
+
+        if root is not None:
+            waterfall.append({
+                "name": root.name,
+                "span_id": root.span_id,
+                "parent_id": root.parent_id,
+                "depth": 0,
+                "offset_ms": 0.0,
+                "duration_ms": round((root.end_ns - root.start_ns) / 1e6, 3),
+                "status": root.status,
+                "error": root.error,
+                "attributes": root.attributes,
+            })
+        visit(root_id, 1)
+        waterfall.sort(key=lambda entry: entry["offset_ms"])
+        return {
+            "task_id": task_id,
+            "trace_id": trace_id,
+            "complete": root is not None,
+            "spans": waterfall,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Tracer statistics."""
+        return {
+            "enabled": self.enabled,
+            "traces": len(self._traces),
+            "exporting": self._worker is not None,
+            "dropped_spans": self._worker.dropped if self._worker else 0,
+        }
+
+
+def build_exporters(jsonl_path: Optional[str], otlp_endpoint: Optional[str], service_name: str) -> List[Any]:
+    """Exporters for the configured JSONL file and OTLP endpoint."""
+    exporters: List[Any] = []
+    if jsonl_path:
+        exporters.append(JsonlSpanExporter(jsonl_path))
+    if otlp_endpoint:
+        exporters.append(OtlpHttpSpanExporter(otlp_endpoint, service_name=service_name))
+    return exporters
+
+
+tracer = Tracer()
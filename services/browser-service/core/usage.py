@@ -0,0 +1,348 @@
+"""
+LLM token usage and latency tracking.
+
+A TokenUsageHandler is a LangChain callback that reports the token usage and latency of
+every LLM call made while it is active. It is activated per task through a context
+variable, so that LLM clients can be shared between tasks while each task still only
+sees its own usage. Prompt cache reads and writes reported by the provider, and the time
+calls wait for a rate limiter slot, are passed on as well.
+
+Independently of tasks, every LLM call in the process is observed into histograms of
+latency, time to first token and tokens per model, next to the agent step and browser
+action durations recorded by AgentAdapter, and recorded as a span of the current trace.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from strategies.llm.rate_limiter import add_idle_wait_listener
+
+from .metrics import LATENCY_BUCKETS, TOKEN_BUCKETS, Histogram
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Cancelled calls never report their end; past this many open calls, stale ones are dropped
+_MAX_OPEN_CALLS = 1024
+_STALE_CALL_SECONDS = 3600
+
+
+LLM_LATENCY = Histogram("llm_latency_seconds", "Duration of LLM calls", LATENCY_BUCKETS, labels=("model",))
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time to the first token of streamed LLM calls", LATENCY_BUCKETS, labels=("model",)
+)
+LLM_INPUT_TOKENS = Histogram("llm_input_tokens", "Input tokens per LLM call", TOKEN_BUCKETS, labels=("model",))
+LLM_OUTPUT_TOKENS = Histogram("llm_output_tokens", "Output tokens per LLM call", TOKEN_BUCKETS, labels=("model",))
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds", "Time LLM calls waited for a rate limiter slot", LATENCY_BUCKETS, labels=("limiter",)
+)
+AGENT_STEP_DURATION = Histogram("agent_step_seconds", "Duration of agent steps", LATENCY_BUCKETS)
+BROWSER_ACTION_DURATION = Histogram(
+    "browser_action_seconds", "Time agent steps spent executing browser actions", LATENCY_BUCKETS
+)
+
+HISTOGRAMS = (
+    LLM_LATENCY,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_INPUT_TOKENS,
+    LLM_OUTPUT_TOKENS,
+    LLM_QUEUE_WAIT,
+    AGENT_STEP_DURATION,
+    BROWSER_ACTION_DURATION,
+)
+
+
+def usage_histograms() -> Dict[str, Any]:
+    """Snapshots of every usage histogram, keyed by name."""
+    return {histogram.name: histogram.snapshot() for histogram in HISTOGRAMS}
+
+
+def extract_token_usage(response: LLMResult) -> Tuple[int, int]:
+    """
+    Extract (input_tokens, output_tokens) from an LLM result.
+
+    Prefers the standard usage_metadata on chat messages and falls back to the
+    provider-specific token_usage/usage dict in llm_output.
+    """
+    input_tokens = output_tokens = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0) or 0
+                output_tokens += usage.get("output_tokens", 0) or 0
+                found = True
+
+    if not found and response.llm_output:
+        usage = response.llm_output.get("token_usage") or response.llm_output.get("usage") or {}
+        if not isinstance(usage, dict):
+            usage = getattr(usage, "__dict__", {})
+        input_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+        output_tokens = usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0
+
+    return input_tokens, output_tokens
+
+
+def extract_cache_usage(response: LLMResult) -> Tuple[int, int]:
+    """
+    Extract (cache_read_tokens, cache_write_tokens) from an LLM result.
+
+    Uses the standard input_token_details of usage_metadata and falls back to the
+    Anthropic (cache_*_input_tokens) and OpenAI (prompt_tokens_details.cached_tokens)
+    fields in llm_output.
+    """
+    cache_read = cache_write = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                details = usage.get("input_token_details") or {}
+                cache_read += details.get("cache_read", 0) or 0
+                cache_write += details.get("cache_creation", 0) or 0
+                found = True
+
+    if not found and response.llm_output:
+        usage = response.llm_output.get("token_usage") or response.llm_output.get("usage") or {}
+        if not isinstance(usage, dict):
+            usage = getattr(usage, "__dict__", {})
+        prompt_details = usage.get("prompt_tokens_details") or {}
+        if not isinstance(prompt_details, dict):
+            prompt_details = getattr(prompt_details, "__dict__", {})
+        cache_read = usage.get("cache_read_input_tokens") or prompt_details.get("cached_tokens") or 0
+        cache_write = usage.get("cache_creation_input_tokens") or 0
+
+    return cache_read, cache_write
+
+
+def _model_label(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    """"provider/model" of an LLM call, from LangChain's tracing metadata where available."""
+    metadata = kwargs.get("metadata") or {}
+    params = kwargs.get("invocation_params") or {}
+    provider = metadata.get("ls_provider") or params.get("_type") or "unknown"
+    model = metadata.get("ls_model_name") or params.get("model") or params.get("model_name")
+    if not model and serialized:
+        model = (serialized.get("id") or ["unknown"])[-1]
+    return f"{provider}/{model or 'unknown'}"
+
+
+class LLMCallTimer(BaseCallbackHandler):
+    """Callback handler that times each LLM call and hands the result to on_llm_call()."""
+
+    # Run in the event loop rather than a worker thread so usage is recorded before
+    # the call returns to the agent
+    run_inline = True
+
+    def __init__(self):
+        # Run ID -> (model label, start time, time of the first streamed token)
+        self._calls: Dict[UUID, List[Any]] = {}
+
+    def _start(self, serialized: Optional[Dict[str, Any]], run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        if len(self._calls) >= _MAX_OPEN_CALLS:
+            for stale in [key for key, call in list(self._calls.items()) if now - call[1] > _STALE_CALL_SECONDS]:
+                self._calls.pop(stale, None)
+        self._calls[run_id] = [_model_label(serialized, kwargs), now, None]
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.get(run_id)
+        if call is not None and call[2] is None:
+            call[2] = time.monotonic()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._calls.pop(run_id, None)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.pop(run_id, None)
+        now = time.monotonic()
+        model, started_at, first_token_at = call if call else ("unknown", now, None)
+        time_to_first_token = first_token_at - started_at if first_token_at is not None else None
+        try:
+            self.on_llm_call(model, response, now - started_at, time_to_first_token)
+        except Exception as e:
+            logger.warning(f"Error recording LLM usage: {str(e)}")
+
+    def on_llm_call(
+        self, model: str, response: LLMResult, latency: float, time_to_first_token: Optional[float]
+    ) -> None:
+        """
+        Handle a completed LLM call.
+
+        Args:
+            model: "provider/model" of the call
+            response: The LLM result
+            latency: Seconds from the start of the call to its end
+            time_to_first_token: Seconds to the first streamed token, or None if the call was not streamed
+        """
+        pass
+
+
+class LLMMetricsHandler(LLMCallTimer):
+    """Callback handler that observes every LLM call into the process-wide histograms and the current trace."""
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.pop(run_id, None)
+        if call is not None:
+            tracer.record_span("llm.call", time.monotonic() - call[1], {"model": call[0]}, error=error)
+
+    def on_llm_call(
+        self, model: str, response: LLMResult, latency: float, time_to_first_token: Optional[float]
+    ) -> None:
+        input_tokens, output_tokens = extract_token_usage(response)
+        LLM_LATENCY.observe(latency, model)
+        if time_to_first_token is not None:
+            LLM_TIME_TO_FIRST_TOKEN.observe(time_to_first_token, model)
+        if input_tokens or output_tokens:
+            LLM_INPUT_TOKENS.observe(input_tokens, model)
+            LLM_OUTPUT_TOKENS.observe(output_tokens, model)
+        attributes = {"model": model, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        if time_to_first_token is not None:
+            attributes["time_to_first_token_ms"] = round(time_to_first_token * 1000, 1)
+        tracer.record_span("llm.call", latency, attributes)
+
+
+class TokenUsageHandler(LLMCallTimer):
+    """Callback handler that passes the token usage and timing of each LLM call to functions."""
+
+    def __init__(
+        self,
+        on_usage: Callable[[int, int], None],
+        on_cache_usage: Optional[Callable[[int, int], None]] = None,
+        on_call: Optional[Callable[[str, int, int, float, Optional[float]], None]] = None,
+        on_idle_wait: Optional[Callable[[float], None]] = None,
+    ):
+        """
+        Initialize the handler.
+
+        Args:
+            on_usage: Called with the input and output tokens of each call
+            on_cache_usage: Called with the prompt cache read and write tokens of each call
+            on_call: Called with the model, input and output tokens, latency and time to
+                first token of each call
+            on_idle_wait: Called with the time each call waited for a rate limiter slot
+        """
+        super().__init__()
+        self.on_usage = on_usage
+        self.on_cache_usage = on_cache_usage
+        self.on_call = on_call
+        self.on_idle_wait = on_idle_wait
+
+    def on_llm_call(
+        self, model: str, response: LLMResult, latency: float, time_to_first_token: Optional[float]
+    ) -> None:
+        input_tokens, output_tokens = extract_token_usage(response)
+        self.on_usage(input_tokens, output_tokens)
+        if self.on_cache_usage and input_tokens:
+            self.on_cache_usage(*extract_cache_usage(response))
+        if self.on_call:
+            self.on_call(model, input_tokens, output_tokens, latency, time_to_first_token)
+
+
+class UsageRecorder(TokenUsageHandler):
+    """
+    Records the LLM calls and rate limiter waits made while it is active, passing them on to
+    the handler it replaced, so that they can be charged to other tasks too (e.g. those that
+    shared a coalesced call).
+    """
+
+    def __init__(self, forward_to: Optional[TokenUsageHandler] = None):
+        """
+        Initialize the recorder.
+
+        Args:
+            forward_to: Handler of the task making the calls, which still gets every call
+        """
+        super().__init__(on_usage=lambda input_tokens, output_tokens: None, on_idle_wait=self._record_idle_wait)
+        self.forward_to = forward_to
+        # (model, input tokens, output tokens, latency, time to first token, cache read, cache write)
+        self.calls: List[Tuple[str, int, int, float, Optional[float], int, int]] = []
+        self.idle_waits: List[float] = []
+
+    def on_llm_call(
+        self, model: str, response: LLMResult, latency: float, time_to_first_token: Optional[float]
+    ) -> None:
+        input_tokens, output_tokens = extract_token_usage(response)
+        cache_read, cache_write = extract_cache_usage(response) if input_tokens else (0, 0)
+        self.calls.append((model, input_tokens, output_tokens, latency, time_to_first_token, cache_read, cache_write))
+        if self.forward_to:
+            self.forward_to.on_llm_call(model, response, latency, time_to_first_token)
+
+    def _record_idle_wait(self, seconds: float) -> None:
+        self.idle_waits.append(seconds)
+        if self.forward_to and self.forward_to.on_idle_wait:
+            self.forward_to.on_idle_wait(seconds)
+
+    def replay(self, handler: TokenUsageHandler) -> None:
+        """Report the recorded calls and waits to another handler, as if it had seen them itself."""
+        for model, input_tokens, output_tokens, latency, time_to_first_token, cache_read, cache_write in self.calls:
+            handler.on_usage(input_tokens, output_tokens)
+            if handler.on_cache_usage and input_tokens:
+                handler.on_cache_usage(cache_read, cache_write)
+            if handler.on_call:
+                handler.on_call(model, input_tokens, output_tokens, latency, time_to_first_token)
+        if handler.on_idle_wait:
+            for seconds in self.idle_waits:
+                handler.on_idle_wait(seconds)
+
+
+_current_usage_handler: ContextVar[Optional[TokenUsageHandler]] = ContextVar(
+    "task_token_usage_handler", default=None
+)
+# LangChain adds the handler in the context variable to every callback manager it configures
+register_configure_hook(_current_usage_handler, inheritable=True)
+
+# Process-wide, so it is set as the default instead of per task
+_metrics_handler: ContextVar[Optional[LLMMetricsHandler]] = ContextVar(
+    "llm_metrics_handler", default=LLMMetricsHandler()
+)
+register_configure_hook(_metrics_handler, inheritable=True)
+
+
+@contextmanager
+def track_token_usage(handler: Optional[TokenUsageHandler]) -> Iterator[Optional[TokenUsageHandler]]:
+    """Activate a usage handler for all LLM calls made in the current context."""
+    token = _current_usage_handler.set(handler)
+    try:
+        yield handler
+    finally:
+        _current_usage_handler.reset(token)
+
+
+def current_usage_handler() -> Optional[TokenUsageHandler]:
+    """The usage handler active in the current context, if any."""
+    return _current_usage_handler.get()
+
+
+def report_idle_wait(limiter: str, seconds: float) -> None:
+    """
+    Record the time an LLM call waited for a rate limiter slot.
+
+    Args:
+        limiter: Name of the rate limiter (provider/model)
+        seconds: Time spent queued
+    """
+    LLM_QUEUE_WAIT.observe(seconds, limiter)
+    if seconds > 0:
+        tracer.record_span("llm.queue_wait", seconds, {"limiter": limiter})
+    handler = _current_usage_handler.get()
+    if handler is not None and handler.on_idle_wait:
+        handler.on_idle_wait(seconds)
+
+
+# The rate limiters report queue waits through this hook, since strategies cannot import core
+add_idle_wait_listener(report_idle_wait)
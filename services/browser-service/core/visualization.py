@@ -1,13 +1,28 @@
+import asyncio
 import os
 import gradio as gr
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from PIL import Image
 import imageio
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+def list_files_by_ctime(directory: str, extension: str, newest_first: bool = True) -> List[Tuple[str, float]]:
+    """
+    List the files with an extension in a directory, sorted by creation time.
+    
+    Blocks on the file system; call it from a worker thread in async code.
+    
+    Returns:
+        List[Tuple[str, float]]: (filename, creation timestamp) pairs
+    """
+    with os.scandir(directory) as entries:
+        files = [(entry.name, entry.stat().st_ctime) for entry in entries if entry.name.endswith(extension)]
+    files.sort(key=lambda file: file[1], reverse=newest_first)
+    return files
+
 class BrowserVisualization:
     """Class for managing browser visualization features"""
     
@@ -16,34 +31,32 @@ class BrowserVisualization:
         self.recordings_dir = recordings_dir
         self.interface = None
     
-    def get_screenshot_gallery(self, _=None):
+    async def get_screenshot_gallery(self, _=None):
         """Get recent screenshots for gallery view"""
         try:
-            screenshots = [f for f in os.listdir(self.screenshots_dir) if f.endswith('.png')]
-            screenshots.sort(key=lambda x: os.path.getctime(os.path.join(self.screenshots_dir, x)), reverse=True)
-            return [os.path.join(self.screenshots_dir, s) for s in screenshots[:4]]  # Last 4 screenshots
+            screenshots = await asyncio.to_thread(list_files_by_ctime, self.screenshots_dir, '.png')
+            return [os.path.join(self.screenshots_dir, s) for s, _ in screenshots[:4]]  # Last 4 screenshots
         except Exception as e:
             logger.error(f"Error getting screenshot gallery: {e}")
             return []
     
-    def create_gif_from_screenshots(self):
+    def _write_gif(self, screenshots: List[str], gif_path: str) -> None:
+        """Decode the screenshots and encode them into a GIF (CPU-bound, run in a worker thread)"""
+        images = [imageio.imread(os.path.join(self.screenshots_dir, screenshot)) for screenshot in screenshots]
+        imageio.mimsave(gif_path, images, duration=0.5)
+    
+    async def create_gif_from_screenshots(self):
         """Create a GIF from recent screenshots"""
         try:
-            screenshots = [f for f in os.listdir(self.screenshots_dir) if f.endswith('.png')]
-            screenshots.sort(key=lambda x: os.path.getctime(os.path.join(self.screenshots_dir, x)))
+            screenshots = await asyncio.to_thread(list_files_by_ctime, self.screenshots_dir, '.png', False)
             
             if not screenshots:
                 return "No screenshots available"
                 
             gif_path = os.path.join(self.recordings_dir, f"history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.gif")
             
-            # Create GIF
-            images = []
-            for screenshot in screenshots[-10:]:  # Last 10 screenshots
-                img_path = os.path.join(self.screenshots_dir, screenshot)
-                images.append(imageio.imread(img_path))
-                
-            imageio.mimsave(gif_path, images, duration=0.5)
+            # Create GIF from the last 10 screenshots
+            await asyncio.to_thread(self._write_gif, [s for s, _ in screenshots[-10:]], gif_path)
             return f"Created GIF at {gif_path}"
         except Exception as e:
             logger.error(f"Error creating GIF: {e}")
@@ -0,0 +1,284 @@
+"""
+Server-side workflow execution.
+
+This module runs a DAG of agent tasks inside the service. Independent branches run
+concurrently, each node's result is passed to its dependents without a client round
+trip, and a node may take over the browser context of one of its predecessors so that
+cookies, logged-in state and the open page survive the handoff.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Version of the result envelope passed to dependent nodes (matches AgentResult on the web side)
+RESULT_VERSION = "1.0"
+
+# Terminal node states
+NODE_COMPLETED = "completed"
+NODE_FAILED = "failed"
+NODE_SKIPPED = "skipped"
+
+
+class WorkflowGraphError(ValueError):
+    """Raised when a workflow definition is not a valid DAG."""
+
+
+def validate_workflow_graph(nodes: List[Any]) -> List[str]:
+    """
+    Validate a workflow graph and return its node IDs in topological order.
+
+    Each node must expose ``id``, ``depends_on`` and ``inherit_browser_from``.
+
+    Args:
+        nodes: The workflow nodes
+
+    Returns:
+        List[str]: Node IDs in a valid execution order
+
+    Raises:
+        WorkflowGraphError: If the graph is empty, has unknown or duplicate nodes,
+            contains a cycle, or hands one browser context to more than one node
+    """
+    if not nodes:
+        raise WorkflowGraphError("Workflow must contain at least one node")
+
+    node_map = {}
+    for node in nodes:
+        if node.id in node_map:
+            raise WorkflowGraphError(f"Duplicate node id: {node.id}")
+        node_map[node.id] = node
+
+    browser_heirs: Dict[str, str] = {}
+    for node in nodes:
+        for dep in node.depends_on:
+            if dep == node.id:
+                raise WorkflowGraphError(f"Node {node.id} cannot depend on itself")
+            if dep not in node_map:
+                raise WorkflowGraphError(f"Node {node.id} depends on unknown node {dep}")
+
+        parent = node.inherit_browser_from
+        if parent is not None:
+            if parent not in node.depends_on:
+                raise WorkflowGraphError(
+                    f"Node {node.id} can only inherit the browser of a node it depends on (got {parent})"
+                )
+            # A browser context can only be handed to a single successor
+            if parent in browser_heirs:
+                raise WorkflowGraphError(
+                    f"Browser context of node {parent} is inherited by both {browser_heirs[parent]} and {node.id}"
+                )
+            browser_heirs[parent] = node.id
+
+    # Kahn's algorithm, preserving the declaration order for ties
+    in_degree = {node.id: len(set(node.depends_on)) for node in nodes}
+    dependents: Dict[str, List[str]] = {node.id: [] for node in nodes}
+    for node in nodes:
+        for dep in set(node.depends_on):
+            dependents[dep].append(node.id)
+
+    order = []
+    ready = [node.id for node in nodes if in_degree[node.id] == 0]
+    while ready:
+        node_id = ready.pop(0)
+        order.append(node_id)
+        for child in dependents[node_id]:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                ready.append(child)
+
+    if len(order) != len(nodes):
+        cyclic = sorted(node_id for node_id, degree in in_degree.items() if degree > 0)
+        raise WorkflowGraphError(f"Workflow contains a cycle involving nodes: {', '.join(cyclic)}")
+
+    return order
+
+
+def assign_task_ids(workflow_id: str, nodes: List[Any]) -> Dict[str, str]:
+    """
+    Map each workflow node to the ID of the task that runs it.
+
+    Nodes without an explicit ``task_id`` run as ``<workflow_id>-<node id>``.
+
+    Args:
+        workflow_id: The workflow ID
+        nodes: The workflow nodes
+
+    Returns:
+        Dict[str, str]: Node ID -> task ID
+
+    Raises:
+        WorkflowGraphError: If two nodes would run as the same task
+    """
+    node_tasks: Dict[str, str] = {}
+    nodes_by_task: Dict[str, str] = {}
+    for node in nodes:
+        task_id = node.task_id or f"{workflow_id}-{node.id}"
+        if task_id in nodes_by_task:
+            raise WorkflowGraphError(f"Nodes {nodes_by_task[task_id]} and {node.id} share task ID {task_id}")
+        nodes_by_task[task_id] = node.id
+        node_tasks[node.id] = task_id
+    return node_tasks
+
+
+def wrap_node_result(result: Any) -> Dict[str, Any]:
+    """Wrap a node result in the versioned envelope expected by previous_agent_output."""
+    return {
+        "version": RESULT_VERSION,
+        "timestamp": datetime.now().isoformat(),
+        "data": result,
+    }
+
+
+# Signature of the callbacks supplied by the API layer
+RunNodeFunc = Callable[[Any, Dict[str, Any], Optional[Tuple[Any, Any]]], Awaitable[Dict[str, Any]]]
+CreateSessionFunc = Callable[[Any], Awaitable[Tuple[Any, Any]]]
+CloseSessionFunc = Callable[[Any, Any], Awaitable[None]]
+
+
+class WorkflowExecutor:
+    """
+    Executes a validated workflow DAG.
+
+    The executor is independent of the API layer: running a node, and creating and
+    closing handoff browser sessions, are delegated to callbacks. ``run_node`` receives
+    the node, the previous outputs keyed by predecessor ID and an optional
+    ``(browser, browser_context)`` pair, and returns a dict with ``status`` and ``result``.
+    """
+
+    def __init__(
+        self,
+        nodes: List[Any],
+        run_node: RunNodeFunc,
+        create_browser_session: CreateSessionFunc,
+        close_browser_session: CloseSessionFunc,
+        on_node_update: Optional[Callable[[str, str], Awaitable[None]]] = None,
+    ):
+        self.order = validate_workflow_graph(nodes)
+        self.nodes = {node.id: node for node in nodes}
+        self.run_node = run_node
+        self.create_browser_session = create_browser_session
+        self.close_browser_session = close_browser_session
+        self.on_node_update = on_node_update
+
+        self.node_status: Dict[str, str] = {node_id: "pending" for node_id in self.order}
+        self.node_results: Dict[str, Any] = {}
+        self.node_errors: Dict[str, str] = {}
+
+        # Nodes whose browser context is handed to a successor, mapped to that successor
+        self._browser_heirs = {
+            node.inherit_browser_from: node.id
+            for node in nodes
+            if node.inherit_browser_from is not None
+        }
+        # Browser sessions waiting to be picked up by the inheriting node
+        self._handoff_sessions: Dict[str, Tuple[Any, Any]] = {}
+
+    async def _set_status(self, node_id: str, status: str) -> None:
+        """Record a node status change and notify the listener."""
+        self.node_status[node_id] = status
+        if self.on_node_update:
+            try:
+                await self.on_node_update(node_id, status)
+            except Exception as e:
+                logger.warning(f"Error notifying workflow node update for {node_id}: {str(e)}")
+
+    def _build_previous_output(self, node: Any) -> Dict[str, Any]:
+        """Collect the outputs of a node's predecessors."""
+        previous_output = dict(node.previous_agent_output or {})
+        for dep in node.depends_on:
+            previous_output[dep] = wrap_node_result(self.node_results.get(dep))
+        return previous_output
+
+    async def _release_session(self, session: Optional[Tuple[Any, Any]]) -> None:
+        """Close a handoff browser session, ignoring errors."""
+        if session:
+            try:
+                await self.close_browser_session(*session)
+            except Exception as e:
+                logger.warning(f"Error closing workflow browser session: {str(e)}")
+
+    async def _execute_node(self, node_id: str) -> None:
+        """Run a single node and store its outcome."""
+        node = self.nodes[node_id]
+        session = None
+
+        try:
+            # Take over the predecessor's browser, or open one to hand to our successor
+            if node.inherit_browser_from is not None:
+                session = self._handoff_sessions.pop(node.inherit_browser_from, None)
+            if session is None and node_id in self._browser_heirs:
+                session = await self.create_browser_session(node)
+
+            await self._set_status(node_id, "running")
+            outcome = await self.run_node(node, self._build_previous_output(node), session)
+
+            if outcome.get("status") == NODE_COMPLETED:
+                self.node_results[node_id] = outcome.get("result")
+                if node_id in self._browser_heirs and session is not None:
+                    self._handoff_sessions[node_id] = session
+                    session = None
+                await self._set_status(node_id, NODE_COMPLETED)
+            else:
+                self.node_errors[node_id] = outcome.get("error") or f"Node finished with status {outcome.get('status')}"
+                await self._set_status(node_id, NODE_FAILED)
+        except Exception as e:
+            logger.exception(f"Error executing workflow node {node_id}: {str(e)}")
+            self.node_errors[node_id] = f"{type(e).__name__}: {str(e)}"
+            await self._set_status(node_id, NODE_FAILED)
+        finally:
+            await self._release_session(session)
+
+    async def _skip_node(self, node_id: str, failed_dep: str) -> None:
+        """Mark a node as skipped because one of its predecessors did not complete."""
+        self.node_errors[node_id] = f"Skipped because upstream node {failed_dep} did not complete"
+        await self._set_status(node_id, NODE_SKIPPED)
+        # Nobody will take this browser over any more
+        await self._release_session(self._handoff_sessions.pop(self.nodes[node_id].inherit_browser_from, None))
+
+    async def run(self) -> Dict[str, str]:
+        """
+        Run the workflow until every node has completed, failed or been skipped.
+
+        Returns:
+            Dict[str, str]: Final status of each node
+        """
+        running: Dict[asyncio.Task, str] = {}
+        waiting = list(self.order)
+
+        try:
+            while waiting or running:
+                # Start every node whose predecessors are all done, skip those that can never run
+                for node_id in list(waiting):
+                    deps = self.nodes[node_id].depends_on
+                    failed_dep = next(
+                        (dep for dep in deps if self.node_status[dep] in (NODE_FAILED, NODE_SKIPPED)),
+                        None
+                    )
+                    if failed_dep is not None:
+                        waiting.remove(node_id)
+                        await self._skip_node(node_id, failed_dep)
+                    elif all(self.node_status[dep] == NODE_COMPLETED for dep in deps):
+                        waiting.remove(node_id)
+                        task = asyncio.create_task(self._execute_node(node_id))
+                        running[task] = node_id
+
+                if not running:
+                    continue
+
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task)
+        finally:
+            # Stop outstanding branches if the workflow itself is cancelled
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running.keys(), return_exceptions=True)
+            for node_id in list(self._handoff_sessions):
+                await self._release_session(self._handoff_sessions.pop(node_id))
+
+        return dict(self.node_status)
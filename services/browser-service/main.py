@@ -1,8 +1,10 @@
 import asyncio
 import base64
+import hashlib
+import hmac
 import logging
 import os
-import sys
+import threading
 import time
 import uuid
 from datetime import datetime, timedelta
@@ -13,22 +15,50 @@ from typing import Optional
 import copy
 import json
 
-# --- Restore original logger setup ---
-logger = logging.getLogger(__name__) # Restore original logger
-logger.propagate = False # Restore original setting
-# --- End Restore ---
+logger = logging.getLogger(__name__)
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request, Response, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from pydantic import Field
 from pydantic import validator
 import gradio as gr
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse
 
 from core.agent_adapter import AgentAdapter
 from core.state_utils import restore_state
+from core.budgets import TaskBudget
+from core.progress_monitor import ProgressMonitor
+from core.task_cache import TaskResultCache
+from core.task_handles import TaskHandleRegistry
+from core.usage import usage_histograms
+from core.metrics import Counter
+from core.metrics import FAST_BUCKETS
+from core.metrics import Histogram
+from core.metrics import REGISTRY
+from core.metrics import TASK_BUCKETS
+from core.loop_monitor import EventLoopMonitor
+from core.profiler import SamplingProfiler
+from core.memory import MemoryProfiler
+from core.memory import process_memory
+from core.memory import retained_sizes
+from core.structured_logging import configure_logging
+from core.structured_logging import logging_stats
+from core.structured_logging import parse_sampling
+from core.structured_logging import reset_log_context
+from core.structured_logging import set_log_context
+from core.tracing import build_exporters
+from core.tracing import parse_traceparent
+from core.tracing import tracer
+from core.idempotency import IdempotencyConflictError
+from core.idempotency import IdempotencyStore
+from core.result_refs import PreviousOutputResolver
+from core.result_refs import parse_json_path
+from core.workflow import WorkflowExecutor
+from core.workflow import WorkflowGraphError
+from core.workflow import assign_task_ids
 from contextlib import asynccontextmanager
 
 # Import configuration
@@ -41,18 +71,31 @@ from core.context import BrowserUseContext  # Legacy context, will be phased out
 from core.session_manager import SessionManager
 # Import our LLM strategy implementation
 from strategies.llm.factory import LLMProviderFactory
+from strategies.llm.client_pool import close_shared_http_clients
+from strategies.llm.rate_limiter import rate_limiter_stats
+from strategies.llm.response_cache import response_cache_stats
+from strategies.base import coalescing_stats
 # Import our new AgentAdapter
 from core.agent_adapter import agent_adapter
 
 # Load environment variables
 load_dotenv()
 
+# Log through a queue and a writer thread, as JSON lines tagged with the task/session
+configure_logging(
+    level=AppConfig.LOG_LEVEL,
+    json_format=AppConfig.LOG_FORMAT == "json",
+    sampling=parse_sampling(AppConfig.LOG_SAMPLING)
+)
+
 # Global variables for tracking application state
 startup_time = None
 cleanup_task = None
 active_tasks = {}  # Store active tasks by task_id
 task_history = {}  # Store completed tasks by task_id
 task_requests = {}  # Store original task requests by task_id
+workflow_runs = {}  # Store workflow runs by workflow_id
+task_handles = TaskHandleRegistry()  # asyncio tasks running each task, for pause/cancel
 connected_clients = {}
 visualization = None
 
@@ -72,18 +115,51 @@ async def lifespan(app: FastAPI):
     cleanup_task = asyncio.create_task(periodic_task_cleanup())
     logger.info(f"Periodic task cleanup created: {cleanup_task.get_name()}")  # Revert to logger
     
+    # Build shared LLM clients and open their connections before the first task arrives
+    if AppConfig.LLM_PREWARM:
+        asyncio.create_task(LLMProviderFactory.prewarm(get_available_llm_providers()))
+    
+    # Probe the local model server in the background so that /health never waits on it
+    local_health_task = None
+    if os.getenv("LOCAL_LLM_BASE_URL"):
+        local_health_task = asyncio.create_task(
+            LLMProviderFactory.monitor_local_health(AppConfig.LOCAL_LLM_HEALTH_INTERVAL_SECONDS)
+        )
+    
+    # Sample event loop lag and log what blocks the loop
+    loop_monitor.start()
+    
+    # Trace allocations for /debug/memory, and dump snapshots to disk if configured
+    memory_snapshot_task = None
+    if AppConfig.MEMORY_TRACE_AT_STARTUP:
+        memory_profiler.start_tracing()
+    if AppConfig.MEMORY_SNAPSHOT_DIR and AppConfig.MEMORY_SNAPSHOT_INTERVAL_SECONDS > 0:
+        memory_snapshot_task = asyncio.create_task(memory_profiler.dump_periodically(
+            AppConfig.MEMORY_SNAPSHOT_DIR, AppConfig.MEMORY_SNAPSHOT_INTERVAL_SECONDS, AppConfig.MEMORY_SNAPSHOT_KEEP
+        ))
+    
+    # Keep recent traces for /execute/{task_id}/trace and export spans if configured
+    try:
+        exporters = build_exporters(AppConfig.TRACE_EXPORT_PATH, AppConfig.OTLP_ENDPOINT, AppConfig.TRACE_SERVICE_NAME)
+    except Exception as e:
+        logger.error(f"Error configuring span exporters, spans are kept in memory only: {e}")
+        exporters = []
+    tracer.configure(AppConfig.TRACING_ENABLED, AppConfig.TRACE_MAX_TASKS, exporters)
+    
     yield  # This is where FastAPI serves requests
     
     # Shutdown logic
     logger.info("Application shutting down, cleaning up resources...")
     
-    # Cancel the cleanup task
-    if cleanup_task:
-        cleanup_task.cancel()
-        try:
-            await cleanup_task
-        except asyncio.CancelledError:
-            pass
+    # Cancel the cleanup, memory snapshot and local health tasks and stop the lag monitor
+    for background_task in (cleanup_task, memory_snapshot_task, local_health_task):
+        if background_task:
+            background_task.cancel()
+            try:
+                await background_task
+            except asyncio.CancelledError:
+                pass
+    await loop_monitor.stop()
     
     # Close all active agents in the AgentAdapter
     for task_id, agent in list(agent_adapter.active_agents.items()):
@@ -93,6 +169,15 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"Error cleaning up agent for task {task_id} during shutdown: {e}")
     
+    # Close the keep-alive connections shared by the LLM clients
+    try:
+        await close_shared_http_clients()
+    except Exception as e:
+        logger.error(f"Error closing shared LLM HTTP clients during shutdown: {e}")
+    
+    # Export the spans still queued
+    await asyncio.to_thread(tracer.shutdown)
+    
     # Close all active browser sessions (legacy)
     for session_id, session in list(session_manager.sessions.items()):
         try:
@@ -126,6 +211,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_context_middleware(request: Request, call_next):
+    """Continue the caller's trace when the request carries a W3C traceparent header"""
+    with tracer.remote_parent(parse_traceparent(request.headers.get("traceparent"))):
+        return await call_next(request)
+
 # Configure paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SCREENSHOTS_DIR = os.path.join(BASE_DIR, "screenshots")
@@ -137,6 +228,7 @@ os.makedirs(RECORDINGS_DIR, exist_ok=True)
 
 # Create Gradio interface
 from core.visualization import create_browser_interface
+from core.visualization import list_files_by_ctime
 
 # Mount Gradio app
 interface = create_browser_interface(SCREENSHOTS_DIR, RECORDINGS_DIR)
@@ -149,30 +241,58 @@ DEFAULT_OPERATION_TIMEOUT = AppConfig.DEFAULT_OPERATION_TIMEOUT
 connected_clients = {}
 visualization = None
 
+# Metrics updated on the hot paths; everything else is read by collect_metrics() on scrape
+TASK_QUEUE_WAIT = Histogram(
+    "task_queue_wait_seconds", "Time from task submission until its run started", FAST_BUCKETS + (5.0, 10.0, 30.0)
+)
+TASK_DURATION = Histogram(
+    "task_duration_seconds", "Duration of task runs by outcome and LLM provider", TASK_BUCKETS,
+    labels=("outcome", "provider")
+)
+WEBSOCKET_SEND_DURATION = Histogram(
+    "websocket_send_seconds", "Time to send one update to one WebSocket client", FAST_BUCKETS
+)
+WEBSOCKET_SEND_ERRORS = Counter("websocket_send_errors", "Updates that could not be sent to a WebSocket client")
+CLEANUP_LOOP_DURATION = Histogram(
+    "cleanup_loop_seconds", "Duration of one pass of the periodic task cleanup", FAST_BUCKETS + (5.0, 10.0, 30.0)
+)
+
 # Initialize session manager
 session_manager = SessionManager(session_timeout_minutes=AppConfig.SESSION_TIMEOUT_MINUTES)
 
+# Initialize task result cache
+task_cache = TaskResultCache(
+    max_entries=AppConfig.TASK_CACHE_MAX_ENTRIES,
+    ttl_seconds=AppConfig.TASK_CACHE_TTL_SECONDS,
+    cancel_timeout=AppConfig.TASK_CANCEL_TIMEOUT_SECONDS
+)
+
+# Initialize idempotency key store (client errors are replayed too, server errors can be retried)
+idempotency_store = IdempotencyStore(
+    max_entries=AppConfig.IDEMPOTENCY_MAX_ENTRIES,
+    ttl_seconds=AppConfig.IDEMPOTENCY_TTL_SECONDS,
+    should_store_error=lambda e: isinstance(e, HTTPException) and e.status_code < 500
+)
+
+# Initialize event loop lag monitor
+loop_monitor = EventLoopMonitor(
+    interval=AppConfig.EVENT_LOOP_LAG_INTERVAL_SECONDS,
+    stall_threshold=AppConfig.EVENT_LOOP_STALL_SECONDS
+)
+
+# Initialize memory profiler (allocation tracing starts on demand)
+memory_profiler = MemoryProfiler(frames=AppConfig.MEMORY_TRACE_FRAMES)
+
 # Task cleanup function
 async def periodic_task_cleanup():
-    # --- Explicit Logger Configuration --- 
-    task_logger = logging.getLogger(__name__ + ".periodic_task") # Use a unique name
-    task_logger.setLevel(logging.INFO) # Set desired level
-    # Create handler only if logger doesn't have handlers already
-    if not task_logger.hasHandlers(): 
-        handler = logging.StreamHandler(sys.stdout) # Output to stdout
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        task_logger.addHandler(handler)
-        task_logger.propagate = False # Prevent duplicate logs if root logger is also configured
-    else:
-        # Optional: Log if handlers already exist (for debugging setup)
-        task_logger.info("Logger already configured, reusing existing handlers.")
-    # --- End Explicit Logger Configuration ---
+    # Own logger name, so the per-cycle messages can be sampled (LOG_SAMPLING)
+    task_logger = logging.getLogger(__name__ + ".periodic_task")
     
     task_logger.info("Starting periodic task cleanup loop...") # Log start
 
     while True:
         try:
+            cycle_started_at = time.monotonic()
             # Explicitly get logger inside the task loop
             task_logger.info("Running periodic task cleanup") # Use task_logger
             now = datetime.now()
@@ -238,6 +358,12 @@ async def periodic_task_cleanup():
                         task_logger.info(f"Removing old completed task {task_id} from history")
                         del task_history[task_id]
             
+            # Remove finished workflow runs after the same retention period
+            for workflow_id, workflow_status in list(workflow_runs.items()):
+                if workflow_status.end_time and workflow_status.end_time < completed_threshold:
+                    task_logger.info(f"Removing old workflow run {workflow_id}")
+                    del workflow_runs[workflow_id]
+            
             # Check for orphaned agents (agents without an active task)
             for task_id, agent in list(agent_adapter.active_agents.items()):
                 if task_id not in active_tasks:
@@ -274,25 +400,26 @@ async def periodic_task_cleanup():
                         except Exception as e:
                             task_logger.error(f"Error closing stale persistent session {session_id}: {e}")
             
+            CLEANUP_LOOP_DURATION.observe(time.monotonic() - cycle_started_at)
+            
             # Sleep for a while before the next cleanup cycle
             await asyncio.sleep(60)  # Run every 60 seconds
 
-        except Exception as e:
+        except Exception:
             # Use .exception() to include traceback
             task_logger.exception("Error during periodic task cleanup") 
-            # Add print as fallback
-            print(f"--- PERIODIC TASK: EXCEPTION: {e} ---") 
         
         await asyncio.sleep(60) # Run every 60 seconds
 
 # Task creation response model
 class TaskCreationResponseModel(BaseModel):
     taskId: str
+    cached: bool = False  # True if the result was served from the task cache
 
 # Task status model
 class TaskStatus(BaseModel):
     task_id: str
-    status: str  # "pending", "running", "completed", "failed", "needs_assistance", "paused"
+    status: str  # "pending", "running", "completed", "failed", "budget_exhausted", "cancelled", "needs_assistance", "paused"
     progress: float = 0.0
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
@@ -300,6 +427,8 @@ class TaskStatus(BaseModel):
     error: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
     assistance_message: Optional[str] = None  # Message explaining why assistance is needed
+    cached: bool = False  # True if the result came from the task cache or an identical in-flight task
+    usage: Optional[Dict[str, Any]] = None  # Steps, LLM tokens and wall time used so far
 
 # Recording configuration
 class RecordingConfig(BaseModel):
@@ -316,6 +445,17 @@ class ProviderConfig(BaseModel):
     temperature: Optional[float] = 0.7
     options: Optional[Dict[str, Any]] = None
 
+# Reference to the result of an earlier task
+class AgentOutputRef(BaseModel):
+    task_id: str
+    path: Optional[str] = None  # Optional JSONPath projection, e.g. "$.history[-1].result"
+
+    @validator('path')
+    def validate_path(cls, v):
+        if v is not None:
+            parse_json_path(v)
+        return v
+
 # Task request model
 class TaskRequest(BaseModel):
     task: str
@@ -327,6 +467,13 @@ class TaskRequest(BaseModel):
     persistent_session: Optional[bool] = False
     options: Optional[Dict[str, Any]] = None
     previous_agent_output: Optional[Dict[str, Any]] = None
+    previous_agent_refs: Optional[Dict[str, AgentOutputRef]] = None  # Resolved lazily against stored task results
+    cache: Optional[bool] = False  # Reuse the result of an identical recent or in-flight task
+    cache_ttl: Optional[int] = None  # Seconds to keep this task's result (defaults to TASK_CACHE_TTL_SECONDS)
+    max_steps: Optional[int] = None  # Stop with "budget_exhausted" after this many agent steps
+    max_input_tokens: Optional[int] = None  # Stop once the LLM calls have consumed this many input tokens
+    max_output_tokens: Optional[int] = None  # Stop once the LLM calls have produced this many output tokens
+    max_wall_time: Optional[float] = None  # Stop after this many seconds (checked between steps)
     
     @validator('previous_agent_output')
     def validate_previous_output(cls, v):
@@ -347,15 +494,110 @@ class TaskRequest(BaseModel):
                     # Note: 'data' field is optional in AgentResult, so no check here.
         return v
 
+# Workflow node model: a task request plus its position in the DAG
+class WorkflowNode(TaskRequest):
+    id: str
+    depends_on: List[str] = Field(default_factory=list)
+    inherit_browser_from: Optional[str] = None  # Predecessor whose browser context this node takes over
+
+# Workflow request model
+class WorkflowRequest(BaseModel):
+    workflow_id: Optional[str] = None
+    nodes: List[WorkflowNode]
+
+# Workflow creation response model
+class WorkflowCreationResponseModel(BaseModel):
+    workflowId: str
+    taskIds: Dict[str, str]  # Node ID -> task ID
+
+# Workflow status model
+class WorkflowStatus(BaseModel):
+    workflow_id: str
+    status: str  # "pending", "running", "completed", "failed"
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    node_tasks: Dict[str, str] = Field(default_factory=dict)  # Node ID -> task ID
+    node_status: Dict[str, str] = Field(default_factory=dict)
+    node_errors: Dict[str, str] = Field(default_factory=dict)
+
+def task_cache_key(request: TaskRequest) -> Optional[str]:
+    """Cache key for a task, or None if the task is not cacheable"""
+    if not request.cache or (request.options and "resume_from" in request.options):
+        return None
+    llm_provider = request.llm_provider.model_dump(exclude={"api_key"}) if request.llm_provider else None
+    # Results are only shared between callers presenting the same credentials; the key is
+    # hashed so that it never sits in the cache key material
+    api_key = request.llm_provider.api_key if request.llm_provider else None
+    return TaskResultCache.make_key({
+        "task": request.task,
+        "llm_provider": llm_provider,
+        "credentials": hashlib.sha256(api_key.encode("utf-8")).hexdigest() if api_key else None,
+        "options": request.options,
+        # How long the run may take and how it is run change its outcome
+        "operation_timeout": request.operation_timeout,
+        "headless": request.headless,
+        "recording_config": request.recording_config.model_dump() if request.recording_config else None,
+        "max_steps": request.max_steps,
+        "max_input_tokens": request.max_input_tokens,
+        "max_output_tokens": request.max_output_tokens,
+        "max_wall_time": request.max_wall_time,
+        "previous_agent_output": request.previous_agent_output,
+        "previous_agent_refs": {k: v.model_dump() for k, v in request.previous_agent_refs.items()} if request.previous_agent_refs else None,
+    })
+
+def register_task(task_id: str, request: TaskRequest) -> TaskStatus:
+    """Create the pending status for a new task and start tracking it."""
+    task_status = TaskStatus(
+        task_id=task_id,
+        status="pending",
+        start_time=datetime.now()
+    )
+    active_tasks[task_id] = task_status
+    task_requests[task_id] = request
+    return task_status
+
+async def run_idempotent(idempotency_key: Optional[str], scope: str, fingerprint: str, handler, response: Response):
+    """
+    Run an endpoint handler at most once per Idempotency-Key.
+
+    Repeats with the same key get the original response (or client error) and an
+    Idempotent-Replayed header. Requests without a key are handled normally.
+    """
+    if not idempotency_key:
+        return await handler()
+
+    async def handle_and_snapshot():
+        result = await handler()
+        # Replay the response as it was sent, not the live TaskStatus the task keeps updating
+        return result.model_copy(deep=True) if isinstance(result, BaseModel) else result
+
+    try:
+        result, replayed = await idempotency_store.run(scope, idempotency_key, fingerprint, handle_and_snapshot)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
 # Execute a browser task
 @app.post("/execute", response_model=TaskCreationResponseModel)
-async def execute_task(request: TaskRequest):
+async def execute_task(
+    request: TaskRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Execute a browser task.
 
     This endpoint creates a new task and executes it asynchronously.
-    It returns the generated task ID.
+    It returns the generated task ID. Retries carrying the same Idempotency-Key
+    return the original task ID instead of starting another task.
     """
+    fingerprint = TaskResultCache.make_key(request.model_dump(mode="json"))
+    return await run_idempotent(idempotency_key, "execute", fingerprint, lambda: _execute_task(request), response)
+
+async def _execute_task(request: TaskRequest) -> TaskCreationResponseModel:
+    """Register a new task and start it in the background"""
     # Generate task ID if not provided
     task_id = request.task_id or str(uuid.uuid4())
 
@@ -363,38 +605,59 @@ async def execute_task(request: TaskRequest):
     if task_id in active_tasks:
         raise HTTPException(status_code=400, detail=f"Task ID {task_id} already exists")
 
-    # Create task status (still needed internally)
-    task_status = TaskStatus(
-        task_id=task_id,
-        status="pending",
-        start_time=datetime.now()
-    )
+    # Referenced tasks must be known; their results are only resolved when the agent asks for them
+    for key, ref in (request.previous_agent_refs or {}).items():
+        if ref.task_id not in active_tasks and ref.task_id not in task_history:
+            raise HTTPException(status_code=400, detail=f"Referenced task {ref.task_id} for '{key}' not found")
 
-    # Store task status and request
-    logger.info(f"EXECUTE: Attempting to add task_id: {task_id}")
-    print(f"[execute_task] PRE-UPDATE: Attempting to add task {task_id}. Current active tasks ({len(active_tasks)}): {list(active_tasks.keys())}")
-    active_tasks[task_id] = task_status
-    print(f"[execute_task] POST-UPDATE: Task {task_id} added. Current active tasks ({len(active_tasks)}): {list(active_tasks.keys())}")
-    task_requests[task_id] = request
-    logger.info(f"EXECUTE: Task {task_id} added. Active tasks: {list(active_tasks.keys())}")
+    # Serve identical recent tasks straight from the cache
+    cache_key = task_cache_key(request)
+    cached_response = task_cache.get(cache_key) if cache_key else None
+    if cached_response is not None:
+        now = datetime.now()
+        task_status = TaskStatus(
+            task_id=task_id,
+            status="completed",
+            start_time=now,
+            end_time=now,
+            result=cached_response.get("result"),
+            cached=True
+        )
+        task_history[task_id] = task_status
+        task_requests[task_id] = request
+        logger.info(f"EXECUTE: Task {task_id} served from task cache")
+        await broadcast_task_update(task_id, task_status)
+        return TaskCreationResponseModel(taskId=task_id, cached=True)
 
-    # --- Use logger directly before background task ---
-    logger.debug(f"--- DEBUG MARKER: Immediately before creating background task ---")
-    print(f"--- PRINT MARKER: Immediately before creating background task ---", file=sys.stderr, flush=True)
-    # --- END Add --- 
+    # Create and store task status and request
+    task_status = register_task(task_id, request)
+    logger.info(f"EXECUTE: Task {task_id} added ({len(active_tasks)} active tasks)")
 
     # Start the task in a background task
-    asyncio.create_task(run_task(task_id, request, task_status))
+    task_handles.start(task_id, run_task(task_id, request, task_status))
 
     # Return only the task ID using the simplified model
-    print(f"[execute_task] Scheduling background task and returning response for {task_id}.")
     return TaskCreationResponseModel(taskId=task_id)
 
 # Run a task in the background
-async def run_task(task_id: str, request: TaskRequest, task_status: TaskStatus):
-    """Run a task in the background"""
+async def run_task(
+    task_id: str,
+    request: TaskRequest,
+    task_status: TaskStatus,
+    browser_session: Optional[tuple] = None
+):
+    """Run a task in the background, optionally inside a caller-owned (browser, browser_context)"""
+    # Every record logged by the run, the agent and the libraries it calls carries the task ID
+    log_tokens = set_log_context(task_id=task_id, session_id=(task_status.metadata or {}).get("session_id"))
     logger.info(f"[run_task:{task_id}] Starting execution for task: '{request.task}'")
     heartbeat_task = None # Initialize heartbeat_task
+    run_started_at = time.monotonic()
+    # Root of the task's waterfall; a resumed run starts a new one
+    span, span_token = tracer.start_span("run_task", task_id=task_id)
+    tracer.bind_task(task_id, span)
+    if task_status.status == "pending" and task_status.start_time:
+        # Resumed runs were already started once and do not count as queued
+        TASK_QUEUE_WAIT.observe(max(0.0, (datetime.now() - task_status.start_time).total_seconds()))
 
     async def _update_heartbeat():
         """Periodically update the last_activity timestamp."""
@@ -437,29 +700,71 @@ async def run_task(task_id: str, request: TaskRequest, task_status: TaskStatus):
         is_headless = request.headless if request.headless is not None else True
         logger.info(f"[run_task:{task_id}] Headless mode: {is_headless}")
 
-        # Extract previous agent output if available
-        previous_agent_output = request.previous_agent_output
-        if previous_agent_output:
+        # Previous agent output (inline and/or by reference) is resolved lazily by the agent
+        previous_output_resolver = PreviousOutputResolver(
+            inline=request.previous_agent_output,
+            refs=request.previous_agent_refs,
+            lookup=lookup_task_result
+        )
+        if previous_output_resolver:
             logger.info(f"[run_task:{task_id}] Task includes previous agent output.")
 
-        # Execute task using the agent adapter
-        response = await agent_adapter.execute_task(
-            task=request.task,
-            task_id=task_id,
-            headless=is_headless, # Use determined headless value
-            llm_provider=llm_provider,
-            operation_timeout=request.operation_timeout or DEFAULT_OPERATION_TIMEOUT,
-            options=request.options,
-            previous_output=previous_agent_output  # Pass previous agent output
+        # Step, token and wall-time budget; usage is reported live in the task status
+        budget = TaskBudget(
+            max_steps=request.max_steps,
+            max_input_tokens=request.max_input_tokens,
+            max_output_tokens=request.max_output_tokens,
+            max_wall_time=request.max_wall_time,
+            on_update=lambda usage: setattr(task_status, "usage", usage)
         )
+
+        # Execute task using the agent adapter
+        async def execute():
+            return await agent_adapter.execute_task(
+                task=request.task,
+                task_id=task_id,
+                headless=is_headless, # Use determined headless value
+                llm_provider=llm_provider,
+                operation_timeout=request.operation_timeout or DEFAULT_OPERATION_TIMEOUT,
+                options=request.options,
+                previous_output=previous_output_resolver,  # Pass previous agent output
+                browser=browser_session[0] if browser_session else None,
+                browser_context=browser_session[1] if browser_session else None,
+                step_timeout=AppConfig.STEP_TIMEOUT_SECONDS,
+                llm_timeout=AppConfig.LLM_CALL_TIMEOUT_SECONDS,
+                navigation_timeout=AppConfig.NAVIGATION_TIMEOUT_SECONDS,
+                budget=budget,
+                progress_monitor=ProgressMonitor(
+                    max_repeats=AppConfig.LOOP_MAX_REPEATS,
+                    max_stalled_steps=AppConfig.STALL_MAX_STEPS,
+                    max_nudges=AppConfig.PROGRESS_MAX_NUDGES
+                )
+            )
+
+        # Cacheable tasks run at most once across identical concurrent submissions;
+        # tasks handed a browser session must run in it, so they bypass the cache
+        cache_key = task_cache_key(request) if not browser_session else None
+        if cache_key:
+            # A task joining an identical task's run has no agent of its own
+            task_status.cached = task_cache.in_flight(cache_key)
+            response, task_status.cached = await task_cache.run(cache_key, execute, ttl_seconds=request.cache_ttl)
+            if task_status.cached:
+                logger.info(f"[run_task:{task_id}] Result shared from cache or an identical in-flight task.")
+        else:
+            response = await execute()
         
+        # A pause or cancel that raced with the run finishing takes precedence
+        if task_status.status in ["paused", "cancelled"]:
+            logger.info(f"[run_task:{task_id}] Run finished after being {task_status.status}; keeping that status.")
+            return
+
         # Update task status based on adapter response
         adapter_status = response.get("status")
         logger.info(f"[run_task:{task_id}] Adapter finished with status: {adapter_status}")
 
         if adapter_status == "success":
             task_status.status = "completed"
-        elif adapter_status in ["pending", "running", "completed", "failed", "needs_assistance", "paused"]:
+        elif adapter_status in ["pending", "running", "completed", "failed", "budget_exhausted", "needs_assistance", "paused"]:
              task_status.status = adapter_status
         else:
             task_status.status = "failed"
@@ -467,15 +772,30 @@ async def run_task(task_id: str, request: TaskRequest, task_status: TaskStatus):
             logger.warning(f"[run_task:{task_id}] Received unknown status from adapter: {adapter_status}")
             
         task_status.result = response.get("result")
+        if response.get("usage"):
+            task_status.usage = response["usage"]
+        if response.get("failed_stage"):
+            task_status.metadata["failed_stage"] = response["failed_stage"]
         # Capture error from adapter response if status is failed or if adapter provided one
         adapter_error = response.get("error")
-        if task_status.status == "failed" and not task_status.error:
+        if task_status.status in ["failed", "budget_exhausted"] and not task_status.error:
             task_status.error = adapter_error or "Error details not provided by adapter."
         elif adapter_error: # Prioritize adapter error if available
              task_status.error = adapter_error
              
         task_status.end_time = datetime.now()
 
+    except asyncio.CancelledError:
+        # Cancelled by pause_task/cancel_task, which already set the status; anything
+        # else cancelling the run (e.g. shutdown) counts as a cancellation too
+        logger.info(f"[run_task:{task_id}] Execution cancelled (status: {task_status.status}).")
+        if task_status.status != "paused":
+            task_status.status = "cancelled"
+            task_status.end_time = task_status.end_time or datetime.now()
+        if span:
+            span.record_error(asyncio.CancelledError())
+        raise
+
     except Exception as e:
         # Log the exception immediately, including its type
         error_type = type(e).__name__
@@ -487,52 +807,157 @@ async def run_task(task_id: str, request: TaskRequest, task_status: TaskStatus):
         task_status.status = "failed"
         task_status.error = f"{error_type}: {error_msg}" # Store error type and message
         task_status.end_time = datetime.now()
+        if span:
+            span.record_error(e)
 
     finally:
-        # Ensure heartbeat task is cancelled
-        if heartbeat_task and not heartbeat_task.done():
-            heartbeat_task.cancel()
-            try:
-                await heartbeat_task # Wait for cancellation to complete
-            except asyncio.CancelledError:
-                logger.info(f"[run_task:{task_id}] Heartbeat task successfully cancelled.")
-            except Exception as e_cancel:
-                logger.error(f"[run_task:{task_id}] Error awaiting cancelled heartbeat task: {e_cancel}")
+        try:
+            # Ensure heartbeat task is cancelled
+            if heartbeat_task and not heartbeat_task.done():
+                heartbeat_task.cancel()
+                try:
+                    await heartbeat_task # Wait for cancellation to complete
+                except asyncio.CancelledError:
+                    logger.info(f"[run_task:{task_id}] Heartbeat task successfully cancelled.")
+                except Exception as e_cancel:
+                    logger.error(f"[run_task:{task_id}] Error awaiting cancelled heartbeat task: {e_cancel}")
+
+            # This block ensures cleanup happens even if the main try block completes or an exception occurs
+            logger.info(f"[run_task:{task_id}] Entering finally block. Current status: {task_status.status}")
+            
+            # Ensure task is moved to history if in a terminal state (completed, failed, budget_exhausted or cancelled)
+            if task_status.status in ["completed", "failed", "budget_exhausted", "cancelled"]:
+                try:
+                    # Check if already moved (could happen if exception occurred *after* successful completion logic)
+                    if task_id in active_tasks:
+                        # Move the actual TaskStatus object
+                        task_history[task_id] = active_tasks.pop(task_id)
+                        logger.info(f"[run_task:{task_id}] Task in terminal state ('{task_status.status}') moved to history.")
+                    elif task_id not in task_history:
+                         # This case handles if the task failed very early or the except block was hit
+                         logger.warning(f"[run_task:{task_id}] Task not found in active_tasks. Placing current status directly into history.")
+                         task_history[task_id] = task_status # Add current status object directly if missing
+                    else:
+                        # Task is already in history; store the latest status object (e.g. with a more specific error)
+                        logger.info(f"[run_task:{task_id}] Task already present in task_history. Status: {task_history[task_id].status}. Updating.")
+                        task_history[task_id] = task_status
+                except Exception as final_e:
+                     logger.exception(f"[run_task:{task_id}] CRITICAL: Exception during final cleanup! Error: {final_e}")
+
+            TASK_DURATION.observe(
+                time.monotonic() - run_started_at,
+                task_status.status,
+                request.llm_provider.type if request.llm_provider else "default"
+            )
+            if span:
+                span.set_attribute("outcome", task_status.status)
+            tracer.end_span(span, span_token)
+            
+            # Broadcast final status update AFTER moving/updating history
+            await broadcast_task_update(task_id, task_status)
+            logger.info(f"[run_task:{task_id}] Finished execution and cleanup.")
+        finally:
+            # Runs even if the cleanup above raises or is cancelled, e.g. during the final broadcast
+            reset_log_context(log_tokens)
 
-        # This block ensures cleanup happens even if the main try block completes or an exception occurs
-        logger.info(f"[run_task:{task_id}] Entering finally block. Current status: {task_status.status}")
-        
-        # Ensure task is moved to history if in a terminal state (completed or failed)
-        if task_status.status in ["completed", "failed"]:
-            logger.info(f"[run_task:{task_id}] FINALLY: Task in terminal state ('{task_status.status}'). Preparing to move/update history.")
-            logger.info(f"[run_task:{task_id}] FINALLY: State before move -> Active: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
-            try:
-                logger.info(f"[run_task:{task_id}] Task in terminal state ('{task_status.status}'). Attempting cleanup.")
-                # Check if already moved (could happen if exception occurred *after* successful completion logic)
-                if task_id in active_tasks:
-                    logger.info(f"[run_task:{task_id}] Task found in active_tasks. Moving to history.")
-                    # Move the actual TaskStatus object
-                    task_history[task_id] = active_tasks.pop(task_id)
-                    logger.info(f"[run_task:{task_id}] Task successfully moved to history. Active: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
-                elif task_id not in task_history:
-                     # This case handles if the task failed very early or the except block was hit
-                     logger.warning(f"[run_task:{task_id}] Task not found in active_tasks. Placing current status directly into history.")
-                     task_history[task_id] = task_status # Add current status object directly if missing
-                     logger.info(f"[run_task:{task_id}] Task status placed in history. Active: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
-                     logger.info(f"[run_task:{task_id}] FINALLY: State after adding missing to history -> Active: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
-                else:
-                    # Task is already in history, maybe update it?
-                    logger.info(f"[run_task:{task_id}] Task already present in task_history. Status: {task_history[task_id].status}. Updating if necessary.")
-                    # Optionally update the history entry if needed, e.g., with a more specific error
-                    task_history[task_id] = task_status # Ensure latest status object is stored
-                    logger.info(f"[run_task:{task_id}] FINALLY: State after updating history -> Active: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
-            except Exception as final_e:
-                 logger.exception(f"[run_task:{task_id}] CRITICAL: Exception during final cleanup! Error: {final_e}")
-                 logger.error(f"[run_task:{task_id}] FINALLY: State during cleanup exception -> Active: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
-
-        # Broadcast final status update AFTER moving/updating history
-        await broadcast_task_update(task_id, task_status)
-        logger.info(f"[run_task:{task_id}] Finished execution and cleanup.")
+def lookup_task_result(task_id: str) -> Optional[Any]:
+    """Look up the stored result of a task, used to resolve previous_agent_refs"""
+    task_status = task_history.get(task_id) or active_tasks.get(task_id)
+    return task_status.result if task_status else None
+
+# Execute a workflow DAG
+@app.post("/workflows/execute", response_model=WorkflowCreationResponseModel)
+async def execute_workflow(request: WorkflowRequest):
+    """
+    Execute a workflow of agent tasks.
+
+    Nodes run as soon as all of their dependencies have completed, so independent
+    branches run in parallel. Each node receives its predecessors' results as
+    previous_agent_output, and a node with inherit_browser_from continues in that
+    predecessor's browser context. Every node is also tracked as a regular task.
+    """
+    workflow_id = request.workflow_id or str(uuid.uuid4())
+    if workflow_id in workflow_runs:
+        raise HTTPException(status_code=400, detail=f"Workflow ID {workflow_id} already exists")
+
+    try:
+        node_tasks = assign_task_ids(workflow_id, request.nodes)
+    except WorkflowGraphError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # A finished task's ID is taken too: reusing it would overwrite the task's history
+    for task_id in node_tasks.values():
+        if task_id in active_tasks or task_id in task_history:
+            raise HTTPException(status_code=400, detail=f"Task ID {task_id} already exists")
+
+    workflow_status = WorkflowStatus(
+        workflow_id=workflow_id,
+        status="pending",
+        start_time=datetime.now(),
+        node_tasks=node_tasks
+    )
+
+    async def run_node(node: WorkflowNode, previous_output: Dict[str, Any], browser_session: Optional[tuple]) -> Dict[str, Any]:
+        task_id = node_tasks[node.id]
+        node_request = node.model_copy(update={"task_id": task_id, "previous_agent_output": previous_output or None})
+        task_status = register_task(task_id, node_request)
+        handle = task_handles.start(task_id, run_task(task_id, node_request, task_status, browser_session=browser_session))
+        try:
+            # A node cancelled through /execute/{task_id}/cancel fails the node, not the workflow
+            await asyncio.wait({handle})
+        except asyncio.CancelledError:
+            handle.cancel()
+            raise
+        return {"status": task_status.status, "result": task_status.result, "error": task_status.error}
+
+    async def create_browser_session(node: WorkflowNode) -> tuple:
+        return await agent_adapter.create_browser_session(headless=node.headless if node.headless is not None else True)
+
+    async def on_node_update(node_id: str, status: str):
+        workflow_status.node_status[node_id] = status
+        await broadcast_workflow_update(workflow_status)
+
+    try:
+        executor = WorkflowExecutor(
+            request.nodes,
+            run_node=run_node,
+            create_browser_session=create_browser_session,
+            close_browser_session=agent_adapter.close_browser_session,
+            on_node_update=on_node_update
+        )
+    except WorkflowGraphError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    workflow_status.node_status = dict(executor.node_status)
+    workflow_runs[workflow_id] = workflow_status
+    asyncio.create_task(run_workflow(workflow_status, executor))
+
+    return WorkflowCreationResponseModel(workflowId=workflow_id, taskIds=node_tasks)
+
+async def run_workflow(workflow_status: WorkflowStatus, executor: WorkflowExecutor):
+    """Run a workflow in the background and record its final status"""
+    workflow_id = workflow_status.workflow_id
+    logger.info(f"[run_workflow:{workflow_id}] Starting workflow with {len(executor.order)} nodes")
+    workflow_status.status = "running"
+    try:
+        node_status = await executor.run()
+        workflow_status.status = "completed" if all(s == "completed" for s in node_status.values()) else "failed"
+    except Exception as e:
+        logger.exception(f"[run_workflow:{workflow_id}] Unhandled exception during workflow: {str(e)}")
+        workflow_status.status = "failed"
+    finally:
+        workflow_status.node_status = dict(executor.node_status)
+        workflow_status.node_errors = dict(executor.node_errors)
+        workflow_status.end_time = datetime.now()
+        await broadcast_workflow_update(workflow_status)
+        logger.info(f"[run_workflow:{workflow_id}] Finished with status: {workflow_status.status}")
+
+# Get workflow status
+@app.get("/workflows/{workflow_id}/status", response_model=WorkflowStatus)
+async def get_workflow_status(workflow_id: str):
+    """Get the status of a workflow run and of each of its nodes"""
+    if workflow_id not in workflow_runs:
+        raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
+    return workflow_runs[workflow_id]
 
 # WebSocket for real-time updates
 @app.websocket("/ws/{client_id}")
@@ -578,13 +1003,16 @@ async def broadcast_task_update(task_id: str, task_status: TaskStatus):
     # Send update to all connected clients
     disconnected_clients = []
     for client_id, websocket in connected_clients.items():
+        sent_at = time.monotonic()
         try:
             await websocket.send_json(update)
+            WEBSOCKET_SEND_DURATION.observe(time.monotonic() - sent_at)
         except WebSocketDisconnect:
             disconnected_clients.append(client_id)
             logger.info(f"Client {client_id} disconnected during broadcast")
         except Exception as e:
             disconnected_clients.append(client_id)
+            WEBSOCKET_SEND_ERRORS.inc()
             logger.error(f"Error sending update to client {client_id}: {str(e)}")
     
     # Clean up disconnected clients
@@ -593,6 +1021,33 @@ async def broadcast_task_update(task_id: str, task_status: TaskStatus):
             del connected_clients[client_id]
             logger.info(f"Removed disconnected client {client_id}")
 
+# Broadcast workflow status update to all connected clients
+async def broadcast_workflow_update(workflow_status: WorkflowStatus):
+    """Broadcast workflow status update to all connected clients"""
+    if not connected_clients:
+        return
+
+    update = {
+        "type": "workflow_update",
+        "workflow_id": workflow_status.workflow_id,
+        "status": jsonable_encoder(workflow_status)
+    }
+
+    disconnected_clients = []
+    for client_id, websocket in connected_clients.items():
+        sent_at = time.monotonic()
+        try:
+            await websocket.send_json(update)
+            WEBSOCKET_SEND_DURATION.observe(time.monotonic() - sent_at)
+        except Exception as e:
+            disconnected_clients.append(client_id)
+            WEBSOCKET_SEND_ERRORS.inc()
+            logger.error(f"Error sending workflow update to client {client_id}: {str(e)}")
+
+    for client_id in disconnected_clients:
+        if client_id in connected_clients:
+            del connected_clients[client_id]
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint with detailed status information"""
@@ -600,7 +1055,7 @@ async def health_check():
     
     # Count tasks by status
     task_counts = {"total": len(active_tasks)}
-    for status in ["pending", "running", "completed", "failed", "needs_assistance", "paused"]:
+    for status in ["pending", "running", "completed", "failed", "budget_exhausted", "needs_assistance", "paused"]:
         task_counts[status] = sum(1 for t in active_tasks.values() if t.status == status)
     
     # Get session information
@@ -618,9 +1073,205 @@ async def health_check():
             "non_persistent": session_count - persistent_sessions
         },
         "connected_clients": len(connected_clients),
+        "running_task_handles": len(task_handles),
+        "task_cache": task_cache.stats(),
+        "idempotency": idempotency_store.stats(),
+        "llm_rate_limits": rate_limiter_stats(),
+        "llm_routing": LLMProviderFactory.routing_stats(),
+        "llm_cascade": LLMProviderFactory.cascade_stats(),
+        "llm_response_cache": response_cache_stats(),
+        "llm_local": await LLMProviderFactory.local_health(),
+        "usage_histograms": usage_histograms(),
+        "tracing": tracer.stats(),
+        "event_loop": loop_monitor.stats(),
+        "logging": logging_stats(),
+        "llm_coalescing": {
+            "generate": coalescing_stats(),
+            "agent_steps": agent_adapter.coalescing_stats(),
+        },
         "version": "1.0.0"  # Replace with your actual version
     }
 
+def collect_metrics():
+    """Gauges and counters read from the service's own state when /metrics is scraped"""
+    statuses = ["pending", "running", "completed", "failed", "budget_exhausted", "cancelled", "needs_assistance", "paused"]
+    yield "tasks", "gauge", "Tracked tasks by status", [
+        ({"status": status}, sum(1 for t in active_tasks.values() if t.status == status)) for status in statuses
+    ]
+    # Tasks are started as soon as they are submitted, so the queue is the pending tasks
+    yield "task_queue_depth", "gauge", "Tasks submitted but not yet running", [
+        ({}, sum(1 for t in active_tasks.values() if t.status == "pending"))
+    ]
+    yield "task_history_size", "gauge", "Finished tasks kept in history", [({}, len(task_history))]
+    yield "running_task_handles", "gauge", "Task runs in progress", [({}, len(task_handles))]
+    yield "browser_agents", "gauge", "Agents holding a browser", [({}, len(agent_adapter.active_agents))]
+    persistent_sessions = sum(1 for ctx in session_manager.sessions.values() if ctx.persistent)
+    yield "browser_sessions", "gauge", "Browser sessions by persistence", [
+        ({"persistent": "true"}, persistent_sessions),
+        ({"persistent": "false"}, len(session_manager.sessions) - persistent_sessions),
+    ]
+    yield "websocket_clients", "gauge", "Connected WebSocket clients", [({}, len(connected_clients))]
+    yield "uptime_seconds", "gauge", "Seconds since startup", [
+        ({}, (datetime.now() - startup_time).total_seconds() if startup_time else 0)
+    ]
+    yield "event_loop_lag_recent_seconds", "gauge", "Percentiles of recent event loop lag samples", [
+        ({"quantile": quantile}, value) for quantile, value in loop_monitor.lag_percentiles().items()
+    ]
+    
+    limiters = rate_limiter_stats()
+    for name, description, key, metric_type in [
+        ("llm_in_flight", "LLM calls holding a rate limiter slot", "in_flight", "gauge"),
+        ("llm_queued", "LLM calls waiting for a rate limiter slot", "queued", "gauge"),
+        ("llm_concurrency_limit", "Current adaptive concurrency limit", "concurrency_limit", "gauge"),
+        ("llm_requests_total", "LLM calls admitted by the rate limiter", "requests", "counter"),
+        ("llm_rate_limited_total", "LLM calls rejected by the provider with a rate limit", "rate_limited", "counter"),
+    ]:
+        yield name, metric_type, description, [({"limiter": limiter}, stats[key]) for limiter, stats in limiters.items()]
+    
+    routing = LLMProviderFactory.routing_stats()
+    if routing:
+        yield "llm_routing_hedges_total", "counter", "Hedge requests sent by the router", [({}, routing["hedges"])]
+        yield "llm_routing_failovers_total", "counter", "Calls failed over to another provider", [({}, routing["failovers"])]
+        yield "llm_routing_errors_total", "counter", "Routed calls that failed, by provider", [
+            ({"provider": provider}, stats["errors"]) for provider, stats in routing["providers"].items()
+        ]
+    cascade = LLMProviderFactory.cascade_stats()
+    if cascade:
+        yield "llm_cascade_calls_total", "counter", "Cascade calls by tier", [
+            ({"tier": tier}, calls) for tier, calls in cascade["calls"].items()
+        ]
+        yield "llm_cascade_escalations_total", "counter", "Escalations to the strong model by reason", [
+            ({"reason": reason}, count) for reason, count in cascade["escalations"].items()
+        ]
+    response_cache = response_cache_stats()
+    if response_cache:
+        yield "llm_response_cache_lookups_total", "counter", "LLM response cache lookups by result", [
+            ({"result": "hit"}, response_cache["hits"]),
+            ({"result": "miss"}, response_cache["misses"]),
+        ]
+    yield "llm_coalesced_total", "counter", "LLM requests that shared an identical in-flight call", [
+        ({"layer": "generate"}, coalescing_stats()["coalesced"]),
+        ({"layer": "agent_step"}, agent_adapter.coalescing_stats()["coalesced"]),
+    ]
+    
+    cache_stats = task_cache.stats()
+    yield "task_cache_entries", "gauge", "Entries in the task result cache", [({}, cache_stats["entries"])]
+    yield "task_cache_lookups_total", "counter", "Task result cache lookups by result", [
+        ({"result": result}, cache_stats[key]) for result, key in (("hit", "hits"), ("miss", "misses"), ("join", "joins"))
+    ]
+
+REGISTRY.add_collector(collect_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """Allow a request only with the admin token; debug endpoints are disabled when none is configured"""
+    if not AppConfig.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Debug endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, AppConfig.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# One profile at a time; overlapping profilers would sample each other
+profile_lock = asyncio.Lock()
+
+@app.post("/debug/profile", dependencies=[Depends(require_admin)])
+async def profile_service(seconds: float = 10, interval_ms: float = 10, format: str = "speedscope"):
+    """
+    Profile the running service with a sampling profiler.
+    
+    Samples the stacks of the event loop thread and the executor threads for the given
+    time; event loop samples are attributed to the asyncio task running at the time.
+    
+    Args:
+        seconds: How long to sample (up to PROFILE_MAX_SECONDS)
+        interval_ms: Milliseconds between samples (1 to 100)
+        format: "speedscope" (JSON for speedscope.app), "collapsed" (flame graph input) or "summary"
+    """
+    if not 0 < seconds <= AppConfig.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {AppConfig.PROFILE_MAX_SECONDS}")
+    if not 1 <= interval_ms <= 100:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 100")
+    if format not in ("speedscope", "collapsed", "summary"):
+        raise HTTPException(status_code=400, detail="format must be speedscope, collapsed or summary")
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    async with profile_lock:
+        logger.info(f"Profiling the service for {seconds}s every {interval_ms}ms")
+        profiler = SamplingProfiler(interval=interval_ms / 1000)
+        profile = await asyncio.to_thread(profiler.run, seconds, asyncio.get_running_loop(), threading.get_ident())
+    
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    if format == "summary":
+        return profile.summary()
+    return profile.speedscope()
+
+@app.get("/debug/memory", dependencies=[Depends(require_admin)])
+async def debug_memory(top: int = 20, trace: bool = False):
+    """
+    Attribute the service's memory.
+    
+    Reports process memory, the sizes of the task, agent, session and cache registries,
+    the tasks retaining the most memory and, while allocations are traced, the top
+    allocation sites and their growth since the previous call.
+    
+    Args:
+        top: Number of tasks and allocation sites to list
+        trace: Start tracing allocations if they are not traced yet (slows the service down)
+    """
+    if trace:
+        memory_profiler.start_tracing()
+    
+    # Take references to what each task retains on the loop, where the registries are not
+    # changing under us, and walk them in a worker thread so that the loop keeps serving
+    tasks = []
+    parts = []
+    for registry, registry_tasks in (("active_tasks", active_tasks), ("task_history", task_history)):
+        for task_id, task_status in list(registry_tasks.items()):
+            metadata = dict(task_status.metadata or {})
+            paused_state = metadata.pop("paused_state", None)
+            agent = agent_adapter.active_agents.get(task_id)
+            tasks.append({"task_id": task_id, "registry": registry, "status": task_status.status})
+            parts.append({
+                "result": task_status.result,
+                "metadata": metadata,
+                "paused_state": paused_state,
+                "agent_history": agent.state.history if agent else None,
+            })
+    sizes, truncated = await asyncio.to_thread(retained_sizes, parts, AppConfig.MEMORY_ESTIMATE_MAX_OBJECTS)
+    for task, task_sizes in zip(tasks, sizes):
+        task["bytes"] = task_sizes
+    
+    registries = {
+        "active_tasks": len(active_tasks),
+        "task_history": len(task_history),
+        "task_requests": len(task_requests),
+        "workflow_runs": len(workflow_runs),
+        "active_agents": len(agent_adapter.active_agents),
+        "running_task_handles": len(task_handles),
+        "browser_sessions": len(session_manager.sessions),
+        "connected_clients": len(connected_clients),
+        "task_cache": task_cache.stats()["entries"],
+        "idempotency_keys": idempotency_store.stats()["entries"],
+        "traces": tracer.stats()["traces"],
+    }
+    return {
+        "process": process_memory(),
+        "registries": registries,
+        "task_bytes": {
+            registry: sum(task["bytes"]["total"] for task in tasks if task["registry"] == registry)
+            for registry in ("active_tasks", "task_history")
+        },
+        # The object budget ran out: task sizes are lower bounds and later tasks may show 0
+        "task_bytes_truncated": truncated,
+        "largest_tasks": sorted(tasks, key=lambda task: task["bytes"]["total"], reverse=True)[:top],
+        "allocations": await memory_profiler.allocation_report(top),
+    }
+
 @app.get("/providers")
 async def get_providers():
     """Return a list of available LLM providers"""
@@ -633,13 +1284,15 @@ async def get_providers():
 # Get task status
 @app.get("/execute/{task_id}/status", response_model=TaskStatus)
 async def get_task_status(task_id: str, request: Request):
-    logger.info(f"GET_STATUS: Received request for task_id: {task_id}") 
-    logger.debug(f"GET_STATUS: Current active tasks: {list(active_tasks.keys())}") 
-    logger.debug(f"GET_STATUS: Current task history: {list(task_history.keys())}") 
+    # Polled by clients: only O(1) debug logging on this path
+    logger.debug(f"GET_STATUS: Received request for task_id: {task_id}") 
 
     # First check our local task tracking
     if task_id in active_tasks:
-        logger.info(f"GET_STATUS: Task {task_id} found in active_tasks.") 
+        # A task sharing another task's run has no agent; its status is kept up to date by run_task
+        if active_tasks[task_id].cached:
+            return active_tasks[task_id]
+
         # For active tasks, check if we have an agent in the adapter
         agent_status = agent_adapter.get_task_status(task_id)
         
@@ -654,14 +1307,25 @@ async def get_task_status(task_id: str, request: Request):
         return active_tasks[task_id]
 
     elif task_id in task_history:
-        logger.info(f"GET_STATUS: Task {task_id} found in task_history.") 
         return task_history[task_id]
     else:
-        logger.warning(f"GET_STATUS_404: Task {task_id} not found. Final check. Active tasks: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
-        logger.error(f"GET_STATUS: Task {task_id} not found anywhere. Returning 404.") 
-        logger.error(f"GET_STATUS_RAISING_404: Task {task_id}. Raising HTTPException. Active: {list(active_tasks.keys())}, History: {list(task_history.keys())}")
+        logger.warning(f"GET_STATUS: Task {task_id} not found ({len(active_tasks)} active, {len(task_history)} in history). Returning 404.")
         raise HTTPException(status_code=404, detail=f"Task with ID {task_id} not found")
 
+# Get a task's trace
+@app.get("/execute/{task_id}/trace")
+async def get_task_trace(task_id: str):
+    """
+    Get the span waterfall of a task's latest run.
+    
+    Spans are listed in start order with their offset from the start of the run, duration
+    and nesting depth; spans still running are missing until they end.
+    """
+    trace = tracer.task_trace(task_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No trace recorded for task {task_id}")
+    return trace
+
 # Get all tasks
 @app.get("/tasks", response_model=Dict[str, List[TaskStatus]])
 async def get_all_tasks():
@@ -758,16 +1422,15 @@ async def root():
 async def list_screenshots():
     """List available screenshots"""
     try:
-        screenshots = [f for f in os.listdir(SCREENSHOTS_DIR) if f.endswith('.png')]
-        screenshots.sort(key=lambda x: os.path.getctime(os.path.join(SCREENSHOTS_DIR, x)), reverse=True)
+        screenshots = await asyncio.to_thread(list_files_by_ctime, SCREENSHOTS_DIR, '.png')
         return {
             "screenshots": [
                 {
                     "filename": s,
                     "url": f"/screenshots/{s}",
-                    "timestamp": os.path.getctime(os.path.join(SCREENSHOTS_DIR, s))
+                    "timestamp": created_at
                 }
-                for s in screenshots
+                for s, created_at in screenshots
             ]
         }
     except Exception as e:
@@ -778,16 +1441,15 @@ async def list_screenshots():
 async def list_recordings():
     """List available recordings"""
     try:
-        recordings = [f for f in os.listdir(RECORDINGS_DIR) if f.endswith('.gif')]
-        recordings.sort(key=lambda x: os.path.getctime(os.path.join(RECORDINGS_DIR, x)), reverse=True)
+        recordings = await asyncio.to_thread(list_files_by_ctime, RECORDINGS_DIR, '.gif')
         return {
             "recordings": [
                 {
                     "filename": r,
                     "url": f"/recordings/{r}",
-                    "timestamp": os.path.getctime(os.path.join(RECORDINGS_DIR, r))
+                    "timestamp": created_at
                 }
-                for r in recordings
+                for r, created_at in recordings
             ]
         }
     except Exception as e:
@@ -969,14 +1631,35 @@ async def resolve_assistance(task_id: str):
     
     return task_status
 
+async def stop_task_run(task_id: str, agent: Optional[Any]):
+    """
+    Stop a task's run: ask the agent loop to stop at its next step, cancel the coroutine
+    running it (which also cancels in-flight LLM requests and the heartbeat) and make
+    sure the browser is released within TASK_CANCEL_TIMEOUT_SECONDS.
+    """
+    if agent and hasattr(agent, 'stop'):
+        agent.stop()
+    finished = await task_handles.cancel(task_id, timeout=AppConfig.TASK_CANCEL_TIMEOUT_SECONDS)
+    if not finished and agent and hasattr(agent, 'browser') and agent.browser:
+        # The run is stuck unwinding; release the browser regardless
+        await agent.browser.close()
+
 @app.post("/execute/{task_id}/pause", response_model=TaskStatus)
-async def pause_task(task_id: str):
+async def pause_task(
+    task_id: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Pause a running task.
     
     This endpoint pauses a running task by saving its state and canceling the current execution.
     The task can be resumed later from its saved state.
     """
+    return await run_idempotent(idempotency_key, f"pause:{task_id}", "", lambda: _pause_task(task_id), response)
+
+async def _pause_task(task_id: str) -> TaskStatus:
+    """Save the state of a running task and stop its execution"""
     # Check if task exists
     if task_id not in active_tasks:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
@@ -1113,18 +1796,17 @@ async def pause_task(task_id: str):
             "dom_state": dom_state
         }
         
-        # Cancel the browser execution but keep the task in active_tasks
-        if hasattr(agent, 'browser') and agent.browser:
-            await agent.browser.close()
+        # Update task status first so that the stopped run is not reported as cancelled
+        task_status.status = "paused"
+        
+        # Stop the run and its browser but keep the task in active_tasks
+        await stop_task_run(task_id, agent)
             
         # Remove the agent from active_agents to prevent automatic completion
         # but keep the task in active_tasks
         if task_id in agent_adapter.active_agents:
             del agent_adapter.active_agents[task_id]
         
-        # Update task status
-        task_status.status = "paused"
-        
         # Broadcast update
         await broadcast_task_update(task_id, task_status)
         
@@ -1134,12 +1816,20 @@ async def pause_task(task_id: str):
         raise HTTPException(status_code=500, detail=f"Error pausing task: {str(e)}")
 
 @app.post("/execute/{task_id}/cancel", response_model=TaskStatus)
-async def cancel_task(task_id: str):
+async def cancel_task(
+    task_id: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Cancel a running task.
     
     This endpoint cancels a running task and cleans up associated resources.
     """
+    return await run_idempotent(idempotency_key, f"cancel:{task_id}", "", lambda: _cancel_task(task_id), response)
+
+async def _cancel_task(task_id: str) -> TaskStatus:
+    """Stop a running or paused task and release its resources"""
     # Check if task exists
     if task_id not in active_tasks:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
@@ -1152,19 +1842,16 @@ async def cancel_task(task_id: str):
         raise HTTPException(status_code=400, detail=f"Task {task_id} is not running or paused (current status: {task_status.status})")
     
     try:
-        # Get the agent
+        # Get the agent (paused tasks no longer have one)
         agent = agent_adapter.get_agent_for_task(task_id)
-        if not agent:
-            raise HTTPException(status_code=404, detail=f"No agent found for task {task_id}")
-        
-        # Close the browser if it's open
-        if hasattr(agent, 'browser') and agent.browser:
-            await agent.browser.close()
         
         # Update task status
         task_status.status = "cancelled"
         task_status.end_time = datetime.now()
         
+        # Stop the run and release its browser
+        await stop_task_run(task_id, agent)
+        
         # Move to history
         task_history[task_id] = task_status
         if task_id in active_tasks:
@@ -1182,71 +1869,20 @@ async def cancel_task(task_id: str):
         raise HTTPException(status_code=500, detail=f"Error cancelling task: {str(e)}")
 
 @app.post("/execute/{task_id}/resume", response_model=TaskStatus)
-async def resume_task(task_id: str):
+async def resume_task(
+    task_id: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Resume a paused task.
     
     This endpoint resumes a paused task by restarting it from its saved state.
     """
-    # Check if task exists
-    if task_id not in active_tasks:
-        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
-    
-    # Get task status
-    task_status = active_tasks[task_id]
-    
-    # Check if task is paused
-    if task_status.status != "paused":
-        raise HTTPException(status_code=400, detail=f"Task {task_id} is not paused (current status: {task_status.status})")
-    
-    try:
-        # Check if we have saved state
-        if not task_status.metadata or "paused_state" not in task_status.metadata:
-            raise HTTPException(status_code=400, detail=f"No saved state found for task {task_id}")
-        
-        # Get the original task request
-        original_request = task_requests.get(task_id)
-        if not original_request:
-            raise HTTPException(status_code=400, detail=f"Original request not found for task {task_id}")
-        
-        # Update task status
-        task_status.status = "running"
-        
-        # Broadcast update
-        await broadcast_task_update(task_id, task_status)
-        
-        # Start a new task execution with the saved state
-        paused_state = task_status.metadata["paused_state"]
-        
-        # Create a modified task that includes resuming from the saved URL
-        modified_request = copy.deepcopy(original_request)
-        
-        # If we don't have options, create it
-        if not modified_request.options:
-            modified_request.options = {}
-        
-        # Add resume information to options
-        modified_request.options["resume_from"] = paused_state
-        
-        # Start the task in a background task
-        asyncio.create_task(run_task(task_id, modified_request, task_status))
-        
-        return task_status
-    except Exception as e:
-        logger.exception(f"Error resuming task {task_id}: {str(e)}")
-        # Update task status to error
-        task_status.status = "error"
-        task_status.error = f"Error resuming task: {str(e)}"
-        await broadcast_task_update(task_id, task_status)
-        raise HTTPException(status_code=500, detail=f"Error resuming task: {str(e)}")
+    return await run_idempotent(idempotency_key, f"resume:{task_id}", "", lambda: _resume_task(task_id), response)
 
-@app.post("/execute/{task_id}/resume", response_model=TaskStatus)
-async def resume_task(task_id: str):
-    """
-    Resume a paused task.
-    
-    This endpoint resumes a paused task by restarting it from its saved state.
-    """
+async def _resume_task(task_id: str) -> TaskStatus:
+    """Restart a paused task from its saved state"""
     # Check if task exists
     if task_id not in active_tasks:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
@@ -1288,7 +1924,7 @@ async def resume_task(task_id: str):
         modified_request.options["resume_from"] = paused_state
         
         # Start the task in a background task
-        asyncio.create_task(run_task(task_id, modified_request, task_status))
+        task_handles.start(task_id, run_task(task_id, modified_request, task_status))
         
         return task_status
     except Exception as e:
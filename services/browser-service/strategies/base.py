@@ -1,24 +1,290 @@
+import hashlib
+import json
+import logging
+import re
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
+
+from .cache import SingleFlight
+from .llm.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Model fields and per-call options that change what a request returns
+SAMPLING_PARAMETERS = ("temperature", "max_tokens", "top_p", "top_k", "presence_penalty", "frequency_penalty")
+
+# Identical generations in flight at the same time share one API call
+_generation_flights = SingleFlight()
+_coalesced_generations = 0
+
+_ACTION_TYPES = """Supported action types:
+- navigate: Go to a URL (params: url)
+- click: Click on an element (params: selector)
+- type: Type text into an input field (params: selector, text)
+- screenshot: Take a screenshot (params: name)
+- wait: Wait for an element or time (params: selector or timeout in ms)
+- scroll: Scroll the page (params: x, y or selector)
+- press_key: Press a keyboard key (params: key, selector optional)
+- select_option: Select an option from a dropdown (params: selector, value)
+- hover: Hover over an element (params: selector)
+- get_text: Get text from an element (params: selector)
+"""
+
+_ACTION_GUIDELINES = """Be precise with your selectors. Use CSS selectors that are specific enough to identify the element uniquely.
+Think step by step and include all necessary actions to complete the task successfully.
+"""
+
+# System prompt shared by every provider for browser automation prompts
+BROWSER_AUTOMATION_SYSTEM_PROMPT = """You are a browser automation expert. Your task is to generate a precise sequence of browser actions to accomplish the user's task.
+
+Return your response in valid JSON format with an array of actions. Each action should have a 'type' and 'params' object.
+
+""" + _ACTION_TYPES + """
+Example response format:
+```json
+[
+  {
+    "type": "navigate",
+    "params": {
+      "url": "https://example.com"
+    }
+  },
+  {
+    "type": "click",
+    "params": {
+      "selector": "button.submit"
+    }
+  }
+]
+```
+
+""" + _ACTION_GUIDELINES
+
+# System prompt for structured output; the tool's JSON schema replaces the format instructions
+BROWSER_AUTOMATION_STRUCTURED_SYSTEM_PROMPT = """You are a browser automation expert. Your task is to generate a precise sequence of browser actions to accomplish the user's task.
+
+Return the actions by calling the provided tool. Each action has a 'type' and a 'params' object.
+
+""" + _ACTION_TYPES + "\n" + _ACTION_GUIDELINES
+
+
+def is_browser_automation_prompt(prompt: str) -> bool:
+    """Whether a prompt asks for browser actions (and gets the automation system prompt)"""
+    return "browser actions" in prompt.lower() or "browser task" in prompt.lower()
+
+
+# Fields of the LangChain chat models holding the API key and endpoint a request is sent with
+_CREDENTIAL_FIELDS = ("openai_api_key", "anthropic_api_key", "google_api_key", "api_key")
+_ENDPOINT_FIELDS = ("openai_api_base", "anthropic_api_url", "base_url")
+
+
+def _credentials_hash(llm: Any) -> Optional[str]:
+    """Short hash of the API key and endpoint an LLM client sends its requests with."""
+    key = next((getattr(llm, name) for name in _CREDENTIAL_FIELDS if getattr(llm, name, None)), None)
+    if hasattr(key, "get_secret_value"):
+        key = key.get_secret_value()
+    endpoint = next((getattr(llm, name) for name in _ENDPOINT_FIELDS if getattr(llm, name, None)), None)
+    if key is None and endpoint is None:
+        return None
+    return hashlib.sha256(f"{key}\n{endpoint}".encode("utf-8")).hexdigest()[:16]
+
+
+def request_fingerprint(llm: Any, messages: List[Any], extra: Any = None) -> str:
+    """
+    Hash identifying an LLM request by its credentials, model, sampling parameters and messages.
+
+    Requests sent with different API keys are never the same request: sharing one call
+    between them would bill one account and apply its rate limits for the others.
+
+    Args:
+        llm: The LangChain chat model the request is sent to
+        messages: The request's messages
+        extra: Anything else that shapes the response, e.g. an output schema
+
+    Returns:
+        str: Hex SHA-256 of the canonical JSON encoding of the request
+    """
+    fields = {
+        "llm": type(llm).__name__,
+        "credentials": _credentials_hash(llm),
+        "model": getattr(llm, "model_name", None) or getattr(llm, "model", None),
+        "params": {name: getattr(llm, name, None) for name in SAMPLING_PARAMETERS},
+        "messages": [
+            message.model_dump(exclude={"id"}) if hasattr(message, "model_dump") else message
+            for message in messages
+        ],
+        "extra": extra,
+    }
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def coalescing_stats() -> Dict[str, Any]:
+    """Statistics of the coalescing of identical concurrent generations."""
+    return {"in_flight": len(_generation_flights), "coalesced": _coalesced_generations}
+
+
+def strip_json_fence(text: str) -> str:
+    """Return the contents of a ```json code block in the text, or the text unchanged"""
+    if "```json" in text:
+        json_match = re.search(r'```json\s*([\s\S]*?)\s*```', text)
+        if json_match:
+            return json_match.group(1).strip()
+    return text
+
+
+def chunk_text(chunk: Any) -> str:
+    """Text of a streamed message chunk; multimodal/content-block chunks keep their text parts"""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, list):
+        return "".join(
+            part.get("text", "") if isinstance(part, dict) else str(part) for part in content
+        )
+    return content or ""
+
 
 class LLMProviderStrategy(ABC):
     """Abstract strategy for LLM providers"""
-    
+
+    # Process-wide limiter for this provider/model, assigned by LLMProviderFactory
+    rate_limiter: Any = None
+
+    # browser-use tool-calling method for agents on this provider; None lets browser-use choose
+    tool_calling_method: Optional[str] = None
+
     @abstractmethod
     async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
         """Generate a response from the LLM"""
         pass
-    
+
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM as text chunks.
+
+        Strategies that can stream override this; the default yields the whole
+        generate_response() result as a single chunk.
+        """
+        yield await self.generate_response(prompt, options)
+
     @abstractmethod
     def get_provider_name(self) -> str:
         """Get the name of the provider"""
         pass
-        
+
     @abstractmethod
     def get_llm(self) -> Any:
         """
         Get the underlying LLM object.
-        
+
         This method returns the actual LLM object that can be used by the browser-use library.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def close(self) -> None:
+        """
+        Release the clients this strategy owns, e.g. when it is evicted from the client cache.
+
+        Clients on the shared HTTP pools are left open for the other strategies; the
+        default does nothing.
+        """
+        pass
+
+    def mark_prompt_cache(self, messages: List[Any]) -> List[Any]:
+        """
+        Mark the stable prefix of a conversation for provider-side prompt caching.
+
+        Messages must already be ordered with the static system prompt first and the
+        part that changes between calls last. The default returns them unchanged, which
+        suits providers that cache long prefixes automatically (OpenAI, Gemini).
+        Strategies whose provider needs explicit cache breakpoints override this; the
+        input messages must not be modified.
+        """
+        return messages
+
+    def supports_structured_output(self) -> bool:
+        """Whether astream_structured() can be used, i.e. the model supports tool calling"""
+        return hasattr(self.get_llm(), "bind_tools")
+
+    async def astream_structured(
+        self, prompt: str, schema: Any, options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response in the provider's native tool-calling mode.
+
+        The model is made to call a tool whose parameters are the JSON schema of the given
+        pydantic model, so the response is the JSON arguments of that call instead of free
+        text with JSON somewhere in it.
+
+        Args:
+            prompt: The prompt
+            schema: Pydantic model describing the expected response
+            options: Per-call options
+
+        Yields:
+            str: Fragments of the tool call's JSON arguments
+        """
+        llm = self._bind(options).bind_tools([schema], tool_choice=schema.__name__)
+        async for chunk in self._astream_chunks(llm, self._build_messages(prompt, structured=True)):
+            for tool_call_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+                if tool_call_chunk.get("args"):
+                    yield tool_call_chunk["args"]
+
+    def _bind(self, options: Optional[Dict[str, Any]]) -> Any:
+        """The LLM with per-call options applied; strategies that take options override this"""
+        return self.get_llm()
+
+    def _build_messages(self, prompt: str, structured: bool = False) -> List[Any]:
+        """Messages for a prompt, with the automation system prompt for browser action prompts"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        messages = []
+        if is_browser_automation_prompt(prompt):
+            messages.append(SystemMessage(
+                content=BROWSER_AUTOMATION_STRUCTURED_SYSTEM_PROMPT if structured else BROWSER_AUTOMATION_SYSTEM_PROMPT
+            ))
+        messages.append(HumanMessage(content=prompt))
+        return self.mark_prompt_cache(messages)
+
+    async def _agenerate(self, llm: Any, messages: List[Any]) -> Any:
+        """
+        Run a generation, waiting for the provider's rate limiter if there is one.
+
+        Identical requests that are in flight at the same time share one call (and one
+        rate limiter slot); a caller that goes away does not cancel it for the others.
+        """
+        global _coalesced_generations
+        key = request_fingerprint(llm, messages)
+        result, shared = await _generation_flights.do(key, lambda: self._agenerate_once(llm, messages))
+        if shared:
+            _coalesced_generations += 1
+            logger.debug(f"Coalesced identical LLM request {key[:12]}")
+        return result
+
+    async def _agenerate_once(self, llm: Any, messages: List[Any]) -> Any:
+        if self.rate_limiter is None:
+            return await llm.agenerate([messages])
+        async with self.rate_limiter.acquire(estimate_tokens(messages)):
+            return await llm.agenerate([messages])
+
+    async def _astream_chunks(self, llm: Any, messages: List[Any]) -> AsyncIterator[Any]:
+        """Stream a generation's message chunks, holding a rate limiter slot until it ends"""
+        if self.rate_limiter is None:
+            async for chunk in llm.astream(messages):
+                yield chunk
+            return
+        async with self.rate_limiter.acquire(estimate_tokens(messages)):
+            async for chunk in llm.astream(messages):
+                yield chunk
+
+    async def _astream(self, llm: Any, messages: List[Any]) -> AsyncIterator[str]:
+        """Stream a generation as text chunks"""
+        async for chunk in self._astream_chunks(llm, messages):
+            yield chunk_text(chunk)
+
+    async def warm_up(self) -> None:
+        """
+        Open connections to the provider ahead of the first request.
+
+        Strategies whose clients connect lazily can override this; the default does nothing.
+        """
+        pass
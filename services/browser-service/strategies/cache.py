@@ -0,0 +1,137 @@
+"""
+Generic in-process caching primitives.
+
+TTLCache is a size-bounded LRU map whose entries expire after a time-to-live.
+SingleFlight collapses concurrent calls for the same key into one execution whose
+result is shared by every caller.
+
+They live here because the LLM strategies use them and the strategies package does not
+import core; core.cache re-exports them for the core modules.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Size-bounded LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value, or the default if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries beyond max_entries."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a value and return it."""
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry else default
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry and return how many were removed."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._entries.clear()
+
+
+class _Flight:
+    """An in-flight call and the number of callers waiting on it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async calls by key.
+
+    The first caller for a key starts the call in its own task; later callers join it
+    and receive the same result or exception. A caller that is cancelled stops waiting
+    without affecting the others, and the shared call is cancelled only once every
+    caller has gone away. The last caller then waits for the call to unwind, so that
+    cancelling the callers really stops it.
+    """
+
+    def __init__(self, cancel_timeout: float = 10.0):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            cancel_timeout: Seconds the last caller waits for a cancelled call to unwind
+        """
+        self.cancel_timeout = cancel_timeout
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a call for the key is currently running."""
+        return key in self._flights
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn for the key, or join the call already running for it.
+
+        Args:
+            key: The deduplication key
+            fn: Zero-argument coroutine function performing the call
+
+        Returns:
+            Tuple[Any, bool]: (result, shared) where shared is True if this caller
+            joined a call started by someone else
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.create_task(fn()))
+            self._flights[key] = flight
+
+            def _forget(_task, key=key, flight=flight):
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+            flight.task.add_done_callback(_forget)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                await asyncio.wait({flight.task}, timeout=self.cancel_timeout)
@@ -1,113 +1,120 @@
 import logging
-from typing import Dict, Any, Optional, List
+from functools import cached_property
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, AsyncIterator
 
-from ..base import LLMProviderStrategy
+from ..base import LLMProviderStrategy, is_browser_automation_prompt, strip_json_fence
+from .client_pool import bind_options
+from .client_pool import get_shared_http_clients
 
 logger = logging.getLogger(__name__)
 
+# Anthropic caches the prompt up to and including a block marked with cache_control
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _with_cache_breakpoint(message: Any) -> Optional[Any]:
+    """Copy of a message with its last text block marked as a cache breakpoint, or None if it has no text"""
+    content = message.content
+    blocks = [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+    for index in range(len(blocks) - 1, -1, -1):
+        block = blocks[index]
+        if isinstance(block, dict) and block.get("type") == "text" and block.get("text"):
+            blocks[index] = {**block, "cache_control": _CACHE_CONTROL}
+            return message.model_copy(update={"content": blocks})
+    return None
+
+
+@lru_cache(maxsize=None)
+def _pooled_chat_anthropic() -> type:
+    """
+    ChatAnthropic whose Anthropic clients use the process-wide keep-alive pool.
+
+    ChatAnthropic takes no HTTP client argument and builds its clients, each with a
+    connection pool of its own, in the _client and _async_client cached properties from
+    _client_params. Those are overridden here; langchain-anthropic is pinned in
+    requirements.txt to the version they were written against (tests/test_client_pool.py
+    checks them).
+    """
+    import anthropic
+    from langchain_anthropic import ChatAnthropic
+
+    class PooledChatAnthropic(ChatAnthropic):
+        @cached_property
+        def _client(self) -> anthropic.Client:
+            http_client, _ = get_shared_http_clients()
+            return anthropic.Client(**self._client_params, http_client=http_client)
+
+        @cached_property
+        def _async_client(self) -> anthropic.AsyncClient:
+            _, http_async_client = get_shared_http_clients()
+            return anthropic.AsyncClient(**self._client_params, http_client=http_async_client)
+
+    return PooledChatAnthropic
+
+
 class AnthropicLLMStrategy(LLMProviderStrategy):
     """Anthropic LLM implementation"""
     
     def __init__(self, api_key: str, model: str = "claude-3-opus-20240229", temperature: float = 0.7):
-        from langchain_anthropic import ChatAnthropic
-        self.llm = ChatAnthropic(
+        self.llm = _pooled_chat_anthropic()(
             model=model,
             api_key=api_key,
             temperature=temperature
         )
         logger.info(f"Initialized Anthropic LLM with model {model}")
     
+    def _bind(self, options: Optional[Dict[str, Any]]) -> Any:
+        """Apply any additional options to a copy; the client is shared between tasks"""
+        return bind_options(self.llm, options, ("max_tokens", "top_k", "top_p", "temperature"))
+    
     async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
         """Generate a response using Anthropic"""
         try:
-            # Apply any additional options if provided
-            if options:
-                # Handle specific options for Anthropic
-                if "max_tokens" in options:
-                    self.llm.max_tokens = options["max_tokens"]
-                if "top_k" in options:
-                    self.llm.top_k = options["top_k"]
-                if "top_p" in options:
-                    self.llm.top_p = options["top_p"]
-                if "temperature" in options:
-                    self.llm.temperature = options["temperature"]
+            messages = self._build_messages(prompt)
+            logger.debug(f"Generating response with {len(messages)} messages")
+            response = await self._agenerate(self._bind(options), messages)
             
-            # Import necessary message types
-            from langchain_core.messages import HumanMessage, SystemMessage
+            # Extract the text from the response
+            result = response.generations[0][0].text
             
-            # Determine if this is a browser automation prompt
-            is_browser_automation = "browser actions" in prompt.lower() or "browser task" in prompt.lower()
+            # Clean up JSON response if needed
+            if is_browser_automation_prompt(prompt):
+                result = strip_json_fence(result)
             
-            # Create appropriate messages based on prompt type
-            messages = []
-            
-            if is_browser_automation:
-                # Add a system message for browser automation tasks
-                system_prompt = """You are a browser automation expert. Your task is to generate a precise sequence of browser actions to accomplish the user's task.
-                
-                Return your response in valid JSON format with an array of actions. Each action should have a 'type' and 'params' object.
-                
-                Supported action types:
-                - navigate: Go to a URL (params: url)
-                - click: Click on an element (params: selector)
-                - type: Type text into an input field (params: selector, text)
-                - screenshot: Take a screenshot (params: name)
-                - wait: Wait for an element or time (params: selector or timeout in ms)
-                - scroll: Scroll the page (params: x, y or selector)
-                - press_key: Press a keyboard key (params: key, selector optional)
-                - select_option: Select an option from a dropdown (params: selector, value)
-                - hover: Hover over an element (params: selector)
-                - get_text: Get text from an element (params: selector)
-                
-                Example response format:
-                ```json
-                [
-                  {
-                    "type": "navigate",
-                    "params": {
-                      "url": "https://example.com"
-                    }
-                  },
-                  {
-                    "type": "click",
-                    "params": {
-                      "selector": "button.submit"
-                    }
-                  }
-                ]
-                ```
-                
-                Be precise with your selectors. Use CSS selectors that are specific enough to identify the element uniquely.
-                Think step by step and include all necessary actions to complete the task successfully.
-                """
-                messages.append(SystemMessage(content=system_prompt))
-                messages.append(HumanMessage(content=prompt))
-                
-                # Generate response
-                logger.debug(f"Generating browser automation response with system prompt")
-                response = await self.llm.agenerate([messages])
-                
-                # Extract the text from the response
-                result = response.generations[0][0].text
-                
-                # Clean up JSON response if needed
-                if "```json" in result:
-                    # Extract JSON from code blocks
-                    import re
-                    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', result)
-                    if json_match:
-                        result = json_match.group(1).strip()
-                        logger.debug("Extracted JSON from code block")
-                
-                return result
-            else:
-                # For non-browser tasks, just use the prompt directly
-                return (await self.llm.agenerate([[HumanMessage(content=prompt)]])).generations[0][0].text
+            return result
                 
         except Exception as e:
             logger.error(f"Error generating response with Anthropic: {str(e)}")
             raise
     
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream a response using Anthropic"""
+        try:
+            async for chunk in self._astream(self._bind(options), self._build_messages(prompt)):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error streaming response with Anthropic: {str(e)}")
+            raise
+    
+    def mark_prompt_cache(self, messages: List[Any]) -> List[Any]:
+        """
+        Mark the system prompt and the conversation before the newest message as cacheable.
+        
+        Agents resend their whole history with a new message at the end on every step, so
+        the second breakpoint lets each call reuse the prefix cached by the previous one.
+        """
+        marked = list(messages)
+        if marked and marked[0].type == "system":
+            marked[0] = _with_cache_breakpoint(marked[0]) or marked[0]
+        # Tool call messages can have no text; use the latest earlier message that has some
+        for index in range(len(marked) - 2, 0, -1):
+            message = _with_cache_breakpoint(marked[index])
+            if message is not None:
+                marked[index] = message
+                break
+        return marked
+    
     def get_provider_name(self) -> str:
         """Get the name of the provider"""
         return "anthropic"
@@ -0,0 +1,207 @@
+"""
+Model cascade: a fast, cheap model first, escalating to a strong model when needed.
+
+Most agent steps are routine (click the obvious button, fill a field) and do not need the
+strongest model. CascadeLLMStrategy sends a call to the fast tier and escalates it to the
+strong tier when the fast model fails, returns nothing usable or reports that its last
+step failed, when the previous step ended in an error, or when the page is too complex
+for the fast model. After a failure-driven escalation the strong tier keeps the next few
+steps before control returns to the fast tier. The strong model can also be used as
+browser-use's planner, which plans every few steps for the fast executor.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..base import LLMProviderStrategy
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+
+
+class CascadeLLMStrategy(LLMProviderStrategy):
+    """LLM strategy that tries a fast model first and escalates to a strong one."""
+
+    def __init__(
+        self,
+        fast: LLMProviderStrategy,
+        strong: LLMProviderStrategy,
+        complex_page_elements: int = 150,
+        escalation_steps: int = 2,
+        planner_interval: int = 0,
+    ):
+        """
+        Initialize the cascade.
+
+        Args:
+            fast: Strategy of the fast, cheap model
+            strong: Strategy of the strong model
+            complex_page_elements: Pages with more interactive elements than this go to the strong model
+            escalation_steps: Steps the strong model keeps after a failure-driven escalation
+            planner_interval: Run the strong model as the agent's planner every N steps (0 disables it)
+        """
+        self.tiers = {FAST_TIER: fast, STRONG_TIER: strong}
+        self.complex_page_elements = complex_page_elements
+        self.escalation_steps = escalation_steps
+        self.planner_interval = planner_interval
+        self.calls = {FAST_TIER: 0, STRONG_TIER: 0}
+        self.escalations: Dict[str, int] = {}
+        logger.info(
+            f"Initialized LLM cascade: {fast.get_provider_name()} (fast) -> {strong.get_provider_name()} (strong)"
+        )
+
+    def choose_tier(self, previous_step_failed: bool, page_elements: int) -> Optional[str]:
+        """
+        Decide whether an agent step goes straight to the strong tier.
+
+        Args:
+            previous_step_failed: Whether the agent's previous step ended in an error
+            page_elements: Number of interactive elements on the current page
+
+        Returns:
+            Optional[str]: The reason to escalate, or None to start on the fast tier
+        """
+        if previous_step_failed:
+            return "previous_step_failed"
+        if page_elements > self.complex_page_elements:
+            return "complex_page"
+        return None
+
+    def low_confidence_reason(self, agent_output: Any) -> Optional[str]:
+        """
+        Check a fast-tier agent output for signs that the strong model should decide instead.
+
+        Returns:
+            Optional[str]: The reason to escalate, or None to accept the output
+        """
+        if not getattr(agent_output, "action", None):
+            return "no_action"
+        evaluation = getattr(getattr(agent_output, "current_state", None), "evaluation_previous_goal", "") or ""
+        if evaluation.strip().lower().startswith("failed"):
+            # The fast model itself reports that its last step did not work
+            return "self_reported_failure"
+        return None
+
+    def record_escalation(self, reason: str) -> None:
+        """Count an escalation to the strong tier by its reason."""
+        self.escalations[reason] = self.escalations.get(reason, 0) + 1
+        logger.info(f"Escalating LLM call to the strong model ({reason})")
+
+    def escalation_window(self) -> "EscalationWindow":
+        """Escalation state for one agent; the cascade itself is shared by every task."""
+        return EscalationWindow(self)
+
+    async def call_tier(self, tier: str, call: Callable[[LLMProviderStrategy], Awaitable[T]]) -> T:
+        """Make a call with one tier's strategy, waiting for its rate limiter if there is one."""
+        strategy = self.tiers[tier]
+        self.calls[tier] += 1
+        if strategy.rate_limiter is None:
+            return await call(strategy)
+        async with strategy.rate_limiter.acquire():
+            return await call(strategy)
+
+    async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a response with the fast model, escalating on errors and empty responses"""
+        self.calls[FAST_TIER] += 1
+        try:
+            result = await self.tiers[FAST_TIER].generate_response(prompt, options)
+            if result and result.strip():
+                return result
+            self.record_escalation("empty_response")
+        except Exception as e:
+            self.record_escalation(type(e).__name__)
+        self.calls[STRONG_TIER] += 1
+        return await self.tiers[STRONG_TIER].generate_response(prompt, options)
+
+    async def _stream(self, open_stream: Callable[[LLMProviderStrategy], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Stream from the fast model; escalate if it fails before producing any text."""
+        self.calls[FAST_TIER] += 1
+        streamed = False
+        try:
+            async for chunk in open_stream(self.tiers[FAST_TIER]):
+                streamed = streamed or bool(chunk)
+                yield chunk
+        except Exception as e:
+            if streamed:
+                raise
+            self.record_escalation(type(e).__name__)
+        else:
+            if streamed:
+                return
+            self.record_escalation("empty_response")
+        self.calls[STRONG_TIER] += 1
+        async for chunk in open_stream(self.tiers[STRONG_TIER]):
+            yield chunk
+
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream a response from the fast model, escalating if it fails to respond"""
+        async for chunk in self._stream(lambda strategy: strategy.astream_response(prompt, options)):
+            yield chunk
+
+    def supports_structured_output(self) -> bool:
+        """Structured output is only used when both tiers support it"""
+        return all(strategy.supports_structured_output() for strategy in self.tiers.values())
+
+    async def astream_structured(
+        self, prompt: str, schema: Any, options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Stream a structured response from the fast model, escalating if it fails to respond"""
+        async for chunk in self._stream(lambda strategy: strategy.astream_structured(prompt, schema, options)):
+            yield chunk
+
+    def get_provider_name(self) -> str:
+        """Get the name of the provider"""
+        return "cascade"
+
+    def get_llm(self) -> Any:
+        """
+        Get the LLM object of the fast tier.
+
+        The agent is constructed with this model; AgentAdapter decides per step whether
+        the call goes to the strong model instead.
+        """
+        return self.tiers[FAST_TIER].get_llm()
+
+    def get_planner_llm(self) -> Optional[Any]:
+        """The strong model as the agent's planner, if planning is enabled."""
+        return self.tiers[STRONG_TIER].get_llm() if self.planner_interval > 0 else None
+
+    async def warm_up(self) -> None:
+        """Warm up both tiers"""
+        await asyncio.gather(*(strategy.warm_up() for strategy in self.tiers.values()), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cascade statistics: calls per tier and escalations by reason."""
+        return {
+            "calls": dict(self.calls),
+            "escalations": dict(self.escalations),
+        }
+
+
+class EscalationWindow:
+    """Per-agent record of the steps the strong tier keeps after an escalation."""
+
+    def __init__(self, cascade: CascadeLLMStrategy):
+        self.cascade = cascade
+        # Steps before this one stay on the strong tier
+        self.strong_until_step = 0
+
+    def holds(self, step: int) -> bool:
+        """Whether a step stays on the strong tier because of an earlier escalation."""
+        return step < self.strong_until_step
+
+    def escalate(self, step: int, reason: str) -> None:
+        """
+        Record an escalation of a step to the strong tier.
+
+        A complex page only escalates the step that is on it; any other reason, i.e. a
+        failure, keeps the strong tier for the next escalation_steps steps as well.
+        """
+        self.cascade.record_escalation(reason)
+        if reason != "complex_page":
+            self.strong_until_step = step + self.cascade.escalation_steps
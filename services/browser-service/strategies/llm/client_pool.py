@@ -0,0 +1,179 @@
+"""
+Shared LLM clients and HTTP connection pools.
+
+Provider strategies are cached per (provider, model, API key, temperature), so every task
+with the same configuration shares one LLM client and its keep-alive connections instead
+of constructing a client (and doing fresh TLS handshakes) per task. The cache is an LRU
+bounded by LLM_CLIENT_CACHE_MAX_ENTRIES. Cached clients are
+never mutated: per-call options are applied to a shallow copy with bind_options().
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_http_clients_lock = threading.Lock()
+_shared_http_client: Optional[httpx.Client] = None
+_shared_async_http_client: Optional[httpx.AsyncClient] = None
+# Pools of local model servers, keyed by base URL
+_local_http_clients: Dict[str, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+
+
+def _http_limits() -> httpx.Limits:
+    """Connection pool limits shared by all LLM HTTP clients."""
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120")),
+    )
+
+
+def get_shared_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Get the process-wide keep-alive HTTP clients used by LLM clients that accept one.
+
+    Returns:
+        Tuple[httpx.Client, httpx.AsyncClient]: The sync and async clients
+    """
+    global _shared_http_client, _shared_async_http_client
+    with _http_clients_lock:
+        if _shared_http_client is None:
+            _shared_http_client = httpx.Client(limits=_http_limits(), timeout=httpx.Timeout(600, connect=10))
+        if _shared_async_http_client is None:
+            _shared_async_http_client = httpx.AsyncClient(limits=_http_limits(), timeout=httpx.Timeout(600, connect=10))
+        return _shared_http_client, _shared_async_http_client
+
+
+def get_local_http_clients(base_url: str, max_connections: int) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Get the keep-alive HTTP clients for a local model server.
+
+    A local server handles a fixed number of requests at once, so its pool is kept to
+    that many connections, all of them kept alive. Connecting to it should be instant;
+    a short connect timeout makes a server that is down fail fast.
+
+    Args:
+        base_url: Base URL of the server's API
+        max_connections: Requests the server can serve at once
+
+    Returns:
+        Tuple[httpx.Client, httpx.AsyncClient]: The sync and async clients
+    """
+    with _http_clients_lock:
+        clients = _local_http_clients.get(base_url)
+        if clients is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120")),
+            )
+            timeout = httpx.Timeout(float(os.getenv("LOCAL_LLM_TIMEOUT_SECONDS", "120")), connect=2)
+            clients = (httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout))
+            _local_http_clients[base_url] = clients
+        return clients
+
+
+async def close_shared_http_clients() -> None:
+    """
+    Close the shared HTTP clients, including those of local servers, e.g. on shutdown.
+
+    The cached LLM clients built on them are dropped too, so none is left holding a
+    closed pool.
+    """
+    from .factory import LLMProviderFactory
+
+    global _shared_http_client, _shared_async_http_client
+    LLMProviderFactory.clear_cache()
+    with _http_clients_lock:
+        clients = [(_shared_http_client, _shared_async_http_client), *_local_http_clients.values()]
+        _shared_http_client = _shared_async_http_client = None
+        _local_http_clients.clear()
+    for http_client, async_http_client in clients:
+        if async_http_client is not None:
+            await async_http_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+
+def bind_options(llm: Any, options: Optional[Dict[str, Any]], allowed: Iterable[str]) -> Any:
+    """
+    Apply per-call options without mutating a shared client.
+
+    Args:
+        llm: The shared LangChain chat model
+        options: Per-call options
+        allowed: Option names that map directly onto model fields
+
+    Returns:
+        Any: The shared client if there is nothing to override, otherwise a shallow copy
+        (which still shares the underlying HTTP clients) with the options applied
+    """
+    overrides = {name: options[name] for name in allowed if options and name in options}
+    if not overrides:
+        return llm
+    return llm.model_copy(update=overrides)
+
+
+class LLMClientCache:
+    """
+    Thread-safe LRU cache of provider strategies keyed by their configuration.
+
+    Every distinct key, temperature or base URL gets an entry of its own, so the cache is
+    bounded; the least recently used strategy is evicted and its clients are closed.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("LLM_CLIENT_CACHE_MAX_ENTRIES", "64"))
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(
+        provider_type: str, model: Optional[str], api_key: str, temperature: Optional[float], base_url: Optional[str] = None
+    ) -> Tuple:
+        """Build a cache key; the API key is only kept as a hash."""
+        key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        return (provider_type.lower(), model, key_hash, temperature, base_url)
+
+    def get_or_create(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        """Return the cached entry for the key, creating it on first use."""
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            entry = create()
+            self._entries[key] = entry
+            logger.info(f"Created shared LLM client for {key[0]}/{key[1]}")
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+                self.evictions += 1
+        for evicted_key, evicted_entry in evicted:
+            logger.info(f"Evicting shared LLM client for {evicted_key[0]}/{evicted_key[1]}")
+            _close_strategy(evicted_entry)
+        return entry
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+def _close_strategy(strategy: Any) -> None:
+    """Close the clients a strategy owns; errors are logged, not raised."""
+    try:
+        strategy.close()
+    except Exception as e:
+        logger.warning(f"Error closing evicted LLM client: {str(e)}")
@@ -1,25 +1,82 @@
-from typing import Dict, Any
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional
 
 from ..base import LLMProviderStrategy
+from .client_pool import LLMClientCache
+from .rate_limiter import get_rate_limiter
+from .response_cache import CachedLLMStrategy
+from .response_cache import get_response_cache
+from .router import RoutingLLMStrategy
+from .cascade import CascadeLLMStrategy
 from .gemini import GeminiLLMStrategy
 from .openai import OpenAILLMStrategy
 from .anthropic import AnthropicLLMStrategy
+from .local import LocalLLMStrategy
+
+logger = logging.getLogger(__name__)
 
 class LLMProviderFactory:
     """Factory for creating LLM provider strategies"""
     
+    SUPPORTED_PROVIDERS = ("gemini", "openai", "anthropic", "local")
+    
+    # Provider type that routes each call across all configured providers
+    ROUTED_PROVIDER = "routed"
+    
+    # Provider type that tries a fast model first and escalates to a strong one
+    CASCADE_PROVIDER = "cascade"
+    
+    # Strategies are immutable once built, so one per configuration is shared by all tasks
+    _cache = LLMClientCache()
+    _router = None
+    _cascade = None
+    # Last probe of the local model server, refreshed by monitor_local_health()
+    _local_health: Optional[Dict[str, Any]] = None
+    
     @staticmethod
     def create_provider(provider_type: str, config: Dict[str, Any]) -> LLMProviderStrategy:
-        """Create an LLM provider strategy based on type"""
+        """Get the shared LLM provider strategy for a type and configuration, creating it on first use"""
+        import os
+        
         # Ensure we have default values for missing config items
         api_key = config.get("api_key")
-        if not api_key:
+        base_url = config.get("base_url")
+        if provider_type.lower() == "local":
+            # Local servers are identified by their URL; most do not check a key
+            if not base_url:
+                raise ValueError("Base URL is required for provider local")
+            api_key = api_key or ""
+        elif not api_key:
             raise ValueError(f"API key is required for provider {provider_type}")
             
         # Get model with fallback to provider-specific default
         model = config.get("model")
         temperature = config.get("temperature", 0.7)
         
+        def build():
+            strategy = LLMProviderFactory._build_provider(provider_type, api_key, model, temperature, config)
+            # Strategies for the same provider/model share one limiter, whatever their key
+            llm = strategy.get_llm()
+            model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or model
+            strategy.rate_limiter = get_rate_limiter(
+                provider_type, model_name, max_concurrency=getattr(strategy, "max_concurrency", None)
+            )
+            # Serve repeated identical calls from the exact-match response cache
+            if os.getenv("LLM_RESPONSE_CACHE", "true").lower() == "true":
+                cache_sampled = os.getenv("LLM_RESPONSE_CACHE_SAMPLED", "false").lower() == "true"
+                strategy = CachedLLMStrategy(strategy, get_response_cache(), cache_sampled=cache_sampled)
+            return strategy
+        
+        key = LLMClientCache.make_key(provider_type, model, api_key, temperature, base_url)
+        return LLMProviderFactory._cache.get_or_create(key, build)
+    
+    @staticmethod
+    def _build_provider(
+        provider_type: str, api_key: str, model: str, temperature: float, config: Optional[Dict[str, Any]] = None
+    ) -> LLMProviderStrategy:
+        """Construct a new LLM provider strategy"""
         if provider_type.lower() == "gemini":
             return GeminiLLMStrategy(
                 api_key=api_key,
@@ -38,28 +95,46 @@ class LLMProviderFactory:
                 model=model or "claude-3-opus-20240229",
                 temperature=temperature
             )
+        elif provider_type.lower() == "local":
+            config = config or {}
+            return LocalLLMStrategy(
+                base_url=config["base_url"],
+                model=model or "local-model",
+                temperature=temperature,
+                api_key=api_key or None,
+                max_concurrency=config.get("max_concurrency", 4),
+                tool_calling=config.get("tool_calling", False)
+            )
         else:
             raise ValueError(f"Unsupported LLM provider type: {provider_type}")
     
     @staticmethod
-    def get_provider(provider_type: str) -> LLMProviderStrategy:
+    def get_provider(provider_type: str, model: Optional[str] = None) -> LLMProviderStrategy:
         """
         Get an LLM provider strategy based on type, using environment variables for configuration.
         
         This is a convenience method that loads configuration from environment variables.
+        A model given here takes precedence over the provider's model variable.
         """
         import os
         
+        if provider_type.lower() == LLMProviderFactory.ROUTED_PROVIDER:
+            return LLMProviderFactory.get_router()
+        if provider_type.lower() == LLMProviderFactory.CASCADE_PROVIDER:
+            return LLMProviderFactory.get_cascade()
+        
         # Determine which environment variable to use based on provider type
         if provider_type.lower() == "gemini":
             api_key = os.getenv("GOOGLE_API_KEY") # Use GOOGLE_API_KEY consistent with config.py
-            model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+            model = model or os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
         elif provider_type.lower() == "openai":
             api_key = os.getenv("OPENAI_API_KEY")
-            model = os.getenv("OPENAI_MODEL", "gpt-4")
+            model = model or os.getenv("OPENAI_MODEL", "gpt-4")
         elif provider_type.lower() == "anthropic":
             api_key = os.getenv("ANTHROPIC_API_KEY")
-            model = os.getenv("ANTHROPIC_MODEL", "claude-3-opus-20240229")
+            model = model or os.getenv("ANTHROPIC_MODEL", "claude-3-opus-20240229")
+        elif provider_type.lower() == "local":
+            return LLMProviderFactory.get_local_provider(model)
         else:
             raise ValueError(f"Unsupported LLM provider type: {provider_type}")
             
@@ -76,4 +151,156 @@ class LLMProviderFactory:
             "temperature": temperature
         }
         
-        return LLMProviderFactory.create_provider(provider_type, config)
\ No newline at end of file
+        return LLMProviderFactory.create_provider(provider_type, config)
+    
+    @staticmethod
+    def get_local_provider(model: Optional[str] = None) -> LLMProviderStrategy:
+        """
+        Get the strategy of the local OpenAI-compatible server configured by LOCAL_LLM_BASE_URL.
+        
+        LOCAL_LLM_MAX_CONCURRENCY should match the server's parallel slots, and
+        LOCAL_LLM_TOOL_CALLING=true enables forced tool calls for servers that support them.
+        """
+        import os
+        
+        base_url = os.getenv("LOCAL_LLM_BASE_URL")
+        if not base_url:
+            raise ValueError("LOCAL_LLM_BASE_URL environment variable not set for provider local")
+        
+        config = {
+            "api_key": os.getenv("LOCAL_LLM_API_KEY", ""),
+            "base_url": base_url.rstrip("/"),
+            "model": model or os.getenv("LOCAL_LLM_MODEL", "local-model"),
+            "temperature": float(os.getenv("LLM_TEMPERATURE", "0.7")),
+            "max_concurrency": int(os.getenv("LOCAL_LLM_MAX_CONCURRENCY", "4")),
+            "tool_calling": os.getenv("LOCAL_LLM_TOOL_CALLING", "false").lower() == "true",
+        }
+        return LLMProviderFactory.create_provider("local", config)
+    
+    @staticmethod
+    async def probe_local_health() -> Dict[str, Any]:
+        """Probe the local model server and remember the result, or an empty dict if none is configured"""
+        import os
+        
+        if not os.getenv("LOCAL_LLM_BASE_URL"):
+            return {}
+        try:
+            strategy = LLMProviderFactory.get_local_provider()
+        except Exception as e:
+            health = {"status": "unavailable", "error": str(e)}
+        else:
+            # The response cache wraps the server's own strategy
+            if isinstance(strategy, CachedLLMStrategy):
+                strategy = strategy.strategy
+            health = await strategy.health_check()
+        health["checked_at"] = time.time()
+        LLMProviderFactory._local_health = health
+        return health
+    
+    @staticmethod
+    async def local_health() -> Dict[str, Any]:
+        """
+        Last health of the local model server, or an empty dict if none is configured.
+        
+        Served from the result of monitor_local_health(); the server is only probed here
+        if it has not been probed yet.
+        """
+        if LLMProviderFactory._local_health is None:
+            return await LLMProviderFactory.probe_local_health()
+        return LLMProviderFactory._local_health
+    
+    @staticmethod
+    async def monitor_local_health(interval: float) -> None:
+        """Probe the local model server every interval seconds until cancelled"""
+        while True:
+            await LLMProviderFactory.probe_local_health()
+            await asyncio.sleep(interval)
+    
+    @staticmethod
+    def get_router() -> RoutingLLMStrategy:
+        """
+        Get the shared routing strategy across the configured providers.
+        
+        Routes over LLM_ROUTING_PROVIDERS (comma-separated, in order of preference) or, if
+        unset, over every supported provider that has an API key.
+        """
+        import os
+        
+        if LLMProviderFactory._router is None:
+            configured = os.getenv("LLM_ROUTING_PROVIDERS")
+            names = [name.strip().lower() for name in configured.split(",")] if configured else list(LLMProviderFactory.SUPPORTED_PROVIDERS)
+            strategies = {}
+            for name in names:
+                try:
+                    strategies[name] = LLMProviderFactory.get_provider(name)
+                except ValueError as e:
+                    # Providers without a key are simply left out
+                    logger.info(f"Not routing to {name}: {str(e)}")
+            hedging = os.getenv("LLM_HEDGING", "true").lower() == "true"
+            LLMProviderFactory._router = RoutingLLMStrategy(strategies, hedging=hedging)
+        return LLMProviderFactory._router
+    
+    @staticmethod
+    def get_cascade() -> CascadeLLMStrategy:
+        """
+        Get the shared fast-to-strong model cascade.
+        
+        The tiers are configured as "provider/model" (or just "provider" for its default
+        model) with LLM_CASCADE_FAST and LLM_CASCADE_STRONG.
+        """
+        import os
+        
+        if LLMProviderFactory._cascade is None:
+            def tier(variable: str, default: str) -> LLMProviderStrategy:
+                provider_type, _, model = os.getenv(variable, default).partition("/")
+                return LLMProviderFactory.get_provider(provider_type.strip(), model.strip() or None)
+            
+            LLMProviderFactory._cascade = CascadeLLMStrategy(
+                fast=tier("LLM_CASCADE_FAST", "openai/gpt-4o-mini"),
+                strong=tier("LLM_CASCADE_STRONG", "openai/gpt-4o"),
+                complex_page_elements=int(os.getenv("LLM_CASCADE_COMPLEX_PAGE_ELEMENTS", "150")),
+                escalation_steps=int(os.getenv("LLM_CASCADE_ESCALATION_STEPS", "2")),
+                planner_interval=int(os.getenv("LLM_CASCADE_PLANNER_INTERVAL", "5")),
+            )
+        return LLMProviderFactory._cascade
+    
+    @staticmethod
+    def clear_cache() -> None:
+        """Drop the shared strategies, including the router and cascade built from them"""
+        LLMProviderFactory._cache.clear()
+        LLMProviderFactory._router = None
+        LLMProviderFactory._cascade = None
+        LLMProviderFactory._local_health = None
+    
+    @staticmethod
+    def cascade_stats() -> Dict[str, Any]:
+        """Statistics of the model cascade, or an empty dict if it is unused"""
+        return LLMProviderFactory._cascade.stats() if LLMProviderFactory._cascade else {}
+    
+    @staticmethod
+    def routing_stats() -> Dict[str, Any]:
+        """Statistics of the routing strategy, or an empty dict if routing is unused"""
+        return LLMProviderFactory._router.stats() if LLMProviderFactory._router else {}
+    
+    @staticmethod
+    async def prewarm(provider_types: List[str]) -> List[str]:
+        """
+        Build the shared clients for the given providers and open their connections,
+        so that the first task does not pay for imports, client set-up and TLS handshakes.
+        
+        Returns:
+            List[str]: The providers that were warmed up
+        """
+        warmed = []
+        for provider_type in provider_types:
+            if provider_type.lower() not in LLMProviderFactory.SUPPORTED_PROVIDERS:
+                continue
+            try:
+                # Client construction imports provider SDKs; keep it off the event loop
+                strategy = await asyncio.to_thread(LLMProviderFactory.get_provider, provider_type)
+                await strategy.warm_up()
+                warmed.append(provider_type)
+            except Exception as e:
+                logger.warning(f"Could not pre-warm LLM provider {provider_type}: {str(e)}")
+        logger.info(f"Pre-warmed LLM providers: {', '.join(warmed) or 'none'}")
+        return warmed
\ No newline at end of file
@@ -1,7 +1,8 @@
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, AsyncIterator
 
-from ..base import LLMProviderStrategy
+from ..base import LLMProviderStrategy, is_browser_automation_prompt, strip_json_fence
+from .client_pool import bind_options
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,8 @@ class GeminiLLMStrategy(LLMProviderStrategy):
         model = str(model)
         logger.debug(f"Final model value: {model} (type: {type(model)})")
             
+        # The Gemini client talks gRPC (or REST through google-auth), not httpx, so it cannot
+        # use the shared pool; caching this strategy keeps its channel open between tasks
         try:
             self.llm = ChatGoogleGenerativeAI(
                 model=model,
@@ -34,71 +37,17 @@ class GeminiLLMStrategy(LLMProviderStrategy):
             logger.error(f"Error initializing Gemini LLM: {str(e)}")
             raise
     
+    def _bind(self, options: Optional[Dict[str, Any]]) -> Any:
+        """Apply a temperature override to a copy; the client is shared between tasks"""
+        temperature = options.get("temperature", 0.7) if options else 0.7
+        return bind_options(self.llm, {"temperature": temperature} if temperature != 0.7 else None, ("temperature",))
+    
     async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
         """Generate a response using Gemini"""
         try:
-            # Apply any additional options if provided
-            temperature = options.get("temperature", 0.7) if options else 0.7
-            
-            # Import necessary message types
-            from langchain_core.messages import HumanMessage, SystemMessage
-            
-            # Determine if this is a browser automation prompt
-            is_browser_automation = "browser actions" in prompt.lower() or "browser task" in prompt.lower()
-            
-            # Create appropriate messages based on prompt type
-            messages = []
-            
-            if is_browser_automation:
-                # Add a system message for browser automation tasks
-                system_prompt = """You are a browser automation expert. Your task is to generate a precise sequence of browser actions to accomplish the user's task.
-                
-                Return your response in valid JSON format with an array of actions. Each action should have a 'type' and 'params' object.
-                
-                Supported action types:
-                - navigate: Go to a URL (params: url)
-                - click: Click on an element (params: selector)
-                - type: Type text into an input field (params: selector, text)
-                - screenshot: Take a screenshot (params: name)
-                - wait: Wait for an element or time (params: selector or timeout in ms)
-                - scroll: Scroll the page (params: x, y or selector)
-                - press_key: Press a keyboard key (params: key, selector optional)
-                - select_option: Select an option from a dropdown (params: selector, value)
-                - hover: Hover over an element (params: selector)
-                - get_text: Get text from an element (params: selector)
-                
-                Example response format:
-                ```json
-                [
-                  {
-                    "type": "navigate",
-                    "params": {
-                      "url": "https://example.com"
-                    }
-                  },
-                  {
-                    "type": "click",
-                    "params": {
-                      "selector": "button.submit"
-                    }
-                  }
-                ]
-                ```
-                
-                Be precise with your selectors. Use CSS selectors that are specific enough to identify the element uniquely.
-                Think step by step and include all necessary actions to complete the task successfully.
-                """
-                messages.append(SystemMessage(content=system_prompt))
-            
-            # Add the user's prompt as a human message
-            messages.append(HumanMessage(content=prompt))
-            
-            # Generate response with potentially adjusted temperature
-            if temperature != 0.7:
-                self.llm.temperature = temperature
-                
+            messages = self._build_messages(prompt)
             logger.debug(f"Generating response with {len(messages)} messages")
-            response = await self.llm.agenerate([messages])
+            response = await self._agenerate(self._bind(options), messages)
             logger.debug("Successfully generated response")
             
             # Extract the text from the response
@@ -107,13 +56,8 @@ class GeminiLLMStrategy(LLMProviderStrategy):
                 logger.debug(f"Response text (first 100 chars): {result[:100]}...")
                 
                 # Clean up JSON response if needed
-                if is_browser_automation and "```json" in result:
-                    # Extract JSON from code blocks
-                    import re
-                    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', result)
-                    if json_match:
-                        result = json_match.group(1).strip()
-                        logger.debug("Extracted JSON from code block")
+                if is_browser_automation_prompt(prompt):
+                    result = strip_json_fence(result)
                 
                 return result
             else:
@@ -124,6 +68,21 @@ class GeminiLLMStrategy(LLMProviderStrategy):
             logger.error(f"Error generating response with Gemini: {str(e)}")
             raise
     
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream a response using Gemini"""
+        try:
+            async for chunk in self._astream(self._bind(options), self._build_messages(prompt)):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error streaming response with Gemini: {str(e)}")
+            raise
+    
+    def close(self) -> None:
+        """Close the Gemini client's own gRPC channel; it is not on the shared pool"""
+        transport = getattr(getattr(self.llm, "client", None), "transport", None)
+        if transport is not None:
+            transport.close()
+    
     def get_provider_name(self) -> str:
         """Get the name of the provider"""
         return "gemini"
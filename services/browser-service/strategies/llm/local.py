@@ -0,0 +1,145 @@
+"""
+Local OpenAI-compatible model server (llama.cpp server, vLLM, Ollama and the like).
+
+A small model on the same box or LAN answers routine steps without a WAN round trip or
+TLS handshake. The server is reached through its OpenAI-compatible /v1 API with a
+keep-alive connection pool of its own, sized to the number of requests it can serve at
+once (its parallel slots). The same number caps the calls in flight through the
+provider's rate limiter, so extra calls queue here instead of on the server.
+"""
+
+import logging
+import time
+from typing import Dict, Any, Optional, AsyncIterator
+
+from ..base import LLMProviderStrategy, is_browser_automation_prompt, strip_json_fence
+from .client_pool import bind_options
+from .client_pool import get_local_http_clients
+
+logger = logging.getLogger(__name__)
+
+class LocalLLMStrategy(LLMProviderStrategy):
+    """Local OpenAI-compatible server implementation"""
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str = "local-model",
+        temperature: float = 0.7,
+        api_key: Optional[str] = None,
+        max_concurrency: int = 4,
+        tool_calling: bool = False,
+    ):
+        """
+        Initialize the strategy.
+
+        Args:
+            base_url: Base URL of the server's OpenAI-compatible API, e.g. http://127.0.0.1:8080/v1
+            model: Model name the server serves (vLLM requires the exact name)
+            temperature: Sampling temperature
+            api_key: API key, if the server requires one
+            max_concurrency: Requests the server can serve at once
+            tool_calling: Whether the server supports forced tool calls; without it the
+                agent uses JSON mode and action plans use the text prompt
+        """
+        from langchain_openai import ChatOpenAI
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.tool_calling = tool_calling
+        self.tool_calling_method = "function_calling" if tool_calling else "json_mode"
+        http_client, http_async_client = get_local_http_clients(self.base_url, max_concurrency)
+        self.llm = ChatOpenAI(
+            model=model,
+            # The client requires a key even when the server does not check it
+            api_key=api_key or "not-needed",
+            base_url=self.base_url,
+            temperature=temperature,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+        logger.info(f"Initialized local LLM at {self.base_url} with model {model}")
+
+    def _bind(self, options: Optional[Dict[str, Any]]) -> Any:
+        """Apply any additional options to a copy; the client is shared between tasks"""
+        return bind_options(
+            self.llm, options,
+            ("max_tokens", "top_p", "presence_penalty", "frequency_penalty", "temperature")
+        )
+
+    async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a response using the local server"""
+        try:
+            messages = self._build_messages(prompt)
+            logger.debug(f"Generating response with {len(messages)} messages")
+            response = await self._agenerate(self._bind(options), messages)
+
+            # Extract the text from the response
+            result = response.generations[0][0].text
+
+            # Clean up JSON response if needed
+            if is_browser_automation_prompt(prompt):
+                result = strip_json_fence(result)
+
+            return result
+
+        except Exception as e:
+            logger.error(f"Error generating response with local LLM: {str(e)}")
+            raise
+
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream a response using the local server"""
+        try:
+            async for chunk in self._astream(self._bind(options), self._build_messages(prompt)):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error streaming response with local LLM: {str(e)}")
+            raise
+
+    def supports_structured_output(self) -> bool:
+        """Forced tool calls depend on how the server was started, so they are opt-in"""
+        return self.tool_calling
+
+    async def health_check(self, timeout: float = 1.0) -> Dict[str, Any]:
+        """
+        Probe the server's model list.
+
+        Args:
+            timeout: Seconds to wait for the server
+
+        Returns:
+            Dict[str, Any]: "status" ("ok" or "unavailable"), the probe's latency and
+            the served models or the error
+        """
+        _, http_async_client = get_local_http_clients(self.base_url, self.max_concurrency)
+        headers = {"Authorization": f"Bearer {self.llm.openai_api_key.get_secret_value()}"}
+        started_at = time.monotonic()
+        try:
+            response = await http_async_client.get(f"{self.base_url}/models", headers=headers, timeout=timeout)
+            response.raise_for_status()
+            models = [model.get("id") for model in response.json().get("data", [])]
+        except Exception as e:
+            return {"status": "unavailable", "base_url": self.base_url, "error": f"{type(e).__name__}: {str(e)}"}
+        return {
+            "status": "ok",
+            "base_url": self.base_url,
+            "latency_ms": round((time.monotonic() - started_at) * 1000, 1),
+            "models": models,
+        }
+
+    async def warm_up(self) -> None:
+        """Open a keep-alive connection to the server and report whether it is up"""
+        health = await self.health_check(timeout=5)
+        if health["status"] != "ok":
+            logger.warning(f"Local LLM at {self.base_url} is not reachable: {health['error']}")
+
+    def get_provider_name(self) -> str:
+        """Get the name of the provider"""
+        return "local"
+
+    def get_llm(self) -> Any:
+        """
+        Get the underlying LLM object.
+
+        Returns the ChatOpenAI instance pointed at the local server.
+        """
+        return self.llm
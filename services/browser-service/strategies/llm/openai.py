@@ -1,7 +1,9 @@
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, AsyncIterator
 
-from ..base import LLMProviderStrategy
+from ..base import LLMProviderStrategy, is_browser_automation_prompt, strip_json_fence
+from .client_pool import bind_options
+from .client_pool import get_shared_http_clients
 
 logger = logging.getLogger(__name__)
 
@@ -10,106 +12,62 @@ class OpenAILLMStrategy(LLMProviderStrategy):
     
     def __init__(self, api_key: str, model: str = "gpt-4", temperature: float = 0.7):
         from langchain_openai import ChatOpenAI
+        # Share the process-wide keep-alive connection pool
+        http_client, http_async_client = get_shared_http_clients()
         self.llm = ChatOpenAI(
             model=model,
             api_key=api_key,
-            temperature=temperature
+            temperature=temperature,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
         logger.info(f"Initialized OpenAI LLM with model {model}")
     
+    def _bind(self, options: Optional[Dict[str, Any]]) -> Any:
+        """Apply any additional options to a copy; the client is shared between tasks"""
+        return bind_options(
+            self.llm, options,
+            ("max_tokens", "top_p", "presence_penalty", "frequency_penalty", "temperature")
+        )
+    
     async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
         """Generate a response using OpenAI"""
         try:
-            # Apply any additional options if provided
-            if options:
-                # Handle specific options for OpenAI
-                if "max_tokens" in options:
-                    self.llm.max_tokens = options["max_tokens"]
-                if "top_p" in options:
-                    self.llm.top_p = options["top_p"]
-                if "presence_penalty" in options:
-                    self.llm.presence_penalty = options["presence_penalty"]
-                if "frequency_penalty" in options:
-                    self.llm.frequency_penalty = options["frequency_penalty"]
-                if "temperature" in options:
-                    self.llm.temperature = options["temperature"]
-            
-            # Import necessary message types
-            from langchain_core.messages import HumanMessage, SystemMessage
+            messages = self._build_messages(prompt)
+            logger.debug(f"Generating response with {len(messages)} messages")
+            response = await self._agenerate(self._bind(options), messages)
             
-            # Determine if this is a browser automation prompt
-            is_browser_automation = "browser actions" in prompt.lower() or "browser task" in prompt.lower()
+            # Extract the text from the response
+            result = response.generations[0][0].text
             
-            # Create appropriate messages based on prompt type
-            messages = []
+            # Clean up JSON response if needed
+            if is_browser_automation_prompt(prompt):
+                result = strip_json_fence(result)
             
-            if is_browser_automation:
-                # Add a system message for browser automation tasks
-                system_prompt = """You are a browser automation expert. Your task is to generate a precise sequence of browser actions to accomplish the user's task.
-                
-                Return your response in valid JSON format with an array of actions. Each action should have a 'type' and 'params' object.
-                
-                Supported action types:
-                - navigate: Go to a URL (params: url)
-                - click: Click on an element (params: selector)
-                - type: Type text into an input field (params: selector, text)
-                - screenshot: Take a screenshot (params: name)
-                - wait: Wait for an element or time (params: selector or timeout in ms)
-                - scroll: Scroll the page (params: x, y or selector)
-                - press_key: Press a keyboard key (params: key, selector optional)
-                - select_option: Select an option from a dropdown (params: selector, value)
-                - hover: Hover over an element (params: selector)
-                - get_text: Get text from an element (params: selector)
-                
-                Example response format:
-                ```json
-                [
-                  {
-                    "type": "navigate",
-                    "params": {
-                      "url": "https://example.com"
-                    }
-                  },
-                  {
-                    "type": "click",
-                    "params": {
-                      "selector": "button.submit"
-                    }
-                  }
-                ]
-                ```
-                
-                Be precise with your selectors. Use CSS selectors that are specific enough to identify the element uniquely.
-                Think step by step and include all necessary actions to complete the task successfully.
-                """
-                messages.append(SystemMessage(content=system_prompt))
-                messages.append(HumanMessage(content=prompt))
-                
-                # Generate response
-                logger.debug(f"Generating browser automation response with system prompt")
-                response = await self.llm.agenerate([messages])
-                
-                # Extract the text from the response
-                result = response.generations[0][0].text
-                
-                # Clean up JSON response if needed
-                if "```json" in result:
-                    # Extract JSON from code blocks
-                    import re
-                    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', result)
-                    if json_match:
-                        result = json_match.group(1).strip()
-                        logger.debug("Extracted JSON from code block")
-                
-                return result
-            else:
-                # For non-browser tasks, just use the prompt directly
-                return (await self.llm.agenerate([[HumanMessage(content=prompt)]])).generations[0][0].text
+            return result
                 
         except Exception as e:
             logger.error(f"Error generating response with OpenAI: {str(e)}")
             raise
     
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream a response using OpenAI"""
+        try:
+            async for chunk in self._astream(self._bind(options), self._build_messages(prompt)):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error streaming response with OpenAI: {str(e)}")
+            raise
+    
+    async def warm_up(self) -> None:
+        """Open a keep-alive connection to the API so the first task skips the TLS handshake"""
+        _, http_async_client = get_shared_http_clients()
+        base_url = self.llm.openai_api_base or "https://api.openai.com/v1"
+        try:
+            await http_async_client.head(base_url, timeout=5)
+        except Exception as e:
+            logger.debug(f"Could not pre-connect to {base_url}: {str(e)}")
+    
     def get_provider_name(self) -> str:
         """Get the name of the provider"""
         return "openai"
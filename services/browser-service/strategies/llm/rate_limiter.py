@@ -0,0 +1,270 @@
+"""
+Process-wide rate limiting for LLM providers.
+
+Each (provider, model) pair gets one ProviderRateLimiter shared by every task. It paces
+calls with token buckets for requests/min and tokens/min, admits callers strictly in
+arrival order so that no task is starved, and adapts its concurrency limit AIMD-style:
+the limit is halved when the provider answers with a rate-limit error and grows back by
+one slot per window of successful calls.
+
+Limits are configured with the LLM_RATE_LIMITS environment variable, a JSON object keyed
+by "provider" or "provider/model", e.g.
+{"openai": {"requests_per_minute": 500, "tokens_per_minute": 300000, "max_concurrency": 32}}
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Halving the limit again within this many seconds would overreact to one burst of 429s
+_DECREASE_COOLDOWN_SECONDS = 2.0
+
+# Called with (limiter name, seconds) each time a call is admitted
+_idle_wait_listeners: List[Callable[[str, float], None]] = []
+
+
+def add_idle_wait_listener(listener: Callable[[str, float], None]) -> None:
+    """
+    Register a callback told how long each call waited for a limiter slot.
+
+    Usage accounting lives outside this package, which it cannot import; it registers
+    itself here instead.
+
+    Args:
+        listener: Called with the limiter name (provider/model) and the seconds queued
+    """
+    if listener not in _idle_wait_listeners:
+        _idle_wait_listeners.append(listener)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Whether an exception from a provider SDK signals a rate limit (HTTP 429 / quota exhausted)."""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    if type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "resource_exhausted" in message
+
+
+def estimate_tokens(messages: Any) -> int:
+    """Rough token estimate (4 characters per token) for a list of messages."""
+    chars = 0
+    for message in messages or []:
+        content = getattr(message, "content", message)
+        if isinstance(content, list):
+            # Multimodal content: count the text parts only
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        chars += len(str(content))
+    return chars // 4
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until the amount (capped at the capacity) is available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Take tokens; the balance may go negative when usage exceeds an estimate."""
+        self._refill()
+        self.tokens -= amount
+
+
+class RatePermit:
+    """Handed to the caller for the duration of an admitted call."""
+
+    def __init__(self, limiter: "ProviderRateLimiter", estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+
+    def record_tokens(self, actual_tokens: int) -> None:
+        """Correct the tokens/min bucket once the real usage of the call is known."""
+        if self.limiter.token_bucket and actual_tokens:
+            self.limiter.token_bucket.consume(actual_tokens - self.estimated_tokens)
+            self.estimated_tokens = actual_tokens
+
+
+class ProviderRateLimiter:
+    """Paces and bounds the concurrent LLM calls made to one provider/model."""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+    ):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(max_concurrency)
+
+        # asyncio.Lock wakes waiters in FIFO order, which makes admission fair across tasks
+        self._admission = asyncio.Lock()
+        self._slot_freed = asyncio.Event()
+        self._last_decrease = 0.0
+
+        self.in_flight = 0
+        self.queued = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+
+    async def _wait_for_capacity(self, estimated_tokens: int) -> None:
+        """Wait (at the head of the queue) for a concurrency slot and bucket capacity."""
+        while True:
+            if self.in_flight >= max(self.min_concurrency, int(self.concurrency_limit)):
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+                continue
+            delay = max(
+                self.request_bucket.delay_for(1) if self.request_bucket else 0.0,
+                self.token_bucket.delay_for(estimated_tokens) if self.token_bucket else 0.0,
+            )
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+
+        if self.request_bucket:
+            self.request_bucket.consume(1)
+        if self.token_bucket:
+            self.token_bucket.consume(estimated_tokens)
+
+    def _on_success(self) -> None:
+        # Additive increase: about one extra slot per limit's worth of successful calls
+        self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+
+    def _on_rate_limited(self) -> None:
+        self.rate_limited += 1
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        # Multiplicative decrease
+        self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+        logger.warning(f"Rate limited by {self.name}; concurrency limit lowered to {int(self.concurrency_limit)}")
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: int = 0) -> AsyncIterator[RatePermit]:
+        """
+        Wait for this caller's turn, then hold a slot for the duration of the call.
+
+        Args:
+            estimated_tokens: Expected tokens of the call, charged to the tokens/min bucket
+
+        Yields:
+            RatePermit: Used to report the call's actual token usage
+        """
+        started_at = time.monotonic()
+        self.queued += 1
+        try:
+            async with self._admission:
+                await self._wait_for_capacity(estimated_tokens)
+                self.in_flight += 1
+        finally:
+            self.queued -= 1
+
+        wait = time.monotonic() - started_at
+        self.requests += 1
+        self.queue_wait_seconds_total += wait
+        self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, wait)
+        for listener in _idle_wait_listeners:
+            listener(self.name, wait)
+
+        try:
+            yield RatePermit(self, estimated_tokens)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self._on_rate_limited()
+            raise
+        else:
+            self._on_success()
+        finally:
+            self.in_flight -= 1
+            self._slot_freed.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Limiter statistics, including the time calls spent queued."""
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "concurrency_limit": int(self.concurrency_limit),
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "queue_wait_seconds_total": round(self.queue_wait_seconds_total, 3),
+            "queue_wait_seconds_max": round(self.queue_wait_seconds_max, 3),
+        }
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _load_limits() -> Dict[str, Dict[str, Any]]:
+    """Parse LLM_RATE_LIMITS."""
+    raw = os.getenv("LLM_RATE_LIMITS")
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.error(f"Ignoring invalid LLM_RATE_LIMITS: {str(e)}")
+        return {}
+
+
+def get_rate_limiter(provider_type: str, model: Optional[str], max_concurrency: Optional[int] = None) -> ProviderRateLimiter:
+    """
+    Get the process-wide rate limiter for a provider and model.
+
+    Limits for "provider/model" take precedence over limits for "provider". A provider
+    with a known capacity (e.g. a local server's parallel slots) passes it as
+    max_concurrency, which replaces LLM_MAX_CONCURRENCY as the default.
+    """
+    name = f"{provider_type.lower()}/{model}"
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limits = _load_limits()
+            config = limits.get(name) or limits.get(provider_type.lower()) or {}
+            limiter = ProviderRateLimiter(
+                name,
+                requests_per_minute=config.get("requests_per_minute"),
+                tokens_per_minute=config.get("tokens_per_minute"),
+                max_concurrency=config.get("max_concurrency", max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "32"))),
+            )
+            _limiters[name] = limiter
+        return limiter
+
+
+def rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics of every rate limiter, keyed by provider/model."""
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
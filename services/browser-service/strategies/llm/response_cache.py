@@ -0,0 +1,246 @@
+"""
+Exact-match cache of LLM responses.
+
+Scheduled jobs send byte-identical prompts over and over. CachedLLMStrategy wraps any
+provider strategy and serves a repeated call from the cache instead of the API. The key is
+a hash of the canonical messages, the model and the sampling parameters. Entries live in
+an in-memory LRU in front of a SQLite table, so they survive restarts, and expire after a
+TTL.
+
+Only deterministic calls (temperature 0) are cached by default, since caching a sampled
+response would pin one sample. A call can opt in or out with the "cache" option
+(true/false), and LLM_RESPONSE_CACHE_SAMPLED=true caches sampled calls too.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from ..cache import TTLCache
+from ..base import SAMPLING_PARAMETERS
+from ..base import LLMProviderStrategy
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """Two-tier response store: an in-memory LRU backed by SQLite."""
+
+    def __init__(self, path: Optional[str], max_entries: int = 1024, ttl_seconds: float = 86400):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite database file, or None to keep entries in memory only
+            max_entries: Entries kept in the in-memory LRU
+            ttl_seconds: Default lifetime of an entry
+        """
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(fields: Dict[str, Any]) -> str:
+        """Hex SHA-256 of the canonical JSON encoding of the fields that determine a response."""
+        canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _read(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, expires_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def _write(self, key: str, response: str, expires_at: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, expires_at),
+            )
+            self._db.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached response from memory or disk, counting the hit or miss."""
+        response = self.memory.get(key)
+        if response is None and self._db is not None:
+            # Keep SQLite I/O off the event loop; a locked or corrupt file is a miss, not an error
+            try:
+                response = await asyncio.to_thread(self._read, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read cached LLM response: {str(e)}")
+            if response is not None:
+                self.disk_hits += 1
+                self.memory.set(key, response)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    async def set(self, key: str, response: str, ttl_seconds: Optional[float] = None) -> None:
+        """Store a response in memory and on disk."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.memory.set(key, response, ttl_seconds=ttl)
+        if self._db is not None:
+            try:
+                await asyncio.to_thread(self._write, key, response, time.time() + ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist LLM response: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics."""
+        return {
+            "memory_entries": len(self.memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+class CachedLLMStrategy(LLMProviderStrategy):
+    """Wraps a provider strategy and serves repeated identical calls from an LLMResponseCache."""
+
+    def __init__(self, strategy: LLMProviderStrategy, cache: LLMResponseCache, cache_sampled: bool = False):
+        self.strategy = strategy
+        self.cache = cache
+        self.cache_sampled = cache_sampled
+        self.rate_limiter = strategy.rate_limiter
+        self.tool_calling_method = strategy.tool_calling_method
+
+    def close(self) -> None:
+        """Close the wrapped strategy's clients"""
+        self.strategy.close()
+
+    def _key(self, kind: str, prompt: str, options: Optional[Dict[str, Any]], extra: Any = None) -> Optional[str]:
+        """Cache key of a call, or None if the call must not be cached."""
+        llm = self.strategy.get_llm()
+        params = {name: getattr(llm, name, None) for name in SAMPLING_PARAMETERS}
+        params.update({name: options[name] for name in SAMPLING_PARAMETERS if options and name in options})
+
+        opt_in = options.get("cache") if options else None
+        if opt_in is False:
+            return None
+        if opt_in is not True and (params.get("temperature") or 0) > 0 and not self.cache_sampled:
+            return None
+
+        messages = [
+            {"role": message.type, "content": message.content}
+            for message in self.strategy._build_messages(prompt, structured=kind == "structured")
+        ]
+        return self.cache.make_key({
+            "kind": kind,
+            "provider": self.strategy.get_provider_name(),
+            "model": getattr(llm, "model_name", None) or getattr(llm, "model", None),
+            "messages": messages,
+            "params": params,
+            "extra": extra,
+        })
+
+    async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a response, serving identical cacheable calls from the cache"""
+        key = self._key("text", prompt, options)
+        if key is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                logger.debug(f"LLM response cache hit for {key[:12]}")
+                return cached
+        response = await self.strategy.generate_response(prompt, options)
+        if key is not None and response:
+            await self.cache.set(key, response)
+        return response
+
+    async def _cached_stream(self, key: Optional[str], open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Replay a cached stream as one chunk, or stream and store the complete response."""
+        if key is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                logger.debug(f"LLM response cache hit for {key[:12]}")
+                yield cached
+                return
+        chunks: List[str] = []
+        async for chunk in open_stream():
+            chunks.append(chunk)
+            yield chunk
+        # Only a stream that ran to completion is stored
+        if key is not None and chunks:
+            await self.cache.set(key, "".join(chunks))
+
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream a response, serving identical cacheable calls from the cache"""
+        key = self._key("stream", prompt, options)
+        async for chunk in self._cached_stream(key, lambda: self.strategy.astream_response(prompt, options)):
+            yield chunk
+
+    async def astream_structured(
+        self, prompt: str, schema: Any, options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Stream a structured response, serving identical cacheable calls from the cache"""
+        key = self._key("structured", prompt, options, extra=schema.model_json_schema())
+        async for chunk in self._cached_stream(key, lambda: self.strategy.astream_structured(prompt, schema, options)):
+            yield chunk
+
+    def supports_structured_output(self) -> bool:
+        return self.strategy.supports_structured_output()
+
+    def mark_prompt_cache(self, messages: List[Any]) -> List[Any]:
+        return self.strategy.mark_prompt_cache(messages)
+
+    def _build_messages(self, prompt: str, structured: bool = False) -> List[Any]:
+        return self.strategy._build_messages(prompt, structured)
+
+    def get_provider_name(self) -> str:
+        """Get the name of the provider"""
+        return self.strategy.get_provider_name()
+
+    def get_llm(self) -> Any:
+        """Get the wrapped strategy's LLM object"""
+        return self.strategy.get_llm()
+
+    async def warm_up(self) -> None:
+        """Warm up the wrapped strategy"""
+        await self.strategy.warm_up()
+
+
+_response_cache: Optional[LLMResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> LLMResponseCache:
+    """Get the process-wide LLM response cache, configured from the environment."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            path = os.getenv("LLM_RESPONSE_CACHE_PATH", os.path.join(os.getcwd(), "cache", "llm_responses.sqlite3"))
+            _response_cache = LLMResponseCache(
+                path or None,
+                max_entries=int(os.getenv("LLM_RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+                ttl_seconds=float(os.getenv("LLM_RESPONSE_CACHE_TTL_SECONDS", "86400")),
+            )
+        return _response_cache
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    """Statistics of the response cache, or an empty dict if it is unused."""
+    return _response_cache.stats() if _response_cache else {}
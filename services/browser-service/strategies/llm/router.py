@@ -0,0 +1,260 @@
+"""
+Hedged and failover routing across LLM providers.
+
+RoutingLLMStrategy spreads calls over several configured provider strategies. The
+primary for each call is the provider with the best latency/error EWMA score. If the
+primary is still running after its observed p95 latency, a hedge request is sent to the
+next provider and whichever answers first wins. If the primary fails with a server
+error, timeout or rate limit, the call fails over to the next provider.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+from ..base import LLMProviderStrategy
+from .rate_limiter import is_rate_limit_error
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Weight of the newest sample in the latency and error EWMAs
+_EWMA_ALPHA = 0.2
+# Latency samples kept per provider for the p95 estimate
+_LATENCY_WINDOW = 100
+# Below this many samples the p95 is not trusted and calls are not hedged
+_MIN_SAMPLES_FOR_HEDGING = 10
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """Whether an error is worth retrying on another provider (5xx, timeout, connection, rate limit)."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int) and status_code >= 500:
+        return True
+    name = type(error).__name__
+    if "Timeout" in name or "Connection" in name or name in ("InternalServerError", "ServiceUnavailable", "Overloaded"):
+        return True
+    return is_rate_limit_error(error)
+
+
+class ProviderHealth:
+    """Latency and error statistics of one provider."""
+
+    def __init__(self):
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.calls = 0
+        self.errors = 0
+
+    def record_success(self, latency: float) -> None:
+        self.calls += 1
+        self.latencies.append(latency)
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            _EWMA_ALPHA * latency + (1 - _EWMA_ALPHA) * self.latency_ewma
+        )
+        self.error_ewma = (1 - _EWMA_ALPHA) * self.error_ewma
+
+    def record_error(self) -> None:
+        self.calls += 1
+        self.errors += 1
+        self.error_ewma = _EWMA_ALPHA + (1 - _EWMA_ALPHA) * self.error_ewma
+
+    def p95(self) -> Optional[float]:
+        """95th percentile latency, or None until there are enough samples."""
+        if len(self.latencies) < _MIN_SAMPLES_FOR_HEDGING:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def score(self) -> float:
+        """Lower is better; providers without samples score 0 so that they get tried."""
+        # An error rate of 50% counts like tripling the latency, plus a flat penalty so
+        # that a provider that has only ever failed does not look like an untried one
+        return (self.latency_ewma or 0.0) * (1 + 4 * self.error_ewma) + 10 * self.error_ewma
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "error_ewma": round(self.error_ewma, 3),
+        }
+
+
+class RoutingLLMStrategy(LLMProviderStrategy):
+    """LLM strategy that routes each call to the healthiest of several providers."""
+
+    def __init__(self, strategies: Dict[str, LLMProviderStrategy], hedging: bool = True):
+        if not strategies:
+            raise ValueError("At least one provider is required for routing")
+        self.strategies = strategies
+        self.hedging = hedging
+        self.health = {name: ProviderHealth() for name in strategies}
+        self.hedges = 0
+        self.failovers = 0
+        logger.info(f"Initialized LLM routing across providers: {', '.join(strategies)}")
+
+    def ranked_providers(self) -> List[str]:
+        """Provider names from best to worst score; ties keep the configured order."""
+        return sorted(self.strategies, key=lambda name: self.health[name].score())
+
+    async def _timed_call(self, name: str, call: Callable[[LLMProviderStrategy], Awaitable[T]], rate_limited: bool) -> T:
+        """Make a call on one provider and record its latency or error."""
+        strategy = self.strategies[name]
+        started_at = time.monotonic()
+        try:
+            if rate_limited and strategy.rate_limiter is not None:
+                async with strategy.rate_limiter.acquire():
+                    result = await call(strategy)
+            else:
+                result = await call(strategy)
+        except asyncio.CancelledError:
+            # The losing side of a hedge; neither a success nor an error
+            raise
+        except Exception:
+            self.health[name].record_error()
+            raise
+        self.health[name].record_success(time.monotonic() - started_at)
+        return result
+
+    async def route(self, call: Callable[[LLMProviderStrategy], Awaitable[T]], rate_limited: bool = True) -> T:
+        """
+        Run a call on the best provider, hedging and failing over as needed.
+
+        Args:
+            call: Coroutine function making the call with a given provider strategy
+            rate_limited: Hold a slot of the provider's rate limiter during the call; off for
+                calls that go through the strategy's own limiter
+
+        Returns:
+            T: The result of the first provider to succeed
+
+        Raises:
+            Exception: The last error if every provider failed, or the first error that
+            is not worth failing over for
+        """
+        remaining = self.ranked_providers()
+        running: Dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+
+        def start_next() -> None:
+            name = remaining.pop(0)
+            running[asyncio.create_task(self._timed_call(name, call, rate_limited))] = name
+
+        start_next()
+        primary = next(iter(running.values()))
+        hedge_delay = self.health[primary].p95() if self.hedging and remaining else None
+
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The primary is slower than usual: race it against the next provider
+                    hedge_delay = None
+                    if remaining:
+                        self.hedges += 1
+                        logger.info(f"LLM call on {primary} exceeded its p95; hedging on {remaining[0]}")
+                        start_next()
+                    continue
+
+                for task in done:
+                    name = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    last_error = error
+                    if not is_failover_error(error):
+                        raise error
+                    logger.warning(f"LLM call on {name} failed ({type(error).__name__}: {str(error)})")
+
+                if not running and remaining:
+                    self.failovers += 1
+                    logger.info(f"Failing over LLM call to {remaining[0]}")
+                    start_next()
+            raise last_error
+        finally:
+            # Wait for the losing hedge (or abandoned calls) to unwind, so no request outlives the call
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def generate_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Generate a response on the best available provider"""
+        # generate_response() already waits for the provider's rate limiter
+        return await self.route(lambda strategy: strategy.generate_response(prompt, options), rate_limited=False)
+
+    async def _stream(self, open_stream: Callable[[LLMProviderStrategy], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Stream from the best available provider.
+
+        Streams are not hedged. A provider that fails before producing its first chunk is
+        failed over like a regular call; once text has been yielded the error is raised.
+        """
+        last_error: Optional[BaseException] = None
+        for name in self.ranked_providers():
+            started_at = time.monotonic()
+            streamed = False
+            try:
+                async for chunk in open_stream(self.strategies[name]):
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                self.health[name].record_error()
+                if streamed or not is_failover_error(e):
+                    raise
+                last_error = e
+                self.failovers += 1
+                logger.warning(f"LLM stream on {name} failed ({type(e).__name__}: {str(e)}); failing over")
+                continue
+            self.health[name].record_success(time.monotonic() - started_at)
+            return
+        raise last_error
+
+    async def astream_response(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream a response from the best available provider"""
+        async for chunk in self._stream(lambda strategy: strategy.astream_response(prompt, options)):
+            yield chunk
+
+    def supports_structured_output(self) -> bool:
+        """Structured output is only used when every routed provider supports it"""
+        return all(strategy.supports_structured_output() for strategy in self.strategies.values())
+
+    async def astream_structured(
+        self, prompt: str, schema: Any, options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Stream a structured response from the best available provider"""
+        async for chunk in self._stream(lambda strategy: strategy.astream_structured(prompt, schema, options)):
+            yield chunk
+
+    def get_provider_name(self) -> str:
+        """Get the name of the provider"""
+        return "routed"
+
+    def get_llm(self) -> Any:
+        """
+        Get the LLM object of the current best provider.
+
+        The agent is constructed with this model; its LLM calls are then routed per call
+        by AgentAdapter.
+        """
+        return self.strategies[self.ranked_providers()[0]].get_llm()
+
+    async def warm_up(self) -> None:
+        """Warm up every routed provider"""
+        await asyncio.gather(*(strategy.warm_up() for strategy in self.strategies.values()), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing statistics, per provider."""
+        return {
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "providers": {name: health.stats() for name, health in self.health.items()},
+        }
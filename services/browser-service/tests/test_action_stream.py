@@ -0,0 +1,65 @@
+from core.action_stream import IncrementalActionParser
+
+PLAN = (
+    '[{"type": "navigate", "params": {"url": "https://example.com/?q=[a]"}}, '
+    '{"type": "type", "params": {"selector": "#q", "text": "say \\"hi\\" {x}"}}]'
+)
+ACTIONS = [
+    {"type": "navigate", "params": {"url": "https://example.com/?q=[a]"}},
+    {"type": "type", "params": {"selector": "#q", "text": 'say "hi" {x}'}},
+]
+
+
+def feed_in_chunks(parser, text, size):
+    actions = []
+    for start in range(0, len(text), size):
+        actions.extend(parser.feed(text[start:start + size]))
+    return actions
+
+
+def test_yields_each_action_as_soon_as_it_is_complete():
+    parser = IncrementalActionParser()
+    first, second = PLAN.split("}}, ", 1)
+    assert parser.feed(first) == []
+    assert parser.feed("}}, ") == ACTIONS[:1]
+    assert parser.feed(second) == ACTIONS[1:]
+    assert parser.done
+    assert parser.actions_parsed == 2
+
+
+def test_chunk_boundaries_do_not_matter():
+    for size in (1, 3, 7, len(PLAN)):
+        parser = IncrementalActionParser()
+        assert feed_in_chunks(parser, PLAN, size) == ACTIONS
+
+
+def test_ignores_fences_and_prose_around_the_plan():
+    parser = IncrementalActionParser()
+    text = 'Here is the plan:\n```json\n' + PLAN + '\n```\nThen [maybe] {more}.'
+    assert feed_in_chunks(parser, text, 5) == ACTIONS
+    assert parser.done
+
+
+def test_bracketed_prose_before_the_plan_is_skipped():
+    parser = IncrementalActionParser()
+    text = 'Plan [JSON]:\n' + PLAN
+    assert feed_in_chunks(parser, text, 4) == ACTIONS
+    assert parser.done
+
+
+def test_array_with_only_invalid_objects_is_not_the_plan():
+    parser = IncrementalActionParser()
+    text = 'Steps [see {below}]\n' + PLAN
+    assert feed_in_chunks(parser, text, 6) == ACTIONS
+
+
+def test_structured_output_arguments_are_parsed():
+    parser = IncrementalActionParser()
+    assert feed_in_chunks(parser, '{"actions": ' + PLAN + '}', 9) == ACTIONS
+
+
+def test_no_plan_yields_nothing():
+    parser = IncrementalActionParser()
+    assert parser.feed("I cannot do that [sorry].") == []
+    assert not parser.done
+    assert parser.actions_parsed == 0
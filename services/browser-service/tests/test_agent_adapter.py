@@ -0,0 +1,148 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("browser_use")
+
+from core import agent_adapter
+from core.agent_adapter import AgentAdapter
+from core.result_refs import PreviousOutputResolver
+from strategies.llm.cascade import CascadeLLMStrategy
+from strategies.llm.factory import LLMProviderFactory
+
+# Wrappers that patch the internals of a real browser-use agent
+AGENT_HOOKS = (
+    "_apply_prompt_caching", "_apply_coalescing", "_apply_deadline",
+    "_time_browser_launch", "_apply_timing", "_apply_tracing",
+)
+
+
+class StubAgent:
+    """Agent whose run asks for the previous output, as the model would, and returns it."""
+
+    instances = []
+
+    def __init__(self, task, llm, **options):
+        self.options = options
+        self.state = SimpleNamespace(n_steps=1)
+        StubAgent.instances.append(self)
+
+    async def run(self, max_steps):
+        controller = self.options.get("controller")
+        if controller is None:
+            return SimpleNamespace(is_done=lambda: True, output=None)
+        action_result = await controller.registry.execute_action("get_previous_agent_output", {})
+        return SimpleNamespace(is_done=lambda: True, output=json.loads(action_result.extracted_content))
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    StubAgent.instances = []
+    strategy = SimpleNamespace(get_llm=lambda: "llm", tool_calling_method=None, rate_limiter=None)
+    monkeypatch.setattr(agent_adapter, "Agent", StubAgent)
+    monkeypatch.setattr(LLMProviderFactory, "get_provider", staticmethod(lambda *args, **kwargs: strategy))
+    adapter = AgentAdapter()
+    for hook in AGENT_HOOKS:
+        monkeypatch.setattr(adapter, hook, lambda *args, **kwargs: None)
+    return adapter
+
+
+def test_previous_output_reaches_the_agent_through_its_controller(adapter):
+    stored = {"upstream-task": {"history": [{"extracted_content": "42 results"}]}}
+    previous_output = PreviousOutputResolver(
+        inline={"search": {"data": {"query": "laptops"}}},
+        refs={"count": {"task_id": "upstream-task", "path": "$.history[0].extracted_content"}},
+        lookup=stored.get,
+    )
+
+    response = asyncio.run(adapter.execute_task("Compare prices", "task-1", previous_output=previous_output))
+
+    assert response["status"] == "success"
+    assert response["result"].output == {"search": {"query": "laptops"}, "count": "42 results"}
+
+
+def test_inline_previous_output_is_wrapped_in_a_resolver(adapter):
+    previous_output = {"search": {"data": ["a", "b"]}}
+
+    response = asyncio.run(adapter.execute_task("Summarise", "task-2", previous_output=previous_output))
+
+    assert response["result"].output == {"search": ["a", "b"]}
+
+
+def test_agents_without_previous_output_keep_the_default_controller(adapter):
+    response = asyncio.run(adapter.execute_task("Open the page", "task-3"))
+
+    assert response["status"] == "success"
+    assert "controller" not in StubAgent.instances[0].options
+
+
+class DecidingTier:
+    """Cascade tier that decides agent steps from a script of outputs."""
+
+    def __init__(self, name, *outputs):
+        self.name = name
+        self.outputs = list(outputs)
+        self.rate_limiter = None
+
+    def get_provider_name(self):
+        return self.name
+
+    async def decide(self):
+        return self.outputs.pop(0)
+
+
+def step_output(name, evaluation="Success"):
+    return SimpleNamespace(action=[name], current_state=SimpleNamespace(evaluation_previous_goal=evaluation))
+
+
+def cascaded_agent(adapter, monkeypatch, fast_outputs, strong_outputs):
+    """Agent whose steps are decided by a cascade of deciding tiers."""
+    cascade = CascadeLLMStrategy(DecidingTier("fast", *fast_outputs), DecidingTier("strong", *strong_outputs))
+    monkeypatch.setattr(adapter, "_structured_output_call", lambda agent, messages: lambda strategy: strategy.decide())
+    cached_state = SimpleNamespace(selector_map={})
+    agent = SimpleNamespace(
+        state=SimpleNamespace(n_steps=1, consecutive_failures=0, last_result=[]),
+        browser_context=SimpleNamespace(session=SimpleNamespace(cached_state=cached_state)),
+    )
+    adapter._apply_cascade(agent, cascade)
+    return agent, cascade
+
+
+def run_steps(agent, steps):
+    """Run the agent's next-action calls for the given steps, returning the actions decided."""
+    async def main():
+        actions = []
+        for step, prepare in steps:
+            agent.state.n_steps = step
+            prepare(agent)
+            actions.append((await agent.get_next_action([])).action[0])
+        return actions
+
+    return asyncio.run(main())
+
+
+def test_a_low_confidence_step_holds_the_strong_tier(adapter, monkeypatch):
+    fast_outputs = [step_output("fast-1", evaluation="Failed - nothing happened"), step_output("fast-3")]
+    strong_outputs = [step_output("strong-1"), step_output("strong-2")]
+    agent, cascade = cascaded_agent(adapter, monkeypatch, fast_outputs, strong_outputs)
+
+    actions = run_steps(agent, [(step, lambda agent: None) for step in (1, 2, 3)])
+
+    # escalation_steps defaults to 2: the escalated step and the one after it
+    assert actions == ["strong-1", "strong-2", "fast-3"]
+    assert cascade.escalations == {"self_reported_failure": 1}
+
+
+def test_a_complex_page_escalates_without_holding(adapter, monkeypatch):
+    agent, cascade = cascaded_agent(adapter, monkeypatch, [step_output("fast-2")], [step_output("strong-1")])
+
+    def complex_page(agent):
+        agent.browser_context.session.cached_state.selector_map = dict.fromkeys(range(200))
+
+    def simple_page(agent):
+        agent.browser_context.session.cached_state.selector_map = dict.fromkeys(range(10))
+
+    assert run_steps(agent, [(1, complex_page), (2, simple_page)]) == ["strong-1", "fast-2"]
+    assert cascade.escalations == {"complex_page": 1}
@@ -0,0 +1,45 @@
+import pytest
+
+from core.budgets import BudgetExhaustedError
+from core.budgets import TaskBudget
+
+
+def test_live_updates_carry_totals_without_step_timings():
+    updates = []
+    budget = TaskBudget(on_update=updates.append)
+    for step in range(1, 4):
+        budget.start_step(step)
+        budget.record_llm_call("openai/gpt-4o", 100, 10, 0.5, None)
+        budget.record_tokens(100, 10)
+        budget.end_step()
+
+    assert updates
+    assert all("step_timings" not in usage for usage in updates)
+    assert updates[-1]["input_tokens"] == 300
+    assert updates[-1]["llm_calls"] == 3
+
+
+def test_final_usage_has_the_per_step_breakdown():
+    budget = TaskBudget()
+    budget.start_step(1)
+    budget.record_llm_call("openai/gpt-4o", 100, 10, 0.5, 0.1)
+    budget.record_tokens(100, 10)
+    budget.record_action_time(0.25)
+    budget.end_step()
+
+    [timing] = budget.usage()["step_timings"]
+    assert timing["step"] == 1
+    assert timing["llm_calls"] == 1
+    assert timing["input_tokens"] == 100
+    assert timing["time_to_first_token"] == 0.1
+    assert timing["action_time"] == 0.25
+
+
+def test_exhausted_budget_is_reported():
+    budget = TaskBudget(max_steps=3, max_input_tokens=1000)
+    budget.record_step(2)
+    budget.check()
+    budget.record_tokens(1000, 0)
+    with pytest.raises(BudgetExhaustedError) as error:
+        budget.check()
+    assert error.value.resource == "input_tokens"
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from strategies.cache import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flights.do("key", fetch) for _ in range(3)))
+        return calls, results, len(flights)
+
+    calls, results, remaining = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == [("result", False), ("result", True), ("result", True)]
+    assert remaining == 0
+
+
+def test_exception_reaches_every_caller():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        return await asyncio.gather(flights.do("key", fail), flights.do("key", fail), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["boom", "boom"]
+
+
+def test_cancelled_caller_leaves_the_call_to_the_others():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.create_task(flights.do("key", fetch))
+        second = asyncio.create_task(flights.do("key", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, asyncio.CancelledError)
+    assert second == ("result", True)
+
+
+def test_last_caller_cancelled_waits_for_the_call_to_unwind():
+    async def scenario():
+        flights = SingleFlight(cancel_timeout=1.0)
+        events = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.02)
+                events.append("call unwound")
+                raise
+
+        caller = asyncio.create_task(flights.do("key", fetch))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        events.append("caller done")
+        return events, len(flights)
+
+    events, remaining = asyncio.run(scenario())
+    assert events == ["call unwound", "caller done"]
+    assert remaining == 0
+
+
+def test_wait_for_cancelled_call_is_bounded():
+    async def scenario():
+        flights = SingleFlight(cancel_timeout=0.05)
+
+        async def stubborn():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                # Ignores the first cancellation
+                await asyncio.sleep(10)
+
+        caller = asyncio.create_task(flights.do("key", stubborn))
+        await asyncio.sleep(0.01)
+        started_at = asyncio.get_running_loop().time()
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        return asyncio.get_running_loop().time() - started_at
+
+    assert asyncio.run(scenario()) < 0.5
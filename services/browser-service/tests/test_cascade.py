@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from strategies.llm.cascade import FAST_TIER
+from strategies.llm.cascade import STRONG_TIER
+from strategies.llm.cascade import CascadeLLMStrategy
+
+
+class StubTier:
+    """Tier whose responses are scripted; an exception in the script is raised instead."""
+
+    def __init__(self, name, *responses):
+        self.name = name
+        self.responses = list(responses)
+        self.prompts = []
+        self.rate_limiter = None
+
+    def get_provider_name(self):
+        return self.name
+
+    async def generate_response(self, prompt, options=None):
+        self.prompts.append(prompt)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def cascade(fast=None, strong=None, **options):
+    return CascadeLLMStrategy(fast or StubTier("fast"), strong or StubTier("strong"), **options)
+
+
+def agent_output(action=True, evaluation="Success - clicked the button"):
+    return SimpleNamespace(
+        action=[{"click_element": {"index": 1}}] if action else [],
+        current_state=SimpleNamespace(evaluation_previous_goal=evaluation),
+    )
+
+
+def test_routine_steps_start_on_the_fast_tier():
+    assert cascade().choose_tier(previous_step_failed=False, page_elements=40) is None
+
+
+def test_a_failed_previous_step_goes_to_the_strong_tier():
+    assert cascade().choose_tier(previous_step_failed=True, page_elements=0) == "previous_step_failed"
+    # A failure is reported as such, even on a complex page
+    assert cascade().choose_tier(previous_step_failed=True, page_elements=500) == "previous_step_failed"
+
+
+def test_only_pages_above_the_threshold_are_complex():
+    strategy = cascade(complex_page_elements=150)
+
+    assert strategy.choose_tier(previous_step_failed=False, page_elements=150) is None
+    assert strategy.choose_tier(previous_step_failed=False, page_elements=151) == "complex_page"
+
+
+def test_confident_outputs_are_accepted():
+    assert cascade().low_confidence_reason(agent_output()) is None
+
+
+def test_outputs_without_an_action_are_low_confidence():
+    assert cascade().low_confidence_reason(agent_output(action=False)) == "no_action"
+    assert cascade().low_confidence_reason(None) == "no_action"
+
+
+def test_self_reported_failures_are_low_confidence():
+    strategy = cascade()
+
+    assert strategy.low_confidence_reason(agent_output(evaluation="  FAILED - no such element")) == "self_reported_failure"
+    assert strategy.low_confidence_reason(agent_output(evaluation=None)) is None
+    assert strategy.low_confidence_reason(agent_output(evaluation="Unknown - page still loading")) is None
+
+
+def test_failure_escalations_hold_the_strong_tier():
+    strategy = cascade(escalation_steps=2)
+    window = strategy.escalation_window()
+
+    window.escalate(3, "previous_step_failed")
+
+    assert [window.holds(step) for step in (3, 4, 5)] == [True, True, False]
+    assert strategy.escalations == {"previous_step_failed": 1}
+
+
+def test_complex_page_escalates_without_holding():
+    strategy = cascade(escalation_steps=2)
+    window = strategy.escalation_window()
+
+    window.escalate(3, "complex_page")
+
+    assert not window.holds(4)
+    assert strategy.escalations == {"complex_page": 1}
+
+
+def test_each_agent_has_its_own_window():
+    strategy = cascade()
+    failing, other = strategy.escalation_window(), strategy.escalation_window()
+
+    failing.escalate(1, "no_action")
+
+    assert failing.holds(2)
+    assert not other.holds(2)
+
+
+def test_responses_stay_on_the_fast_tier():
+    fast, strong = StubTier("fast", "fast answer"), StubTier("strong")
+    strategy = cascade(fast, strong)
+
+    assert asyncio.run(strategy.generate_response("Summarise the page")) == "fast answer"
+    assert strategy.stats() == {"calls": {FAST_TIER: 1, STRONG_TIER: 0}, "escalations": {}}
+
+
+@pytest.mark.parametrize("failure, reason", [("  ", "empty_response"), (TimeoutError(), "TimeoutError")])
+def test_empty_and_failed_responses_escalate(failure, reason):
+    fast, strong = StubTier("fast", failure), StubTier("strong", "strong answer")
+    strategy = cascade(fast, strong)
+
+    assert asyncio.run(strategy.generate_response("Summarise the page")) == "strong answer"
+    assert strong.prompts == ["Summarise the page"]
+    assert strategy.stats() == {"calls": {FAST_TIER: 1, STRONG_TIER: 1}, "escalations": {reason: 1}}
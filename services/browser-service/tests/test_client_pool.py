@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("httpx")
+
+from strategies.llm.client_pool import LLMClientCache
+from strategies.llm.client_pool import get_shared_http_clients
+
+
+class Strategy:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_least_recently_used_strategy_is_evicted_and_closed():
+    cache = LLMClientCache(max_entries=2)
+    a = cache.get_or_create(("openai", "a"), lambda: Strategy("a"))
+    b = cache.get_or_create(("openai", "b"), lambda: Strategy("b"))
+    assert cache.get_or_create(("openai", "a"), lambda: Strategy("a2")) is a
+
+    cache.get_or_create(("openai", "c"), lambda: Strategy("c"))
+
+    assert len(cache) == 2
+    assert b.closed and not a.closed
+    assert cache.evictions == 1
+
+
+def test_keys_hash_the_api_key():
+    key = LLMClientCache.make_key("OpenAI", "gpt-4o", "sk-secret", 0.0)
+    assert key[0] == "openai"
+    assert "sk-secret" not in key
+    assert key != LLMClientCache.make_key("openai", "gpt-4o", "sk-other", 0.0)
+
+
+def test_anthropic_clients_use_the_shared_pool():
+    pytest.importorskip("langchain_anthropic")
+    from strategies.llm.anthropic import AnthropicLLMStrategy
+
+    llm = AnthropicLLMStrategy(api_key="test-key", model="claude-3-5-haiku-latest").get_llm()
+    http_client, http_async_client = get_shared_http_clients()
+    assert llm._client._client is http_client
+    assert llm._async_client._client is http_async_client
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+from core.usage import TokenUsageHandler
+from core.usage import UsageRecorder
+from strategies.base import request_fingerprint
+
+
+class SecretStr:
+    def __init__(self, value):
+        self._value = value
+
+    def get_secret_value(self):
+        return self._value
+
+
+def chat_model(api_key, model="gpt-4o"):
+    return SimpleNamespace(model_name=model, temperature=0, openai_api_key=SecretStr(api_key), openai_api_base=None)
+
+
+def llm_result(input_tokens, output_tokens):
+    usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "input_token_details": {"cache_read": 5}}
+    return SimpleNamespace(generations=[[SimpleNamespace(message=SimpleNamespace(usage_metadata=usage))]], llm_output=None)
+
+
+class Usage:
+    def __init__(self):
+        self.tokens = []
+        self.cache = []
+        self.calls = []
+        self.idle_waits = []
+
+    def handler(self):
+        return TokenUsageHandler(
+            lambda i, o: self.tokens.append((i, o)),
+            lambda read, write: self.cache.append((read, write)),
+            on_call=lambda *call: self.calls.append(call),
+            on_idle_wait=self.idle_waits.append,
+        )
+
+
+def test_requests_with_different_api_keys_are_not_coalesced():
+    messages = [{"role": "user", "content": "Which button submits the form?"}]
+    assert request_fingerprint(chat_model("key-a"), messages) == request_fingerprint(chat_model("key-a"), messages)
+    assert request_fingerprint(chat_model("key-a"), messages) != request_fingerprint(chat_model("key-b"), messages)
+    assert request_fingerprint(chat_model("key-a"), messages) != request_fingerprint(chat_model("key-a", "gpt-4o-mini"), messages)
+
+
+def test_recorded_usage_reaches_the_caller_and_every_sharer():
+    caller, sharer = Usage(), Usage()
+    recorder = UsageRecorder(caller.handler())
+    recorder.on_llm_call("openai/gpt-4o", llm_result(1200, 80), 1.5, None)
+    recorder.on_idle_wait(0.25)
+
+    recorder.replay(sharer.handler())
+
+    for usage in (caller, sharer):
+        assert usage.tokens == [(1200, 80)]
+        assert usage.cache == [(5, 0)]
+        assert usage.calls == [("openai/gpt-4o", 1200, 80, 1.5, None)]
+        assert usage.idle_waits == [0.25]
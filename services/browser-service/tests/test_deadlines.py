@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from core.deadlines import Deadline
+from core.deadlines import DeadlineExceededError
+from core.deadlines import StageTimeoutError
+
+
+def test_returns_the_stage_result():
+    async def step():
+        return "done"
+
+    assert asyncio.run(Deadline(5).run("step", step, limit=1)) == "done"
+
+
+def test_stage_over_its_own_limit_times_out():
+    async def scenario():
+        deadline = Deadline(5)
+        with pytest.raises(StageTimeoutError) as error:
+            await deadline.run("llm_call", lambda: asyncio.sleep(1), limit=0.02)
+        return error.value, deadline
+
+    error, deadline = asyncio.run(scenario())
+    assert error.stage == "llm_call"
+    assert not deadline.expired
+
+
+def test_expired_task_deadline_names_the_innermost_stage():
+    async def scenario():
+        deadline = Deadline(0.05)
+
+        async def step():
+            return await deadline.run("navigation", lambda: asyncio.sleep(1))
+
+        with pytest.raises(DeadlineExceededError) as error:
+            await deadline.run("step", step)
+        return error.value
+
+    assert asyncio.run(scenario()).stage == "navigation"
+
+
+def test_stage_is_refused_once_the_deadline_has_expired():
+    async def scenario():
+        deadline = Deadline(0.01)
+        await asyncio.sleep(0.02)
+        with pytest.raises(DeadlineExceededError):
+            await deadline.run("step", lambda: asyncio.sleep(0))
+
+    asyncio.run(scenario())
+
+
+def test_limit_is_capped_by_the_time_left():
+    deadline = Deadline(1)
+    assert deadline.budget(120) <= 1
+    assert deadline.budget(0.5) == 0.5
+    assert deadline.budget() <= 1
+
+
+def test_swallowed_cancellation_without_result_counts_as_overrun():
+    async def scenario():
+        deadline = Deadline(5)
+
+        async def swallows_cancellation():
+            try:
+                await asyncio.sleep(1)
+            finally:
+                return None
+
+        with pytest.raises(StageTimeoutError):
+            await deadline.run("step", swallows_cancellation, limit=0.02)
+
+    asyncio.run(scenario())
+
+
+def test_result_produced_at_the_limit_is_kept():
+    async def scenario():
+        deadline = Deadline(5)
+
+        async def slow_but_finished():
+            try:
+                await asyncio.sleep(1)
+            finally:
+                return "result"
+
+        return await deadline.run("step", slow_but_finished, limit=0.02)
+
+    assert asyncio.run(scenario()) == "result"
+
+
+def test_step_finishing_at_its_limit_is_not_an_overrun():
+    async def scenario():
+        deadline = Deadline(5)
+
+        async def step():
+            # Blocks the loop past the limit, so the timer has no chance to fire
+            time.sleep(0.03)
+            return None
+
+        return await deadline.run("step", step, limit=0.02)
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from strategies.llm import rate_limiter
+from strategies.llm.client_pool import close_shared_http_clients
+from strategies.llm.factory import LLMProviderFactory
+
+
+class StubServer(ThreadingHTTPServer):
+    """Loopback OpenAI-compatible server that records how many completions run at once."""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completions = 0
+        self.up = True
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if not self.server.up:
+            self._send_json({"error": "loading model"}, status=503)
+            return
+        self._send_json({"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.completions += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+        prompt = request["messages"][-1]["content"]
+        self._send_json({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"echo: {prompt}"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8},
+        })
+
+
+def run(scenario):
+    """Run a scenario, closing the shared HTTP clients on the same event loop."""
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await close_shared_http_clients()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = StubServer(delay=0.05)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", server.base_url)
+    monkeypatch.setenv("LOCAL_LLM_MODEL", "stub-model")
+    monkeypatch.setenv("LOCAL_LLM_MAX_CONCURRENCY", "2")
+    monkeypatch.setenv("LLM_RESPONSE_CACHE", "false")
+    # Each test gets its own limiter, bound to its own event loop
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    LLMProviderFactory.clear_cache()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_generates_a_response_from_the_local_server(stub_server):
+    async def scenario():
+        return await LLMProviderFactory.get_local_provider().generate_response("Say hello")
+
+    assert run(scenario) == "echo: Say hello"
+    assert stub_server.completions == 1
+
+
+def test_calls_beyond_the_servers_slots_queue_in_the_service(stub_server):
+    async def scenario():
+        strategy = LLMProviderFactory.get_local_provider()
+        # Distinct prompts, so that no calls are coalesced
+        return await asyncio.gather(*(strategy.generate_response(f"Prompt {i}") for i in range(6)))
+
+    assert run(scenario) == [f"echo: Prompt {i}" for i in range(6)]
+    assert stub_server.completions == 6
+    assert stub_server.max_in_flight == 2
+
+
+def test_health_is_probed_once_and_then_served_from_the_last_probe(stub_server):
+    async def scenario():
+        first = await LLMProviderFactory.local_health()
+        stub_server.up = False
+        return first, await LLMProviderFactory.local_health()
+
+    first, second = run(scenario)
+    assert first["status"] == "ok"
+    assert first["models"] == ["stub-model"]
+    assert second is first
+
+
+def test_monitor_refreshes_the_health_in_the_background(stub_server):
+    async def scenario():
+        monitor = asyncio.create_task(LLMProviderFactory.monitor_local_health(0.05))
+        await asyncio.sleep(0.02)
+        healthy = await LLMProviderFactory.local_health()
+        stub_server.up = False
+        await asyncio.sleep(0.2)
+        down = await LLMProviderFactory.local_health()
+        monitor.cancel()
+        await asyncio.gather(monitor, return_exceptions=True)
+        return healthy, down
+
+    healthy, down = run(scenario)
+    assert healthy["status"] == "ok"
+    assert down["status"] == "unavailable"
@@ -0,0 +1,35 @@
+import sys
+
+from core.memory import estimate_size
+from core.memory import retained_sizes
+
+
+class Step:
+    def __init__(self, text):
+        self.text = text
+
+
+def test_shared_objects_are_counted_once():
+    text = "x" * 1000
+    assert estimate_size([text, text]) == sys.getsizeof([text, text]) + sys.getsizeof(text)
+
+
+def test_object_budget_is_shared_across_items():
+    history = [Step(str(i) * 50) for i in range(100)]
+    items = [{"agent_history": history}, {"agent_history": list(history)}, {"result": "done"}]
+
+    sizes, truncated = retained_sizes(items)
+    assert not truncated
+    assert sizes[0]["total"] == estimate_size(history)
+    assert sizes[2]["result"] == sys.getsizeof("done")
+
+    sizes, truncated = retained_sizes(items, max_objects=350)
+    assert truncated
+    assert 0 < sizes[1]["total"] < sizes[0]["total"]
+    assert sizes[2] == {"result": 0, "total": 0}
+
+
+def test_empty_parts_are_zero():
+    sizes, truncated = retained_sizes([{"result": None, "metadata": {}}])
+    assert sizes == [{"result": 0, "metadata": sys.getsizeof({}), "total": sys.getsizeof({})}]
+    assert not truncated
@@ -0,0 +1,68 @@
+from core.progress_monitor import FAIL
+from core.progress_monitor import NUDGE
+from core.progress_monitor import PROGRESSING
+from core.progress_monitor import ProgressMonitor
+from core.progress_monitor import hash_dom
+
+URL = "https://example.com/form"
+
+
+def click(index):
+    return [{"click_element": {"index": index}}]
+
+
+def type_text(index, text):
+    return [{"input_text": {"index": index, "text": text}}]
+
+
+def test_repeating_the_same_action_is_a_loop():
+    monitor = ProgressMonitor(max_repeats=3, max_nudges=1)
+    dom = hash_dom(URL, ["/html/body/button"])
+    verdicts = [monitor.record(URL, click(1), dom) for _ in range(3)]
+    assert verdicts == [PROGRESSING, PROGRESSING, NUDGE]
+    assert "Repeated the same action 3 times" in monitor.reason
+
+
+def test_cycle_of_steps_is_a_loop():
+    monitor = ProgressMonitor(max_repeats=2, max_cycle_length=2)
+    pages = [("https://example.com/a", click(1)), ("https://example.com/b", click(2))]
+    verdicts = [monitor.record(url, actions, hash_dom(url, [])) for url, actions in pages * 2]
+    assert verdicts[-1] == NUDGE
+    assert "2 steps" in monitor.reason
+
+
+def test_failing_steps_on_an_unchanged_page_are_a_stall():
+    monitor = ProgressMonitor(max_repeats=10, max_stalled_steps=3)
+    dom = hash_dom(URL, ["/html/body/div"])
+    verdicts = [monitor.record(URL, click(index), dom, failed=True) for index in range(4)]
+    assert verdicts == [PROGRESSING, PROGRESSING, PROGRESSING, NUDGE]
+    assert "has not changed for 3 steps" in monitor.reason
+
+
+def test_filling_in_a_form_is_not_a_stall():
+    monitor = ProgressMonitor(max_repeats=3, max_stalled_steps=2)
+    elements = ["/html/body/form/input[1]", "/html/body/form/input[2]", "/html/body/form/input[3]"]
+    values = ["", "", ""]
+    for index, text in enumerate(["Ada", "Lovelace", "ada@example.com"]):
+        values[index] = text
+        verdict = monitor.record(URL, type_text(index, text), hash_dom(URL, elements, values))
+        assert verdict == PROGRESSING
+
+
+def test_different_actions_on_an_unchanged_page_are_not_a_stall():
+    monitor = ProgressMonitor(max_repeats=3, max_stalled_steps=2)
+    dom = hash_dom(URL, ["/html/body/div"])
+    assert [monitor.record(URL, click(index), dom) for index in range(4)] == [PROGRESSING] * 4
+
+
+def test_fails_once_nudges_are_used_up():
+    monitor = ProgressMonitor(max_repeats=2, max_nudges=1)
+    dom = hash_dom(URL, [])
+    verdicts = [monitor.record(URL, click(1), dom) for _ in range(4)]
+    assert verdicts == [PROGRESSING, NUDGE, PROGRESSING, FAIL]
+
+
+def test_page_hash_covers_field_values_and_ignores_element_order():
+    assert hash_dom(URL, ["a", "b"]) == hash_dom(URL, ["b", "a"])
+    assert hash_dom(URL, ["a"], ["x"]) != hash_dom(URL, ["a"], ["y"])
+    assert hash_dom(URL, ["a"]) != hash_dom("https://example.com/other", ["a"])
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from strategies.llm import rate_limiter
+from strategies.llm.rate_limiter import ProviderRateLimiter
+from strategies.llm.rate_limiter import TokenBucket
+from strategies.llm.rate_limiter import is_rate_limit_error
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake)
+    return fake
+
+
+def test_bucket_starts_full_and_refills_at_its_rate(clock):
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.delay_for(60) == 0
+    bucket.consume(60)
+    assert bucket.delay_for(1) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.delay_for(30) == 0
+    assert bucket.delay_for(31) == pytest.approx(1.0)
+
+
+def test_bucket_never_holds_more_than_its_capacity(clock):
+    bucket = TokenBucket(per_minute=60)
+    clock.now += 600
+    bucket.consume(60)
+    assert bucket.delay_for(1) == pytest.approx(1.0)
+
+
+def test_request_larger_than_the_capacity_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.consume(30)
+    assert bucket.delay_for(1000) == pytest.approx(30.0)
+
+
+def test_underestimated_usage_is_charged_afterwards(clock):
+    limiter = ProviderRateLimiter("test", tokens_per_minute=600)
+
+    async def call():
+        async with limiter.acquire(estimated_tokens=100) as permit:
+            permit.record_tokens(400)
+
+    asyncio.run(call())
+    assert limiter.token_bucket.tokens == pytest.approx(200)
+
+
+def test_rate_limit_halves_the_concurrency_limit_once_per_cooldown(clock):
+    limiter = ProviderRateLimiter("test", max_concurrency=16)
+    limiter._on_rate_limited()
+    assert limiter.concurrency_limit == 8
+    limiter._on_rate_limited()
+    assert limiter.concurrency_limit == 8
+    clock.now += rate_limiter._DECREASE_COOLDOWN_SECONDS
+    limiter._on_rate_limited()
+    assert limiter.concurrency_limit == 4
+    assert limiter.rate_limited == 3
+
+
+def test_concurrency_limit_never_drops_below_the_minimum(clock):
+    limiter = ProviderRateLimiter("test", max_concurrency=2, min_concurrency=1)
+    for _ in range(3):
+        clock.now += rate_limiter._DECREASE_COOLDOWN_SECONDS
+        limiter._on_rate_limited()
+    assert limiter.concurrency_limit == 1
+
+
+def test_successes_grow_the_limit_back_additively():
+    limiter = ProviderRateLimiter("test", max_concurrency=4)
+    limiter.concurrency_limit = 2.0
+    limiter._on_success()
+    limiter._on_success()
+    assert limiter.concurrency_limit == pytest.approx(2.9, abs=0.05)
+    for _ in range(20):
+        limiter._on_success()
+    assert limiter.concurrency_limit == 4
+
+
+def test_rate_limited_call_lowers_the_limit():
+    limiter = ProviderRateLimiter("test", max_concurrency=8)
+
+    async def call():
+        async with limiter.acquire():
+            raise RateLimitError("Too Many Requests")
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(call())
+    assert limiter.concurrency_limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_calls_beyond_the_limit_queue_in_arrival_order():
+    async def scenario():
+        limiter = ProviderRateLimiter("test", max_concurrency=1)
+        order = []
+
+        async def call(name):
+            async with limiter.acquire():
+                order.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} end")
+
+        await asyncio.gather(call("a"), call("b"), call("c"))
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["a start", "a end", "b start", "b end", "c start", "c end"]
+    assert stats["requests"] == 3
+    assert stats["queue_wait_seconds_max"] > 0
+
+
+def test_queue_waits_are_reported_to_listeners(monkeypatch):
+    waits = []
+    monkeypatch.setattr(rate_limiter, "_idle_wait_listeners", [])
+    rate_limiter.add_idle_wait_listener(lambda name, seconds: waits.append((name, seconds)))
+
+    async def call():
+        async with ProviderRateLimiter("openai/gpt-4o").acquire():
+            pass
+
+    asyncio.run(call())
+    assert [name for name, _ in waits] == ["openai/gpt-4o"]
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (RateLimitError(), True),
+        (Exception("429 RESOURCE_EXHAUSTED: quota"), True),
+        (Exception("Rate limit reached for requests"), True),
+        (TimeoutError("timed out"), False),
+    ],
+)
+def test_recognises_rate_limit_errors(error, expected):
+    assert is_rate_limit_error(error) is expected
@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+from strategies.llm.response_cache import CachedLLMStrategy
+from strategies.llm.response_cache import LLMResponseCache
+
+
+class Strategy:
+    """Provider strategy that answers with a counter, so cached answers are recognisable."""
+
+    rate_limiter = None
+    tool_calling_method = None
+
+    def __init__(self, temperature=0.0):
+        self.llm = SimpleNamespace(model_name="gpt-4o", temperature=temperature)
+        self.calls = 0
+
+    def get_llm(self):
+        return self.llm
+
+    def get_provider_name(self):
+        return "openai"
+
+    def _build_messages(self, prompt, structured=False):
+        return [SimpleNamespace(type="human", content=prompt)]
+
+    async def generate_response(self, prompt, options=None):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+
+def ask(strategy, *calls):
+    async def scenario():
+        return [await strategy.generate_response(prompt, options) for prompt, options in calls]
+
+    return asyncio.run(scenario())
+
+
+def test_identical_deterministic_calls_are_served_from_cache():
+    provider = Strategy()
+    cached = CachedLLMStrategy(provider, LLMResponseCache(None))
+    assert ask(cached, ("Which button?", None), ("Which button?", None), ("Which link?", None)) == [
+        "answer 1", "answer 1", "answer 2"
+    ]
+    assert provider.calls == 2
+
+
+def test_key_is_stable_and_depends_on_the_sampling_parameters():
+    cached = CachedLLMStrategy(Strategy(), LLMResponseCache(None))
+    assert cached._key("text", "Which button?", None) == cached._key("text", "Which button?", None)
+    assert cached._key("text", "Which button?", None) != cached._key("text", "Which button?", {"max_tokens": 10})
+    assert cached._key("text", "Which button?", None) != cached._key("stream", "Which button?", None)
+
+
+def test_sampled_calls_bypass_the_cache_unless_opted_in():
+    provider = Strategy(temperature=0.7)
+    cached = CachedLLMStrategy(provider, LLMResponseCache(None))
+    assert ask(cached, ("Write a tagline", None), ("Write a tagline", None)) == ["answer 1", "answer 2"]
+    assert ask(cached, ("Write a tagline", {"cache": True}), ("Write a tagline", {"cache": True})) == [
+        "answer 3", "answer 3"
+    ]
+
+
+def test_deterministic_calls_can_opt_out():
+    provider = Strategy()
+    cached = CachedLLMStrategy(provider, LLMResponseCache(None))
+    assert ask(cached, ("Which button?", {"cache": False}), ("Which button?", {"cache": False})) == [
+        "answer 1", "answer 2"
+    ]
+
+
+def test_entries_expire_after_their_ttl(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "responses.sqlite3"))
+
+    async def scenario():
+        await cache.set("key", "response", ttl_seconds=0.05)
+        fresh = await cache.get("key")
+        await asyncio.sleep(0.1)
+        return fresh, await cache.get("key")
+
+    assert asyncio.run(scenario()) == ("response", None)
+
+
+def test_disk_hit_after_the_memory_tier_is_cleared(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+
+    async def scenario():
+        await LLMResponseCache(path).set("key", "response")
+        # A new cache on the same file, e.g. after a restart, starts with an empty memory tier
+        restarted = LLMResponseCache(path)
+        return restarted, await restarted.get("key"), await restarted.get("key")
+
+    restarted, first, second = asyncio.run(scenario())
+    assert first == second == "response"
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["hits"] == 2
+
+
+def test_unreadable_cache_file_is_a_miss(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "responses.sqlite3"))
+
+    def locked(key):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "_read", locked)
+    assert asyncio.run(cache.get("key")) is None
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,91 @@
+import pytest
+
+from core.result_refs import PreviousOutputResolver
+from core.result_refs import parse_json_path
+from core.result_refs import project
+
+HISTORY = {
+    "history": [
+        {"result": [{"extracted_content": "first"}]},
+        {"result": [{"extracted_content": "second"}, {"extracted_content": "third"}]},
+    ],
+    "meta": {"odd key": 1, "with-dash": 2},
+}
+
+
+def test_parses_supported_tokens():
+    assert parse_json_path("$.history[-1].result[*]['odd key'][\"x\"].*") == [
+        ("key", "history"),
+        ("index", -1),
+        ("key", "result"),
+        ("wildcard", None),
+        ("key", "odd key"),
+        ("key", "x"),
+        ("wildcard", None),
+    ]
+
+
+def test_root_path_has_no_tokens():
+    assert parse_json_path("$") == []
+
+
+@pytest.mark.parametrize("path", ["", "history", "$.", "$[abc]", "$..history", "$.a[1"])
+def test_rejects_unsupported_paths(path):
+    with pytest.raises(ValueError):
+        parse_json_path(path)
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("$", HISTORY),
+        ("$.history[0].result[0].extracted_content", "first"),
+        ("$.history[-1].result[*].extracted_content", ["second", "third"]),
+        ("$.meta['odd key']", 1),
+        ("$.meta.with-dash", 2),
+        ("$.meta.*", [1, 2]),
+        ("$.history[5]", None),
+        ("$.history[-3]", None),
+        ("$.missing.deeper", None),
+        ("$.meta[0]", None),
+        ("$.history.result", None),
+    ],
+)
+def test_projects_values(path, expected):
+    assert project(HISTORY, parse_json_path(path)) == expected
+
+
+def test_single_predecessor_is_keyed_too():
+    resolver = PreviousOutputResolver(inline={"extract": {"version": "1.0", "timestamp": "t", "data": {"a": 1}}})
+    assert resolver.resolve() == {"extract": {"a": 1}}
+
+
+def test_several_predecessors_are_keyed():
+    stored = {"task-1": HISTORY}
+    resolver = PreviousOutputResolver(
+        inline={"login": {"version": "1.0", "timestamp": "t", "data": "ok"}, "empty": None},
+        refs={
+            "extract": {"task_id": "task-1", "path": "$.history[-1].result[0].extracted_content"},
+            "gone": {"task_id": "task-2"},
+        },
+        lookup=stored.get,
+    )
+    assert resolver.resolve() == {"login": "ok", "empty": None, "extract": "second", "gone": None}
+
+
+def test_resolves_once():
+    lookups = []
+
+    def lookup(task_id):
+        lookups.append(task_id)
+        return None
+
+    resolver = PreviousOutputResolver(refs={"a": {"task_id": "task-1"}}, lookup=lookup)
+    assert resolver.resolve() == {"a": None}
+    assert resolver.resolve() == {"a": None}
+    assert lookups == ["task-1"]
+
+
+def test_is_falsy_without_predecessors():
+    assert not PreviousOutputResolver()
+    assert PreviousOutputResolver(refs={"a": {"task_id": "task-1"}})
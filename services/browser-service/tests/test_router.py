@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from strategies.llm.router import RoutingLLMStrategy
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+def provider(name):
+    return SimpleNamespace(name=name, rate_limiter=None)
+
+
+def routed(*names, hedging=True):
+    return RoutingLLMStrategy({name: provider(name) for name in names}, hedging=hedging)
+
+
+def test_fails_over_on_server_errors():
+    router = routed("primary", "backup")
+
+    async def call(strategy):
+        if strategy.name == "primary":
+            raise ServerError("unavailable")
+        return strategy.name
+
+    assert asyncio.run(router.route(call)) == "backup"
+    assert router.failovers == 1
+    assert router.health["primary"].errors == 1
+
+
+def test_other_errors_are_not_failed_over():
+    router = routed("primary", "backup")
+
+    async def call(strategy):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(router.route(call))
+    assert router.failovers == 0
+
+
+def test_losing_hedge_is_cancelled_before_the_call_returns():
+    router = routed("slow", "fast")
+    # "slow" has been the faster provider so far, so it is tried first
+    for _ in range(10):
+        router.health["slow"].record_success(0.01)
+        router.health["fast"].record_success(1.0)
+    unwound = []
+
+    async def call(strategy):
+        try:
+            await asyncio.sleep(0.5 if strategy.name == "slow" else 0.02)
+            return strategy.name
+        finally:
+            if strategy.name == "slow":
+                await asyncio.sleep(0.01)
+                unwound.append(strategy.name)
+
+    async def scenario():
+        result = await router.route(call)
+        return result, list(unwound)
+
+    assert asyncio.run(scenario()) == ("fast", ["slow"])
+    assert router.hedges == 1
@@ -0,0 +1,42 @@
+import logging
+
+from core.structured_logging import SamplingFilter
+from core.structured_logging import parse_sampling
+
+
+def record(name, level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1, "message", None, None)
+
+
+def kept(sampling_filter, name, count, level=logging.INFO):
+    return [sampling_filter.filter(record(name, level)) for _ in range(count)]
+
+
+def test_keeps_every_nth_record_of_a_sampled_logger():
+    sampling_filter = SamplingFilter({"browser_use": 0.25})
+    assert kept(sampling_filter, "browser_use", 8) == [True, False, False, False] * 2
+
+
+def test_child_loggers_share_the_most_specific_rate():
+    sampling_filter = SamplingFilter({"browser_use": 0.5, "browser_use.dom": 0})
+    assert kept(sampling_filter, "browser_use.agent.service", 4) == [True, False, True, False]
+    assert kept(sampling_filter, "browser_use.dom.service", 3) == [False, False, False]
+
+
+def test_rate_zero_drops_records_below_warning_only():
+    sampling_filter = SamplingFilter({"main.periodic_task": 0})
+    assert kept(sampling_filter, "main.periodic_task", 2, logging.DEBUG) == [False, False]
+    assert kept(sampling_filter, "main.periodic_task", 2, logging.WARNING) == [True, True]
+    assert kept(sampling_filter, "main.periodic_task", 2, logging.ERROR) == [True, True]
+
+
+def test_other_loggers_are_not_sampled():
+    sampling_filter = SamplingFilter({"browser_use": 0.1})
+    assert all(kept(sampling_filter, "main", 5))
+    assert all(kept(sampling_filter, "browser_user", 5))
+
+
+def test_parses_sampling_spec():
+    assert parse_sampling("browser_use=0.2, main.periodic_task=0.1") == {
+        "browser_use": 0.2, "main.periodic_task": 0.1
+    }
@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.task_cache import TaskResultCache
+
+
+def history(done):
+    return SimpleNamespace(is_done=lambda: done)
+
+
+def run(cache, response):
+    async def execute():
+        return response
+
+    return asyncio.run(cache.run("key", execute))
+
+
+def test_completed_run_is_served_from_cache():
+    cache = TaskResultCache()
+    response = {"status": "success", "result": history(done=True)}
+    assert run(cache, response) == (response, False)
+    assert run(cache, {"status": "success", "result": history(done=True)}) == (response, True)
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        {"status": "budget_exhausted", "error": "steps budget exhausted", "result": history(done=False)},
+        {"status": "failed", "error": "Deadline exceeded"},
+        {"status": "success", "result": history(done=False)},
+    ],
+)
+def test_unfinished_runs_are_not_cached(response):
+    cache = TaskResultCache()
+    run(cache, response)
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_key_depends_on_every_field():
+    fields = {"task": "Find the price", "max_steps": None, "operation_timeout": 300}
+    assert TaskResultCache.make_key(fields) == TaskResultCache.make_key({"task": " Find the price ", "operation_timeout": 300})
+    assert TaskResultCache.make_key(fields) != TaskResultCache.make_key({**fields, "max_steps": 5})
+    assert TaskResultCache.make_key(fields) != TaskResultCache.make_key({**fields, "operation_timeout": 30})
@@ -0,0 +1,55 @@
+from core.tracing import SpanContext
+from core.tracing import Tracer
+
+
+def run_task(tracer, task_id, steps=1):
+    span, token = tracer.start_span("run_task", task_id=task_id)
+    tracer.bind_task(task_id, span)
+    for step in range(steps):
+        with tracer.span("agent.step", step=step):
+            pass
+    tracer.end_span(span, token)
+    return span
+
+
+def test_task_waterfall_nests_spans_under_the_root():
+    tracer = Tracer()
+    run_task(tracer, "task-1", steps=2)
+
+    trace = tracer.task_trace("task-1")
+    assert trace["complete"]
+    assert [(span["name"], span["depth"]) for span in trace["spans"]] == [
+        ("run_task", 0), ("agent.step", 1), ("agent.step", 1)
+    ]
+
+
+def test_lone_spans_outside_tasks_are_not_kept():
+    tracer = Tracer()
+    with tracer.span("health"):
+        pass
+    tracer.record_span("llm.call", 0.5, {})
+    assert len(tracer._traces) == 0
+
+
+def request_from_another_service(tracer, trace_id):
+    with tracer.remote_parent(SpanContext(trace_id, "00f067aa0ba902b7")):
+        with tracer.span("browser.screenshot"):
+            pass
+
+
+def test_trace_still_being_written_is_not_evicted():
+    tracer = Tracer(max_traces=2)
+    span, token = tracer.start_span("run_task", task_id="long")
+    tracer.bind_task("long", span)
+    with tracer.span("agent.step"):
+        pass
+    request_from_another_service(tracer, "a" * 32)
+    # The long task's trace gets a new span, so the next trace evicts the other one instead
+    with tracer.span("agent.step"):
+        pass
+    request_from_another_service(tracer, "b" * 32)
+    tracer.end_span(span, token)
+
+    assert tracer.task_trace("long")["complete"]
+    assert len(tracer.task_trace("long")["spans"]) == 3
+    assert list(tracer._traces)[-2:] == ["b" * 32, span.trace_id]
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core.workflow import WorkflowGraphError
+from core.workflow import assign_task_ids
+from core.workflow import validate_workflow_graph
+
+
+def node(node_id, depends_on=(), inherit_browser_from=None, task_id=None):
+    return SimpleNamespace(
+        id=node_id, depends_on=list(depends_on), inherit_browser_from=inherit_browser_from, task_id=task_id
+    )
+
+
+def test_orders_nodes_after_their_dependencies():
+    nodes = [node("report", ["a", "b"]), node("a"), node("b", ["a"])]
+    assert validate_workflow_graph(nodes) == ["a", "b", "report"]
+
+
+def test_keeps_declaration_order_for_independent_nodes():
+    nodes = [node("c"), node("a"), node("b")]
+    assert validate_workflow_graph(nodes) == ["c", "a", "b"]
+
+
+def test_duplicate_dependencies_are_counted_once():
+    nodes = [node("a"), node("b", ["a", "a"])]
+    assert validate_workflow_graph(nodes) == ["a", "b"]
+
+
+def test_allows_browser_handoff_to_a_dependent():
+    nodes = [node("login"), node("search", ["login"], inherit_browser_from="login")]
+    assert validate_workflow_graph(nodes) == ["login", "search"]
+
+
+@pytest.mark.parametrize(
+    "nodes, message",
+    [
+        ([], "at least one node"),
+        ([node("a"), node("a")], "Duplicate node id: a"),
+        ([node("a", ["a"])], "cannot depend on itself"),
+        ([node("a", ["missing"])], "unknown node missing"),
+        ([node("a"), node("b", inherit_browser_from="a")], "node it depends on"),
+        (
+            [node("a"), node("b", ["a"], inherit_browser_from="a"), node("c", ["a"], inherit_browser_from="a")],
+            "inherited by both b and c",
+        ),
+        ([node("a", ["c"]), node("b", ["a"]), node("c", ["b"]), node("d")], "cycle involving nodes: a, b, c"),
+    ],
+)
+def test_rejects_invalid_graphs(nodes, message):
+    with pytest.raises(WorkflowGraphError, match=message):
+        validate_workflow_graph(nodes)
+
+
+def test_nodes_run_as_their_own_or_derived_task_ids():
+    nodes = [node("login", task_id="login-task"), node("extract", ["login"])]
+    assert assign_task_ids("wf", nodes) == {"login": "login-task", "extract": "wf-extract"}
+
+
+@pytest.mark.parametrize(
+    "nodes",
+    [
+        [node("a", task_id="shared"), node("b", task_id="shared")],
+        [node("b"), node("c", task_id="wf-b")],
+    ],
+)
+def test_rejects_nodes_sharing_a_task_id(nodes):
+    with pytest.raises(WorkflowGraphError, match="share task ID"):
+        assign_task_ids("wf", nodes)